@@ -0,0 +1,370 @@
+# Record-and-replay cassettes for Bedrock event streams.
+#
+# A RecordingClient wraps a bedrock-agent-runtime client and captures every invoke_agent /
+# invoke_flow response stream as it is read: each event (chunks, traces, flow outputs, completion
+# events, a trailing error) with the time since the previous one. A cassette is one gzipped JSON
+# line per call, with bytes payloads base64-encoded. A ReplayClient serves those calls back as
+# response streams at the recorded pace, scaled by `speed`, or as fast as possible with speed 0.
+# Both plug in through aws_clients.override_client, so replays run through the apps' own stream
+# loops (AgentStream, flow_stream, streamlit-bedrock-flow's FlowStreamConsumer) and give repeatable
+# offline numbers for parser throughput and streaming latency.
+#
+# Record:  python benchmarks/cassettes.py record-agent agent.cassette --agent-id ID --agent-alias-id ALIAS --prompt "..."
+#          python benchmarks/cassettes.py record-flow flow.cassette --flow-alias ARN --prompt "..."
+#          (add --fake to record from fake_aws instead of AWS)
+# Replay:  python benchmarks/cassettes.py replay agent.cassette [--speed 0] [--repeat 20] [--app streamlit-ui]
+#          python benchmarks/cassettes.py replay flow.cassette --app streamlit-bedrock-flow
+import argparse
+import asyncio
+import base64
+import contextlib
+import gzip
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+CASSETTE_VERSION = 1
+STREAM_FIELDS = {"invoke_agent": "completion", "invoke_flow": "responseStream"}
+# Which app's stream loop a replay drives by default
+DEFAULT_APPS = {"invoke_agent": "streamlit-app", "invoke_flow": os.path.join("streamlit_prompt_flow", "src")}
+
+
+def _encode(value):
+    if isinstance(value, bytes):
+        return {"__b64__": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    # datetimes and other response metadata
+    return str(value)
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        if len(value) == 1 and "__b64__" in value:
+            return base64.b64decode(value["__b64__"])
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+class Interaction:
+    def __init__(self, operation, request, response, stream_field, events=None, error=None):
+        self.operation = operation
+        self.request = request
+        # Non-stream response fields (sessionId, executionId, ...)
+        self.response = response
+        self.stream_field = stream_field
+        # [(seconds since the previous event, or since the request for the first), event], ...
+        self.events = events or []
+        self.error = error
+
+    def to_json(self):
+        return {
+            "op": self.operation,
+            "request": _encode(self.request),
+            "response": _encode(self.response),
+            "stream": self.stream_field,
+            "events": [[round(delay * 1000, 3), _encode(event)] for delay, event in self.events],
+            "error": self.error,
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data["op"], _decode(data["request"]), _decode(data["response"]), data["stream"],
+                   [(delay / 1000, _decode(event)) for delay, event in data["events"]], data.get("error"))
+
+
+class Cassette:
+    def __init__(self, interactions=None):
+        self.interactions = interactions or []
+        self._lock = threading.Lock()
+
+    def add(self, interaction):
+        with self._lock:
+            self.interactions.append(interaction)
+
+    def save(self, path):
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write(json.dumps({"version": CASSETTE_VERSION}) + "\n")
+            for interaction in self.interactions:
+                f.write(json.dumps(interaction.to_json(), separators=(",", ":")) + "\n")
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            if header.get("version") != CASSETTE_VERSION:
+                raise ValueError(f"{path}: unsupported cassette version {header.get('version')}")
+            return cls([Interaction.from_json(json.loads(line)) for line in f if line.strip()])
+
+
+class RecordingClient:
+    # Passes every call through to `client`; streaming calls are added to `cassette` once read
+    def __init__(self, client, cassette):
+        self.client = client
+        self.cassette = cassette
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if name not in STREAM_FIELDS:
+            return attr
+
+        def call(**kwargs):
+            start = time.perf_counter()
+            response = attr(**kwargs)
+            field = STREAM_FIELDS[name]
+            meta = {k: v for k, v in response.items() if k not in (field, "ResponseMetadata")}
+            interaction = Interaction(name, kwargs, meta, field)
+            response[field] = self._record(response[field], interaction, start)
+            return response
+
+        call.__name__ = name
+        return call
+
+    def _record(self, stream, interaction, start):
+        previous = start
+        try:
+            for event in stream:
+                now = time.perf_counter()
+                interaction.events.append((now - previous, event))
+                previous = now
+                yield event
+        except ClientError as e:
+            interaction.error = e.response.get("Error", {})
+            raise
+        finally:
+            self.cassette.add(interaction)
+
+
+class ReplayClient:
+    # Serves recorded calls back in order, per operation; loops when `loop` is set
+    def __init__(self, cassette, speed=1.0, loop=True):
+        self.cassette = cassette
+        self.speed = speed
+        self.loop = loop
+        self._positions = {}
+        self._lock = threading.Lock()
+
+    def _next(self, operation):
+        recorded = [i for i in self.cassette.interactions if i.operation == operation]
+        if not recorded:
+            raise ValueError(f"cassette has no {operation} calls")
+        with self._lock:
+            position = self._positions.get(operation, 0)
+            if position >= len(recorded) and not self.loop:
+                raise ValueError(f"cassette has no more {operation} calls")
+            self._positions[operation] = position + 1
+        return recorded[position % len(recorded)]
+
+    def _replay(self, operation):
+        interaction = self._next(operation)
+        speed = self.speed
+
+        def events():
+            for delay, event in interaction.events:
+                if speed:
+                    time.sleep(delay / speed)
+                yield event
+            if interaction.error:
+                raise ClientError({"Error": interaction.error}, operation)
+
+        response = dict(interaction.response)
+        response[interaction.stream_field] = events()
+        return response
+
+    def invoke_agent(self, **kwargs):
+        return self._replay("invoke_agent")
+
+    def invoke_flow(self, **kwargs):
+        return self._replay("invoke_flow")
+
+
+def _use_app(app):
+    sys.path.insert(0, os.path.join(ROOT, app))
+    sys.path.insert(0, BENCH_DIR)
+    # Replays and recordings measure the stream, not call_control pacing repeated calls
+    os.environ.setdefault("BEDROCK_RATE_PER_SECOND", "100000")
+    os.environ.setdefault("BEDROCK_BURST", "100000")
+    os.environ.setdefault("RESPONSE_CACHE_ENABLED", "false")
+    os.environ.setdefault("AGENT_TRACE_LOG", os.path.join(tempfile.mkdtemp(prefix="cassette-traces-"), "traces.jsonl"))
+
+
+def _source_client(args):
+    import aws_clients
+
+    if args.fake:
+        import fake_aws
+
+        return fake_aws.FakeBedrockAgentRuntime()
+    return aws_clients.get_client("bedrock-agent-runtime", region_name=args.region)
+
+
+def run_agent_turn(agent_id, agent_alias_id, prompt, enable_trace=False):
+    # The app's own stream loop: AgentStream via BedrockAgentClient
+    from invoke_agent import BedrockAgentClient
+
+    client = BedrockAgentClient()
+    client.enable_trace = enable_trace
+    stream = client.stream_chat_with_agent(agent_id, agent_alias_id, prompt)
+    start = time.perf_counter()
+    first = None
+    size = 0
+    for chunk in stream:
+        if first is None:
+            first = time.perf_counter() - start
+        size += len(chunk.encode("utf-8"))
+    return first, time.perf_counter() - start, size, stream.result
+
+
+def run_flow_turn(flow_identifier, alias_identifier, prompt):
+    # The app's own stream loop: flow_stream.stream_flow, as query_bedrock_prompt_flow drives it
+    from aws_clients import get_client
+    from flow_stream import FlowTarget, stream_flow
+
+    target = FlowTarget("replay", flow_identifier, alias_identifier)
+    input_objects = [{"nodeName": "FlowInputNode", "nodeOutputName": "document", "content": {"document": prompt}}]
+
+    async def turn():
+        start = time.perf_counter()
+        first = None
+        size = 0
+        async for document in stream_flow(get_client("bedrock-agent-runtime"), target, input_objects, prompt):
+            if first is None:
+                first = time.perf_counter() - start
+            size += len((document if isinstance(document, str) else json.dumps(document)).encode("utf-8"))
+        return first, time.perf_counter() - start, size, None
+
+    return asyncio.run(turn())
+
+
+def run_consumer_turn(flow_identifier, alias_identifier, prompt):
+    # streamlit-bedrock-flow's loop: FlowStreamConsumer over the same invoke_flow call its page makes
+    from aws_clients import get_client
+    from call_control import call_controller
+    from flow_consumer import FlowStreamConsumer
+
+    input_objects = [{"nodeName": "FlowInputNode", "nodeOutputName": "document", "content": {"document": prompt}}]
+
+    def events():
+        response = call_controller.call(
+            f"flow:{alias_identifier}", get_client("bedrock-agent-runtime").invoke_flow, stream_field='responseStream',
+            flowIdentifier=flow_identifier, flowAliasIdentifier=alias_identifier, inputs=input_objects
+        )
+        return response['responseStream']
+
+    consumer = FlowStreamConsumer(events, target=f"flow:{alias_identifier}")
+    start = time.perf_counter()
+    first = None
+    size = 0
+    for _, document in consumer:
+        if first is None:
+            first = time.perf_counter() - start
+        size += len((document if isinstance(document, str) else json.dumps(document)).encode("utf-8"))
+    return first, time.perf_counter() - start, size, consumer.run
+
+
+def _flow_runner(app):
+    if os.path.exists(os.path.join(ROOT, app, "flow_consumer.py")):
+        return run_consumer_turn
+    return run_flow_turn
+
+
+def record(args, operation):
+    _use_app(args.app or DEFAULT_APPS[operation])
+    import aws_clients
+
+    cassette = Cassette()
+    aws_clients.override_client("bedrock-agent-runtime", RecordingClient(_source_client(args), cassette))
+    for prompt in args.prompt:
+        if operation == "invoke_agent":
+            first, total, size, result = run_agent_turn(args.agent_id, args.agent_alias_id, prompt, args.trace)
+            if result is not None and not result.ok:
+                print(f"Agent call failed: {result.error}", file=sys.stderr)
+        else:
+            alias = args.flow_alias
+            first, total, size, _ = _flow_runner(args.app or DEFAULT_APPS[operation])(args.flow or alias.split("/alias/")[0], alias, prompt)
+        print(f"recorded {size} bytes, first token {first * 1000 if first else 0:.0f} ms, total {total * 1000:.0f} ms")
+    cassette.save(args.cassette)
+    print(f"{len(cassette.interactions)} calls, {sum(len(i.events) for i in cassette.interactions)} events "
+          f"-> {args.cassette} ({os.path.getsize(args.cassette)} bytes)")
+
+
+def replay(args):
+    cassette = Cassette.load(args.cassette)
+    operation = cassette.interactions[0].operation
+    _use_app(args.app or DEFAULT_APPS[operation])
+    import aws_clients
+
+    aws_clients.override_client("bedrock-agent-runtime", ReplayClient(cassette, speed=args.speed))
+    recorded = [i for i in cassette.interactions if i.operation == operation]
+    events = sum(len(i.events) for i in recorded) / len(recorded)
+    recorded_first = sum(i.events[0][0] for i in recorded if i.events) / len(recorded)
+    recorded_total = sum(sum(delay for delay, _ in i.events) for i in recorded) / len(recorded)
+
+    run_flow = _flow_runner(args.app or DEFAULT_APPS[operation])
+    firsts, totals, sizes = [], [], 0
+    # The apps log every event; keep that work in the measurement but off the terminal
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(args.repeat):
+            if operation == "invoke_agent":
+                first, total, size, _ = run_agent_turn("replay", "replay", "replay")
+            else:
+                first, total, size, _ = run_flow("replay", "replay/alias/replay", "replay")
+            if first is not None:
+                firsts.append(first)
+            totals.append(total)
+            sizes += size
+
+    elapsed = sum(totals)
+    print(f"{operation} x{args.repeat} at speed {args.speed or 'max'} through {args.app or DEFAULT_APPS[operation]}")
+    print(f"  recorded:  first token {recorded_first * 1000:.1f} ms, total {recorded_total * 1000:.1f} ms, {events:.0f} events/call")
+    if firsts:
+        print(f"  replayed:  first token {sum(firsts) / len(firsts) * 1000:.2f} ms, total {elapsed / args.repeat * 1000:.2f} ms")
+    print(f"  throughput: {args.repeat * events / elapsed:,.0f} events/s, {sizes / elapsed / 1e6:.1f} MB/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record and replay Bedrock event streams")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    for name in ("record-agent", "record-flow"):
+        command = commands.add_parser(name)
+        command.add_argument("cassette")
+        command.add_argument("--prompt", action="append", required=True, help="repeat for several calls")
+        command.add_argument("--app", help="app directory whose stream loop makes the calls")
+        command.add_argument("--fake", action="store_true", help="record from fake_aws instead of AWS")
+        command.add_argument("--region", default="us-east-1")
+        if name == "record-agent":
+            command.add_argument("--agent-id", default=os.getenv("DISCOVERY_AGENT_ID", "default-discovery-id"))
+            command.add_argument("--agent-alias-id", default=os.getenv("DISCOVERY_AGENT_ALIAS_ID", "default-discovery-alias-id"))
+            command.add_argument("--trace", action="store_true", help="record with enableTrace")
+        else:
+            command.add_argument("--flow")
+            command.add_argument("--flow-alias", default=os.getenv("FLOW_ALIAS_IDENTIFIER"), required=not os.getenv("FLOW_ALIAS_IDENTIFIER"))
+
+    command = commands.add_parser("replay")
+    command.add_argument("cassette")
+    command.add_argument("--speed", type=float, default=0.0, help="1 = recorded pace, 0 = as fast as possible")
+    command.add_argument("--repeat", type=int, default=20)
+    command.add_argument("--app", help="app directory whose stream loop consumes the replay")
+
+    args = parser.parse_args()
+    if args.command == "record-agent":
+        record(args, "invoke_agent")
+    elif args.command == "record-flow":
+        record(args, "invoke_flow")
+    else:
+        replay(args)
@@ -0,0 +1,322 @@
+# In-process stand-ins for the AWS APIs the apps call, for load tests that must not touch AWS.
+#
+# Each fake mirrors the response shapes the app code reads: invoke_agent completion streams (with
+# optional trace events), invoke_flow response streams with one or more output nodes and a
+# completion event, converse, knowledge-base ingestion jobs that progress on a timer, and an S3
+# object store with ETags, If-None-Match and list_objects_v2 pagination. Latency, chunk size,
+# answer size and a throttling capacity are set through FakeSettings.
+#
+# install(settings) registers the fakes with the app's aws_clients, so any module that gets its
+# client through get_client() talks to them.
+import hashlib
+import io
+import itertools
+import threading
+import time
+from dataclasses import dataclass
+
+from botocore.exceptions import ClientError
+
+ANSWER_TEXT = (
+    "Based on the discovery data, the application tier can be rehosted on EC2 with right-sized "
+    "instances, the database is a good fit for Amazon RDS, and the batch jobs can move to AWS "
+    "Batch. Estimated migration wave: 3 weeks. "
+)
+
+
+@dataclass
+class FakeSettings:
+    # Delay before the first event (or before a non-streaming response)
+    first_byte_ms: float = 200.0
+    # Delay between streamed chunks
+    chunk_ms: float = 20.0
+    chunk_size: int = 256
+    answer_bytes: int = 4096
+    flow_output_nodes: int = 1
+    # Calls per second admitted per operation before ThrottlingException; 0 for unlimited
+    capacity: float = 0.0
+    ingestion_seconds: float = 1.0
+    converse_reply: str = "No"
+
+
+def client_error(code, operation, status=400, message=None):
+    return ClientError(
+        {"Error": {"Code": code, "Message": message or code}, "ResponseMetadata": {"HTTPStatusCode": status}},
+        operation
+    )
+
+
+def answer_bytes(size):
+    text = (ANSWER_TEXT * (size // len(ANSWER_TEXT) + 1))[:size]
+    return text.encode("utf-8")
+
+
+class _Capacity:
+    # Server-side token bucket per operation, like a Bedrock quota
+    def __init__(self, rate):
+        self.rate = rate
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def check(self, operation):
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated = self._buckets.get(operation, (self.rate, now))
+            tokens = min(self.rate, tokens + (now - updated) * self.rate)
+            admitted = tokens >= 1
+            self._buckets[operation] = (tokens - 1 if admitted else tokens, now)
+        if not admitted:
+            raise client_error("ThrottlingException", operation, 429, "Rate exceeded")
+
+
+class _FakeClient:
+    def __init__(self, settings=None):
+        self.settings = settings or FakeSettings()
+        self._capacity = _Capacity(self.settings.capacity)
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def _call(self, operation):
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        self._capacity.check(operation)
+
+    def _pause(self, ms):
+        if ms:
+            time.sleep(ms / 1000)
+
+
+class FakeBedrockAgentRuntime(_FakeClient):
+    def invoke_agent(self, agentId, agentAliasId, sessionId, inputText, enableTrace=False, endSession=False, **kwargs):
+        self._call("InvokeAgent")
+        settings = self.settings
+        payload = b"" if endSession else answer_bytes(settings.answer_bytes)
+
+        def completion():
+            self._pause(settings.first_byte_ms)
+            if enableTrace:
+                for trace in _agent_traces(settings):
+                    yield {"trace": {"agentId": agentId, "sessionId": sessionId, "trace": trace}}
+            for start in range(0, len(payload), settings.chunk_size):
+                if start:
+                    self._pause(settings.chunk_ms)
+                yield {"chunk": {"bytes": payload[start:start + settings.chunk_size]}}
+
+        return {"completion": completion(), "sessionId": sessionId, "contentType": "application/json"}
+
+    def invoke_flow(self, flowIdentifier, flowAliasIdentifier, inputs, **kwargs):
+        self._call("InvokeFlow")
+        settings = self.settings
+        document = answer_bytes(settings.answer_bytes).decode("utf-8")
+
+        def response_stream():
+            self._pause(settings.first_byte_ms)
+            for node in range(settings.flow_output_nodes):
+                if node:
+                    self._pause(settings.chunk_ms)
+                yield {"flowOutputEvent": {
+                    "nodeName": f"FlowOutputNode{'' if node == 0 else node + 1}",
+                    "nodeType": "FlowOutputNode",
+                    "content": {"document": document},
+                }}
+            yield {"flowCompletionEvent": {"completionReason": "SUCCESS"}}
+
+        return {"responseStream": response_stream(), "executionId": hashlib.md5(str(time.time()).encode()).hexdigest()}
+
+
+def _agent_traces(settings):
+    trace_id = "fake-trace-0"
+    return [
+        {"orchestrationTrace": {"rationale": {"traceId": trace_id, "text": "Look up the customer's inventory first."}}},
+        {"orchestrationTrace": {"invocationInput": {
+            "traceId": trace_id, "invocationType": "KNOWLEDGE_BASE",
+            "knowledgeBaseLookupInput": {"text": "server inventory", "knowledgeBaseId": "FAKEKB"},
+        }}},
+        {"orchestrationTrace": {"observation": {
+            "traceId": trace_id, "type": "KNOWLEDGE_BASE",
+            "knowledgeBaseLookupOutput": {"retrievedReferences": [{"content": {"text": "..."}}] * 3},
+        }}},
+        {"orchestrationTrace": {"modelInvocationOutput": {
+            "traceId": trace_id,
+            "metadata": {"usage": {"inputTokens": 1200, "outputTokens": settings.answer_bytes // 4}},
+        }}},
+    ]
+
+
+class FakeBedrockRuntime(_FakeClient):
+    def converse(self, modelId, messages, **kwargs):
+        self._call("Converse")
+        self._pause(self.settings.first_byte_ms)
+        reply = self.settings.converse_reply
+        return {
+            "output": {"message": {"role": "assistant", "content": [{"text": reply}]}},
+            "stopReason": "end_turn",
+            "usage": {"inputTokens": sum(len(str(m)) for m in messages) // 4, "outputTokens": len(reply) // 4 + 1},
+        }
+
+
+class FakeBedrockAgent(_FakeClient):
+    # Knowledge-base ingestion control plane; a job completes `ingestion_seconds` after it starts
+    def __init__(self, settings=None, bucket="fake-kb-bucket"):
+        super().__init__(settings)
+        self.bucket = bucket
+        self._jobs = {}
+        self._ids = itertools.count(1)
+
+    def _status(self, job):
+        age = time.monotonic() - job["started"]
+        if age >= self.settings.ingestion_seconds:
+            return "COMPLETE"
+        return "STARTING" if age < self.settings.ingestion_seconds * 0.1 else "IN_PROGRESS"
+
+    def _summary(self, job):
+        return {
+            "knowledgeBaseId": job["knowledgeBaseId"],
+            "dataSourceId": job["dataSourceId"],
+            "ingestionJobId": job["ingestionJobId"],
+            "status": self._status(job),
+        }
+
+    def start_ingestion_job(self, knowledgeBaseId, dataSourceId, **kwargs):
+        self._call("StartIngestionJob")
+        with self._lock:
+            for job in self._jobs.values():
+                if (job["knowledgeBaseId"], job["dataSourceId"]) == (knowledgeBaseId, dataSourceId) \
+                        and self._status(job) != "COMPLETE":
+                    raise client_error("ConflictException", "StartIngestionJob", 409)
+            job = {
+                "knowledgeBaseId": knowledgeBaseId,
+                "dataSourceId": dataSourceId,
+                "ingestionJobId": f"job-{next(self._ids)}",
+                "started": time.monotonic(),
+            }
+            self._jobs[job["ingestionJobId"]] = job
+        return {"ingestionJob": self._summary(job)}
+
+    def get_ingestion_job(self, knowledgeBaseId, dataSourceId, ingestionJobId, **kwargs):
+        self._call("GetIngestionJob")
+        job = self._jobs.get(ingestionJobId)
+        if job is None:
+            raise client_error("ResourceNotFoundException", "GetIngestionJob", 404)
+        return {"ingestionJob": self._summary(job)}
+
+    def list_ingestion_jobs(self, knowledgeBaseId, dataSourceId, filters=None, **kwargs):
+        self._call("ListIngestionJobs")
+        wanted = set()
+        for f in filters or []:
+            if f.get("attribute") == "STATUS":
+                wanted.update(f.get("values", []))
+        summaries = [
+            self._summary(job) for job in self._jobs.values()
+            if (job["knowledgeBaseId"], job["dataSourceId"]) == (knowledgeBaseId, dataSourceId)
+        ]
+        if wanted:
+            summaries = [s for s in summaries if s["status"] in wanted]
+        return {"ingestionJobSummaries": summaries[-kwargs.get("maxResults", 100):]}
+
+    def get_data_source(self, knowledgeBaseId, dataSourceId, **kwargs):
+        self._call("GetDataSource")
+        return {"dataSource": {
+            "knowledgeBaseId": knowledgeBaseId,
+            "dataSourceId": dataSourceId,
+            "dataSourceConfiguration": {
+                "type": "S3",
+                "s3Configuration": {"bucketArn": f"arn:aws:s3:::{self.bucket}", "inclusionPrefixes": [f"{knowledgeBaseId}/"]},
+            },
+        }}
+
+
+class _Body:
+    def __init__(self, data):
+        self._stream = io.BytesIO(data)
+
+    def read(self, amount=None):
+        return self._stream.read(amount)
+
+    def iter_chunks(self, chunk_size=1024):
+        while True:
+            chunk = self._stream.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+class _ListObjectsPaginator:
+    def __init__(self, s3, page_size=1000):
+        self.s3 = s3
+        self.page_size = page_size
+
+    def paginate(self, Bucket, Prefix=""):
+        keys = sorted(k for k in self.s3._objects.get(Bucket, {}) if k.startswith(Prefix))
+        for start in range(0, max(len(keys), 1), self.page_size):
+            page = keys[start:start + self.page_size]
+            yield {"Contents": [self.s3._listing(Bucket, key) for key in page], "KeyCount": len(page)}
+
+
+class FakeS3(_FakeClient):
+    def __init__(self, settings=None):
+        super().__init__(settings)
+        self._objects = {}
+
+    def _listing(self, bucket, key):
+        data, etag, modified = self._objects[bucket][key]
+        return {"Key": key, "ETag": etag, "Size": len(data), "LastModified": modified}
+
+    def put_object(self, Bucket, Key, Body=b"", **kwargs):
+        self._call("PutObject")
+        data = Body.read() if hasattr(Body, "read") else (Body.encode("utf-8") if isinstance(Body, str) else Body)
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        with self._lock:
+            self._objects.setdefault(Bucket, {})[Key] = (data, etag, time.time())
+        return {"ETag": etag}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, Callback=None, Config=None):
+        data = Fileobj.read()
+        self._pause(self.settings.first_byte_ms)
+        if Callback is not None:
+            for start in range(0, len(data), 8 * 1024 * 1024):
+                Callback(len(data[start:start + 8 * 1024 * 1024]))
+        self.put_object(Bucket=Bucket, Key=Key, Body=data)
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None, **kwargs):
+        self._call("GetObject")
+        self._pause(self.settings.first_byte_ms)
+        stored = self._objects.get(Bucket, {}).get(Key)
+        if stored is None:
+            raise client_error("NoSuchKey", "GetObject", 404)
+        data, etag, modified = stored
+        if IfNoneMatch is not None and IfNoneMatch == etag:
+            raise client_error("304", "GetObject", 304, "Not Modified")
+        return {"Body": _Body(data), "ETag": etag, "ContentLength": len(data), "LastModified": modified}
+
+    def list_objects_v2(self, Bucket, Prefix="", **kwargs):
+        self._call("ListObjectsV2")
+        page = next(_ListObjectsPaginator(self).paginate(Bucket, Prefix))
+        return dict(page, IsTruncated=False)
+
+    def get_paginator(self, operation_name):
+        if operation_name != "list_objects_v2":
+            raise NotImplementedError(operation_name)
+        return _ListObjectsPaginator(self)
+
+
+def fake_clients(settings=None):
+    settings = settings or FakeSettings()
+    return {
+        "bedrock-agent-runtime": FakeBedrockAgentRuntime(settings),
+        "bedrock-runtime": FakeBedrockRuntime(settings),
+        "bedrock-agent": FakeBedrockAgent(settings),
+        "s3": FakeS3(settings),
+    }
+
+
+def install(settings=None):
+    # Point the current app's aws_clients at the fakes (the app directory must be on sys.path)
+    import aws_clients
+
+    clients = fake_clients(settings)
+    for service_name, client in clients.items():
+        aws_clients.override_client(service_name, client)
+    return clients
@@ -0,0 +1,258 @@
+# End-to-end load test of the apps against the local AWS stand-ins in fake_aws.
+#
+# Scenarios, each driving the real app modules (only the AWS clients are fake):
+#   agent      streamlit-app BedrockAgentClient; every session asks --turns questions in a row
+#   flow       streamlit_prompt_flow flow_stream; every session streams one turn from --flows flows at once
+#   ingestion  streamlit-ui IngestionJobManager; every session syncs its own knowledge base
+#   ecm        streamlit-ui ECM parsing, summary and radar chart for one uploaded inventory per session
+#
+# Sessions run on their own threads, as Streamlit runs each browser session. For each concurrency
+# level the suite reports time to first token, p50/p99 latency, throughput and peak traced memory
+# per session (measured in a second, traced pass so tracing doesn't skew the timings). The apps
+# share module names, so each scenario and level runs in its own process with its app on sys.path.
+#
+# Run: python benchmarks/load_test.py [--scenarios agent flow ingestion ecm] [--concurrency 1 8 32]
+#      [--latency-ms 200] [--chunk-ms 20] [--chunk-size 256] [--answer-kb 4] [--capacity 0]
+import argparse
+import asyncio
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+APP_DIRS = {
+    "agent": "streamlit-app",
+    "flow": os.path.join("streamlit_prompt_flow", "src"),
+    "ingestion": "streamlit-ui",
+    "ecm": "streamlit-ui",
+}
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+# Scenario sessions: each returns [(time to first token or None, latency, ok), ...]
+
+def agent_session(index, args, context):
+    from invoke_agent import BedrockAgentClient
+
+    client = BedrockAgentClient()
+    session_id = uuid.uuid4().hex
+    samples = []
+    for turn in range(args.turns):
+        start = time.perf_counter()
+        first = None
+        stream = client.stream_chat_with_agent("FAKEAGENT", "FAKEALIAS", f"Question {turn} from session {index}",
+                                               session_id=session_id)
+        for _ in stream:
+            if first is None:
+                first = time.perf_counter() - start
+        samples.append((first, time.perf_counter() - start, stream.result.ok))
+    return samples
+
+
+def flow_session(index, args, context):
+    from aws_clients import get_client
+    from flow_stream import FlowTarget, stream_flow
+
+    client = get_client("bedrock-agent-runtime")
+    targets = [FlowTarget(f"flow-{i}", "FAKEFLOW", f"FAKEFLOW/alias/{i}") for i in range(args.flows)]
+    document = json.dumps([{"role": "user", "content": f"Question from session {index}"}])
+    input_objects = [{"nodeName": "FlowInputNode", "nodeOutputName": "document", "content": {"document": document}}]
+
+    async def one(target):
+        start = time.perf_counter()
+        first = None
+        ok = True
+        try:
+            async for _ in stream_flow(client, target, input_objects, document):
+                if first is None:
+                    first = time.perf_counter() - start
+        except Exception:
+            ok = False
+        return first, time.perf_counter() - start, ok
+
+    async def turn():
+        return await asyncio.gather(*[one(target) for target in targets])
+
+    return list(asyncio.run(turn()))
+
+
+def ingestion_session(index, args, context):
+    job = context["manager"].submit(f"FAKEKB{index}", "FAKEDS")
+    start = time.perf_counter()
+    job.wait(timeout=120)
+    return [(None, time.perf_counter() - start, job.succeeded)]
+
+
+def ecm_session(index, args, context):
+    from graph import create_radar_chart, parse_excel_bytes
+
+    start = time.perf_counter()
+    summary = parse_excel_bytes(context["files"][index], f"ecm-{index}.csv")
+    create_radar_chart(summary.radar)
+    return [(None, time.perf_counter() - start, summary is not None)]
+
+
+SESSIONS = {"agent": agent_session, "flow": flow_session, "ingestion": ingestion_session, "ecm": ecm_session}
+
+
+def prepare(scenario, args, sessions, offset):
+    # Per-process state the app would hold, built before the clock starts
+    context = {}
+    if scenario == "ingestion":
+        from ingestion import IngestionJobManager, SourceManifest
+
+        context["manager"] = IngestionJobManager(
+            initial_delay=0.05, max_delay=0.25,
+            manifest=SourceManifest(os.path.join(tempfile.mkdtemp(), "manifest.json"))
+        )
+    elif scenario == "ecm":
+        from bench_ecm_ingest import synthetic_inventory
+
+        # Different data per session so the memoised summaries don't turn into cache hits
+        context["files"] = {
+            index: synthetic_inventory(args.rows, seed=offset + index).to_csv(index=False).encode("utf-8")
+            for index in range(sessions)
+        }
+    return context
+
+
+def run_sessions(scenario, args, sessions, context):
+    session = SESSIONS[scenario]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        results = list(pool.map(lambda index: session(index, args, context), range(sessions)))
+    return [sample for samples in results for sample in samples], time.perf_counter() - start
+
+
+def worker(args):
+    import fake_aws
+
+    settings = fake_aws.FakeSettings(
+        first_byte_ms=args.latency_ms, chunk_ms=args.chunk_ms, chunk_size=args.chunk_size,
+        answer_bytes=args.answer_kb * 1024, flow_output_nodes=args.output_nodes, capacity=args.capacity,
+        ingestion_seconds=args.ingestion_seconds,
+    )
+    fake_aws.install(settings)
+    sessions = args.sessions
+
+    samples, wall = run_sessions(args.worker, args, sessions, prepare(args.worker, args, sessions, 0))
+
+    memory_per_session = None
+    if not args.no_memory:
+        fake_aws.install(settings)
+        context = prepare(args.worker, args, sessions, sessions)
+        tracemalloc.start()
+        run_sessions(args.worker, args, sessions, context)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        memory_per_session = peak / sessions
+
+    ttfts = [s[0] for s in samples if s[0] is not None]
+    latencies = [s[1] for s in samples if s[2]]
+    result = {
+        "scenario": args.worker,
+        "sessions": sessions,
+        "samples": len(samples),
+        "errors": sum(1 for s in samples if not s[2]),
+        "ttft_p50": percentile(ttfts, 0.5),
+        "ttft_p99": percentile(ttfts, 0.99),
+        "p50": percentile(latencies, 0.5),
+        "p99": percentile(latencies, 0.99),
+        "throughput": len(samples) / wall if wall else None,
+        "memory_per_session": memory_per_session,
+    }
+    # The app modules print from their own threads, so the result goes to a file rather than stdout
+    with open(args.result, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+
+def run_level(scenario, sessions, args, scratch):
+    result_path = os.path.join(scratch, f"{scenario}-{sessions}.json")
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": os.pathsep.join([BENCH_DIR, os.path.join(ROOT, APP_DIRS[scenario])]),
+        # Keep the load test's state out of the app directories
+        "KB_MANIFEST_PATH": os.path.join(scratch, "kb_manifest.json"),
+        "ECM_CACHE_DIR": os.path.join(scratch, "ecm_cache"),
+        "AGENT_TRACE_LOG": os.path.join(scratch, "traces.jsonl"),
+        "RESPONSE_CACHE_ENABLED": "false",
+    })
+    if not args.controller_rate:
+        # Measure the fakes, not call_control pacing them; --controller-rate keeps it in the loop
+        env.setdefault("BEDROCK_RATE_PER_SECOND", "100000")
+        env.setdefault("BEDROCK_BURST", "100000")
+    else:
+        env["BEDROCK_RATE_PER_SECOND"] = str(args.controller_rate)
+    command = [
+        sys.executable, os.path.abspath(__file__), "--worker", scenario, "--sessions", str(sessions),
+        "--turns", str(args.turns), "--flows", str(args.flows), "--rows", str(args.rows),
+        "--latency-ms", str(args.latency_ms), "--chunk-ms", str(args.chunk_ms),
+        "--chunk-size", str(args.chunk_size), "--answer-kb", str(args.answer_kb),
+        "--output-nodes", str(args.output_nodes), "--capacity", str(args.capacity),
+        "--ingestion-seconds", str(args.ingestion_seconds), "--result", result_path,
+    ] + (["--no-memory"] if args.no_memory else [])
+    completed = subprocess.run(command, cwd=os.path.join(ROOT, APP_DIRS[scenario]), env=env,
+                               capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{scenario} x{sessions} failed:\n{completed.stderr}")
+    with open(result_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def ms(value):
+    return f"{value * 1000:.0f}" if value is not None else "-"
+
+
+def main(args):
+    scratch = tempfile.mkdtemp(prefix="migrationpro-loadtest-")
+    print(f"fake AWS: first byte {args.latency_ms:.0f} ms, {args.chunk_size} B chunks every {args.chunk_ms:.0f} ms, "
+          f"{args.answer_kb} KB answers, capacity {args.capacity or 'unlimited'}")
+    print(f"{'scenario':>10} {'sessions':>8} {'samples':>7} {'errors':>6} {'ttft_p50':>9} {'ttft_p99':>9} "
+          f"{'p50_ms':>8} {'p99_ms':>8} {'per_s':>7} {'KB/session':>10}")
+    for scenario in args.scenarios:
+        for sessions in args.concurrency:
+            r = run_level(scenario, sessions, args, scratch)
+            memory = f"{r['memory_per_session'] / 1024:.0f}" if r["memory_per_session"] is not None else "-"
+            print(f"{scenario:>10} {sessions:>8} {r['samples']:>7} {r['errors']:>6} {ms(r['ttft_p50']):>9} "
+                  f"{ms(r['ttft_p99']):>9} {ms(r['p50']):>8} {ms(r['p99']):>8} {r['throughput']:>7.1f} {memory:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the apps against local AWS stand-ins")
+    parser.add_argument("--scenarios", nargs="+", default=list(SESSIONS), choices=list(SESSIONS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--turns", type=int, default=3, help="agent questions per session")
+    parser.add_argument("--flows", type=int, default=2, help="flows compared per flow session")
+    parser.add_argument("--rows", type=int, default=5000, help="servers per ECM inventory")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="fake time to first byte")
+    parser.add_argument("--chunk-ms", type=float, default=20.0, help="fake delay between chunks")
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--answer-kb", type=int, default=4)
+    parser.add_argument("--output-nodes", type=int, default=1, help="flow output nodes per answer")
+    parser.add_argument("--capacity", type=float, default=0.0, help="fake calls/s before throttling; 0 = unlimited")
+    parser.add_argument("--ingestion-seconds", type=float, default=1.0)
+    parser.add_argument("--controller-rate", type=float, default=0.0,
+                        help="call_control rate per target; 0 lifts it so only the fakes are measured")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced memory pass")
+    parser.add_argument("--worker", choices=list(SESSIONS), help=argparse.SUPPRESS)
+    parser.add_argument("--sessions", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        worker(args)
+    else:
+        main(args)
@@ -0,0 +1,227 @@
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import asdict, dataclass
+
+# Structured capture of Bedrock agent traces.
+# With AGENT_TRACE_ENABLED=true agents are invoked with enableTrace and each trace event is reduced
+# to a compact record: which step ran (rationale, knowledge-base lookup, model call, ...), how long
+# it took, tokens used and knowledge-base hits. The newest records of each session are kept in a
+# fixed-size ring buffer for the page, and every record is appended to a rotating JSONL file by a
+# background writer so slow steps can be found later without holding traces in session memory.
+
+TRACE_ENABLED = os.getenv("AGENT_TRACE_ENABLED", "false").lower() == "true"
+TRACE_RING_SIZE = int(os.getenv("AGENT_TRACE_RING_SIZE", "200"))
+# Ring buffers for the least recently traced sessions are dropped beyond this many sessions
+TRACE_MAX_SESSIONS = 500
+TRACE_LOG_PATH = os.getenv("AGENT_TRACE_LOG", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".agent_traces", "traces.jsonl"))
+TRACE_LOG_MAX_BYTES = int(os.getenv("AGENT_TRACE_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_LOG_BACKUPS = int(os.getenv("AGENT_TRACE_LOG_BACKUPS", "5"))
+# Records waiting for the writer; beyond this they are counted and dropped rather than blocking the answer
+TRACE_MAX_PENDING = 10000
+DETAIL_CHARS = 200
+
+PHASES = {
+    "preProcessingTrace": "pre_processing",
+    "orchestrationTrace": "orchestration",
+    "postProcessingTrace": "post_processing",
+    "routingClassifierTrace": "routing",
+}
+PARTS = {
+    "rationale": "rationale",
+    "modelInvocationInput": "model_input",
+    "modelInvocationOutput": "model_output",
+    "parsedResponse": "parsed_response",
+}
+
+
+@dataclass
+class TraceRecord:
+    session_id: str
+    agent_id: str
+    step: str
+    trace_id: str = None
+    # Seconds since the request was sent
+    at: float = 0.0
+    # Step duration reported by Bedrock, else the gap since the previous trace event
+    latency_ms: float = None
+    input_tokens: int = None
+    output_tokens: int = None
+    kb_hits: int = None
+    detail: str = None
+
+
+def _short(text):
+    if not text:
+        return None
+    text = " ".join(str(text).split())
+    return text if len(text) <= DETAIL_CHARS else text[:DETAIL_CHARS - 1] + "…"
+
+
+def _step_name(part_key, part):
+    if part_key == "invocationInput":
+        if "knowledgeBaseLookupInput" in part:
+            return "kb_lookup", _short(part["knowledgeBaseLookupInput"].get("text")), None
+        if "actionGroupInvocationInput" in part:
+            action = part["actionGroupInvocationInput"]
+            return "action_group", _short(f"{action.get('actionGroupName', '')} {action.get('apiPath') or action.get('function') or ''}"), None
+        return "invocation", _short(part.get("invocationType")), None
+    if part_key == "observation":
+        if "knowledgeBaseLookupOutput" in part:
+            references = part["knowledgeBaseLookupOutput"].get("retrievedReferences") or []
+            return "kb_result", None, len(references)
+        if "finalResponse" in part:
+            return "final_response", _short(part["finalResponse"].get("text")), None
+        if "actionGroupInvocationOutput" in part:
+            return "action_group_result", _short(part["actionGroupInvocationOutput"].get("text")), None
+        return "observation", _short(part.get("type")), None
+    if part_key == "rationale":
+        return "rationale", _short(part.get("text")), None
+    return PARTS.get(part_key, part_key), None, None
+
+
+def parse_trace(event_trace, session_id, agent_id, at, since_previous):
+    # One `trace` event from invoke_agent -> TraceRecord, or None for shapes we don't summarise
+    trace = event_trace.get("trace", {})
+    if "failureTrace" in trace:
+        failure = trace["failureTrace"]
+        return TraceRecord(session_id, agent_id, "failure", failure.get("traceId"), at,
+                           since_previous * 1000, detail=_short(failure.get("failureReason")))
+    if "guardrailTrace" in trace:
+        guardrail = trace["guardrailTrace"]
+        return TraceRecord(session_id, agent_id, "guardrail", guardrail.get("traceId"), at,
+                           since_previous * 1000, detail=_short(guardrail.get("action")))
+
+    for phase_key, phase in PHASES.items():
+        body = trace.get(phase_key)
+        if not body:
+            continue
+        for part_key, part in body.items():
+            if not isinstance(part, dict):
+                continue
+            step, detail, kb_hits = _step_name(part_key, part)
+            metadata = part.get("metadata") or {}
+            usage = metadata.get("usage") or {}
+            latency_ms = metadata.get("totalTimeMs")
+            return TraceRecord(
+                session_id, agent_id, f"{phase}.{step}", part.get("traceId"), at,
+                latency_ms if latency_ms is not None else since_previous * 1000,
+                usage.get("inputTokens"), usage.get("outputTokens"), kb_hits, detail,
+            )
+    return None
+
+
+class JsonlSink:
+    # Appends records on a background thread, rotating path -> path.1 ... path.N by size
+    def __init__(self, path=TRACE_LOG_PATH, max_bytes=TRACE_LOG_MAX_BYTES, backups=TRACE_LOG_BACKUPS,
+                 max_pending=TRACE_MAX_PENDING):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def put(self, record):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="agent-trace-writer", daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        # Blocks until everything queued so far is on disk
+        self._queue.join()
+
+    def _rotate(self):
+        for index in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{index + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 500:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    for record in batch:
+                        f.write(json.dumps(record) + "\n")
+                    size = f.tell()
+                if size >= self.max_bytes:
+                    self._rotate()
+            except OSError as e:
+                print(f"Could not write agent traces to {self.path}: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+
+class TraceRecorder:
+    def __init__(self, ring_size=TRACE_RING_SIZE, max_sessions=TRACE_MAX_SESSIONS, sink=None):
+        self.ring_size = ring_size
+        self.max_sessions = max_sessions
+        self.sink = sink if sink is not None else JsonlSink()
+        self._rings = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, session_id, records):
+        if not records:
+            return
+        with self._lock:
+            ring = self._rings.get(session_id)
+            if ring is None:
+                ring = self._rings[session_id] = deque(maxlen=self.ring_size)
+            self._rings.move_to_end(session_id)
+            while len(self._rings) > self.max_sessions:
+                self._rings.popitem(last=False)
+            ring.extend(records)
+        logged_at = time.time()
+        for record in records:
+            self.sink.put(dict(record, logged_at=logged_at))
+
+    def recent(self, session_id, limit=None):
+        with self._lock:
+            records = list(self._rings.get(session_id, ()))
+        return records[-limit:] if limit else records
+
+    def slowest(self, session_id, limit=5):
+        records = [r for r in self.recent(session_id) if r.get("latency_ms") is not None]
+        return sorted(records, key=lambda r: r["latency_ms"], reverse=True)[:limit]
+
+
+class TraceCollector:
+    # Turns one invoke_agent stream's trace events into record dicts
+    def __init__(self, session_id, agent_id):
+        self.session_id = session_id
+        self.agent_id = agent_id
+        self.records = []
+        self.start = time.perf_counter()
+        self._previous = self.start
+
+    def add(self, event_trace):
+        now = time.perf_counter()
+        record = parse_trace(event_trace, self.session_id, self.agent_id, now - self.start, now - self._previous)
+        self._previous = now
+        if record is not None:
+            self.records.append(asdict(record))
+
+
+# Process-wide recorder; ring buffers are keyed by Bedrock session id
+trace_recorder = TraceRecorder()
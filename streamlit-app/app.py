@@ -5,6 +5,12 @@ import pandas as pd
 from PIL import Image, ImageOps, ImageDraw
 import os
 from invoke_agent import BedrockAgentClient
+from chat_history import get_history, render_history
+from agent_sessions import agent_session_manager, user_session_key
+from fanout import AgentFanout, AgentTarget
+from stream_render import StreamRenderer
+from metrics import render_metrics_panel
+from agent_trace import trace_recorder
 
 # Streamlit page configuration
 st.set_page_config(page_title="AWS MigrationPro", page_icon=":robot_face:", layout="wide")
@@ -33,27 +39,36 @@ submit_button = st.button("Submit", type="primary")
 # Display a button to end the session
 end_session_button = st.button("End Session")
 
+# Your agent and alias IDs from the Bedrock console
+AGENTS = {
+    "Discovery Agent": (
+        os.getenv("DISCOVERY_AGENT_ID", "default-discovery-id"),
+        os.getenv("DISCOVERY_AGENT_ALIAS_ID", "default-discovery-alias-id"),
+    ),
+    "Analysis Agent": (
+        os.getenv("ANALYSIS_AGENT_ID", "default-analysis-id"),
+        os.getenv("ANALYSIS_AGENT_ALIAS_ID", "default-analysis-alias-id"),
+    ),
+    "Recommendation Agent": (
+        os.getenv("RECOMMENDATION_AGENT_ID", "default-recommendation-id"),
+        os.getenv("RECOMMENDATION_AGENT_ALIAS_ID", "default-recommendation-alias-id"),
+    ),
+}
+FANOUT_TIMEOUT = float(os.getenv("FANOUT_TIMEOUT_SECONDS", "120"))
+
 # Sidebar for selecting agent
-agentList = ["Discovery Agent", "Analysis Agent", "Recommendation Agent"]
+agentList = list(AGENTS)
 selected_agent = st.sidebar.selectbox("Select Tool", agentList)
+agent_id, agent_alias_id = AGENTS[selected_agent]
 
-# Your agent and alias IDs from the Bedrock console
-if selected_agent=='Discovery Agent':
-    agent_id = os.getenv("DISCOVERY_AGENT_ID", "default-discovery-id")
-    agent_alias_id = os.getenv("DISCOVERY_AGENT_ALIAS_ID", "default-discovery-alias-id")
-if selected_agent=='Analysis Agent':
-    agent_id = os.getenv("ANALYSIS_AGENT_ID", "default-analysis-id")
-    agent_alias_id = os.getenv("ANALYSIS_AGENT_ALIAS_ID", "default-analysis-alias-id")
-if selected_agent == "Recommendation Agent":
-    agent_id = os.getenv("RECOMMENDATION_AGENT_ID", "default-recommendation-id")
-    agent_alias_id = os.getenv("RECOMMENDATION_AGENT_ALIAS_ID", "default-recommendation-alias-id")
+# Optionally send the same question to more agents and compare the answers side by side
+compare_agents = st.sidebar.multiselect("Also ask", [name for name in agentList if name != selected_agent])
 
 # Text input box
 st.write(selected_agent)
 
 # Session State Management
-if 'history' not in st.session_state:
-    st.session_state['history'] = []
+history = get_history()
 
 # Function to parse and format response
 def format_response(response_body):
@@ -69,82 +84,116 @@ def format_response(response_body):
         # If response is not JSON, return as is
         return response_body
 
+def ask_agents_side_by_side(agent_names, prompt):
+    # All agents stream concurrently, each into its own column
+    targets = []
+    agent_sessions = []
+    for name in agent_names:
+        target_agent_id, target_alias_id = AGENTS[name]
+        agent_session = agent_session_manager.get_session(user_session_key(), target_agent_id, target_alias_id)
+        agent_sessions.append(agent_session)
+        targets.append(AgentTarget(name, target_agent_id, target_alias_id, agent_session.session_id))
+
+    columns = st.columns(len(targets))
+    placeholders = {}
+    renderers = {}
+    for column, target in zip(columns, targets):
+        column.markdown(f"**{target.name}**")
+        placeholders[target.name] = column.empty()
+        # Each column is redrawn at most once per frame, not once per chunk
+        renderers[target.name] = StreamRenderer(placeholders[target.name])
+
+    final_answers = {}
+    for event in AgentFanout(agent_client).stream(targets, prompt, timeout=FANOUT_TIMEOUT):
+        if event.kind == "chunk":
+            renderers[event.target].add(event.text)
+        elif event.kind == "done":
+            renderers[event.target].finish()
+            final_answers[event.target] = event.result.response
+        else:
+            print(f"{event.target} {event.kind}: {event.text}")
+            final_answers[event.target] = f"Apologies, no answer ({event.kind}). Please try again"
+            placeholders[event.target].warning(final_answers[event.target])
+        # Any event is a chance to draw text another column is holding for its next frame
+        for name, renderer in renderers.items():
+            if name not in final_answers and renderer.time_to_next_frame() == 0:
+                renderer.flush()
+
+    for agent_session in agent_sessions:
+        agent_session_manager.record_turn(agent_session)
+    for target in targets:
+        history.append(prompt, final_answers.get(target.name, ""), target.name)
+
 # Handling user input and responses
-if submit_button and prompt:
+if submit_button and prompt and compare_agents:
+    ask_agents_side_by_side([selected_agent] + compare_agents, prompt)
+    st.session_state['prompt'] = "" # clear out input box
+
+elif submit_button and prompt:
     event = {
         "sessionId": "MYSESSION",
         "question": prompt
     }
     # response = agenthelper.lambda_handler(event, None)
-    response = agent_client.chat_with_agent(
+    # Same Bedrock session for this user and agent on every rerun, so the agent keeps its memory
+    agent_session = agent_session_manager.get_session(user_session_key(), agent_id, agent_alias_id)
+    stream = agent_client.stream_chat_with_agent(
         agent_id=agent_id,
         agent_alias_id=agent_alias_id,
-        prompt=prompt
+        prompt=prompt,
+        session_id=agent_session.session_id
     )
-    
-    try:
-        # Parse the JSON string
-        if response and 'body' in response and response['body']:
-            response_data = json.loads(response['body'])
-            print("TRACE & RESPONSE DATA ->  ", response_data)
-        else:
-            print("Invalid or empty response received")
-    except json.JSONDecodeError as e:
-        print("JSON decoding error:", e)
-        response_data = None 
-    
-    try:
-        # Extract the response and trace data
-        # all_data = format_response(response_data['trace_data']) # raw tracing data for debugging purpose, not showing in the current version
-        the_response = response_data['response'] # the actural agent response
-    except:
+
+    # Show the answer while it streams in; the history box below takes over once it is complete
+    live_response = st.empty()
+    with live_response.container():
+        st.write_stream(stream)
+    live_response.empty()
+
+    response_data = stream.result
+    agent_session_manager.record_turn(agent_session)
+    print("TRACE & RESPONSE DATA ->  ", response_data)
+
+    if response_data is not None and response_data.ok:
+        # all_data = format_response(response_data.trace_data) # raw tracing data for debugging purpose, not showing in the current version
+        the_response = response_data.response # the actural agent response
+    else:
         # all_data = "..." 
         the_response = "Apologies, but an error occurred. Please rerun the application" 
 
     # Use trace_data and formatted_response as needed
     # st.sidebar.text_area("", value=all_data, height=300)
-    st.session_state['history'].append({"question": prompt, "answer": the_response,"agent": selected_agent})
+    history.append(prompt, the_response, selected_agent)
     # st.session_state['trace_data'] = the_response
     st.session_state['prompt'] = "" # clear out input box
   
 
 if end_session_button:
-    st.session_state['history'].append({"question": "Session Ended", "answer": "Thank you for using AnyCompany Support Agent!", "agent": selected_agent})
-    event = {
-        "sessionId": "MYSESSION",
-        "question": "placeholder to end session",
-        "endSession": True
-    }
-    agenthelper.lambda_handler(event, None)
-    st.session_state['history'].clear()
-
-MAX_HISTORY_WINDOW = 6
-
-# Display recent messages in a structured layout
-displayed_history = st.session_state['history'][-MAX_HISTORY_WINDOW:]
-
-# Create a scrollable text area with the entire chat history
-full_history_text = "<br><br>".join(
-    [
-        f"<b>You:</b>&nbsp;{chat['question'].strip()}<br><b>{chat['agent'].strip()}:</b>&nbsp;{chat['answer'].strip()}"
-        for chat in st.session_state['history']
-    ]
-)
-
-st.markdown(
-    f"""
-    <div style='
-        background-color: #f8f9fa; 
-        padding: 10px; 
-        border-radius: 10px; 
-        height: 300px; 
-        overflow-y: auto; 
-        border: 1px solid #ccc;
-        color: black;
-        font-family: Arial, sans-serif;
-    '>
-        {full_history_text}
-    </div>
-    """,
-    unsafe_allow_html=True
-)
+    history.append("Session Ended", "Thank you for using AnyCompany Support Agent!", selected_agent)
+    # End this user's Bedrock sessions with every agent so the next question starts fresh
+    agent_session_manager.end_sessions(agent_client.runtime_client, user_session_key())
+    history.clear()
+
+for agent_session in agent_session_manager.sessions(user_session_key()):
+    st.sidebar.caption(f"Session with {agent_session.agent_id}: {agent_session.turns} turns")
+
+if agent_client.response_cache is not None:
+    cache = agent_client.response_cache
+    st.sidebar.caption(f"Response cache: {cache.hit_rate:.0%} hit rate, {cache.stats['latency_saved']:.1f}s saved")
+
+with st.sidebar:
+    render_metrics_panel()
+
+# Agent steps from the current session with the selected agent (AGENT_TRACE_ENABLED=true)
+if agent_client.enable_trace:
+    for agent_session in agent_session_manager.sessions(user_session_key()):
+        if agent_session.agent_id != agent_id:
+            continue
+        with st.sidebar.expander("Agent trace"):
+            st.caption("Slowest steps")
+            st.dataframe(trace_recorder.slowest(agent_session.session_id), hide_index=True)
+            st.caption("Latest steps")
+            st.dataframe(trace_recorder.recent(agent_session.session_id, limit=20), hide_index=True)
+
+# Only the newest turns are rendered; older ones load on demand
+render_history(history)
@@ -0,0 +1,218 @@
+# Headless batch assessment: run a file of migration questions through an agent or a prompt flow.
+#
+# Prompts come from JSONL or CSV (a `prompt` column, optionally `id`, `agent_id`, `agent_alias_id`,
+# `flow`, `flow_alias` to override the target per row). They run on a bounded worker pool through
+# the same rate limiter, retries and concurrency cap as the Streamlit pages, and each result is
+# appended to the output JSONL as soon as it completes, with the agent or flow that answered it.
+# Rerunning with the same output file skips prompts that already have a successful result from the
+# same target, so an interrupted batch resumes where it stopped and a new target reruns them all.
+#
+# Run: python batch_assess.py questions.jsonl results.jsonl --workers 8 --rate 5
+#      python batch_assess.py questions.csv results.jsonl --flow <flow arn> --flow-alias <alias arn>
+import argparse
+import csv
+import hashlib
+import json
+import math
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from aws_clients import get_client
+from call_control import call_controller
+from invoke_agent import BedrockAgentClient
+
+
+def read_prompts(path):
+    # Rows as dicts with at least `prompt`; a stable `id` is derived from the row when missing
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+    for row in rows:
+        if not row.get("prompt"):
+            continue
+        if not row.get("id"):
+            target = f"{row.get('agent_id', '')}/{row.get('agent_alias_id', '')}/{row.get('flow_alias', '')}"
+            row["id"] = hashlib.sha256(f"{target}\0{row['prompt']}".encode("utf-8")).hexdigest()[:16]
+        yield row
+
+
+def row_target(row, args):
+    # The agent or flow a row is sent to: its own columns, else the command line's
+    if args.flow_alias:
+        alias_identifier = row.get("flow_alias") or args.flow_alias
+        flow_identifier = row.get("flow") or args.flow or alias_identifier.split("/alias/")[0]
+        return f"flow:{flow_identifier}/{alias_identifier}"
+    return f"agent:{row.get('agent_id') or args.agent_id}/{row.get('agent_alias_id') or args.agent_alias_id}"
+
+
+def completed_ids(path):
+    # (target, id) pairs with a successful result in an earlier run's output
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A line cut short when the previous run was killed
+                continue
+            # Records without a target predate it and can't be matched, so they run again
+            if record.get("ok") and record.get("target"):
+                done.add((record["target"], record["id"]))
+    return done
+
+
+def ask_agent(agent_client, row, agent_id, agent_alias_id):
+    stream = agent_client.stream_chat_with_agent(
+        row.get("agent_id") or agent_id,
+        row.get("agent_alias_id") or agent_alias_id,
+        row["prompt"],
+        session_id=uuid.uuid4().hex
+    )
+    result = stream.collect()
+    return {
+        "ok": result.ok,
+        "response": result.response,
+        "error": result.error,
+        "ttfc": result.time_to_first_chunk,
+        "latency": result.elapsed,
+        "chunks": result.chunk_count,
+    }
+
+
+def ask_flow(flow_client, row, flow_identifier, alias_identifier):
+    alias_identifier = row.get("flow_alias") or alias_identifier
+    # An alias ARN (.../flow/<id>/alias/<alias>) already names its flow
+    flow_identifier = row.get("flow") or flow_identifier or alias_identifier.split("/alias/")[0]
+    # Same input object the flow pages send
+    input_objects = [
+        {
+            "nodeName": "FlowInputNode",
+            "nodeOutputName": "document",
+            "content": {
+                "document": row["prompt"]
+            }
+        }
+    ]
+    start = time.perf_counter()
+    first = None
+    documents = []
+    try:
+        response = call_controller.call(
+            f"flow:{alias_identifier}",
+            flow_client.invoke_flow,
+            stream_field='responseStream',
+            flowIdentifier=flow_identifier,
+            flowAliasIdentifier=alias_identifier,
+            inputs=input_objects
+        )
+        for event in response['responseStream']:
+            if 'flowOutputEvent' in event:
+                if first is None:
+                    first = time.perf_counter() - start
+                document = event['flowOutputEvent']['content']['document']
+                documents.append(document if isinstance(document, str) else json.dumps(document))
+            elif 'flowCompletionEvent' in event:
+                break
+        error = None
+    except Exception as e:
+        error = str(e)
+    return {
+        "ok": error is None,
+        "response": "".join(documents),
+        "error": error,
+        "ttfc": first,
+        "latency": time.perf_counter() - start,
+        "chunks": len(documents),
+    }
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    # Nearest rank
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+def print_summary(records, wall):
+    ok = [r for r in records if r["ok"]]
+    print(f"{len(records)} prompts in {wall:.1f}s ({len(records) / wall if wall else 0:.2f}/s), "
+          f"{len(ok)} ok, {len(records) - len(ok)} failed")
+    for name in ("latency", "ttfc"):
+        values = [r[name] for r in ok if r[name] is not None]
+        if values:
+            p50, p90, p99 = (percentile(values, q) for q in (0.5, 0.9, 0.99))
+            print(f"  {name:>8}: p50 {p50 * 1000:.0f} ms, p90 {p90 * 1000:.0f} ms, p99 {p99 * 1000:.0f} ms, max {max(values) * 1000:.0f} ms")
+    answer_bytes = sum(len(r["response"].encode("utf-8")) for r in ok)
+    if wall:
+        print(f"  answers: {answer_bytes / 1024:.0f} KB, {answer_bytes / wall / 1024:.1f} KB/s")
+
+
+def run(args):
+    # One token bucket per agent/flow at the requested rate; the pool size bounds concurrency
+    call_controller.rate = args.rate
+    call_controller.burst = max(1, int(args.rate))
+
+    done = completed_ids(args.output)
+    rows = []
+    skipped = 0
+    for row in read_prompts(args.input):
+        row["target"] = row_target(row, args)
+        if (row["target"], row["id"]) in done:
+            skipped += 1
+        else:
+            rows.append(row)
+    print(f"{len(rows)} prompts to run, {skipped} already done")
+    if not rows:
+        return
+
+    if args.flow_alias:
+        flow_client = get_client("bedrock-agent-runtime", region_name=args.region)
+        ask = lambda row: ask_flow(flow_client, row, args.flow, args.flow_alias)
+    else:
+        agent_client = BedrockAgentClient(region_name=args.region)
+        ask = lambda row: ask_agent(agent_client, row, args.agent_id, args.agent_alias_id)
+
+    records = []
+    start = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="batch")
+    try:
+        futures = {executor.submit(ask, row): row for row in rows}
+        with open(args.output, "a", encoding="utf-8") as out:
+            for future in as_completed(futures):
+                row = futures[future]
+                record = dict(id=row["id"], target=row["target"], prompt=row["prompt"], **future.result())
+                # One flushed line per result, so an interrupted run loses nothing that finished
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                records.append(record)
+                if not record["ok"]:
+                    print(f"{row['id']} failed: {record['error']}", file=sys.stderr)
+                elif len(records) % 25 == 0:
+                    print(f"{len(records)}/{len(rows)} done")
+    except KeyboardInterrupt:
+        print("Interrupted; rerun with the same output file to resume", file=sys.stderr)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        print_summary(records, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run migration questions through a Bedrock agent or prompt flow")
+    parser.add_argument("input", help="prompts as .jsonl or .csv")
+    parser.add_argument("output", help="results .jsonl; appended to, and used to resume")
+    parser.add_argument("--agent-id", default=os.getenv("DISCOVERY_AGENT_ID", "default-discovery-id"))
+    parser.add_argument("--agent-alias-id", default=os.getenv("DISCOVERY_AGENT_ALIAS_ID", "default-discovery-alias-id"))
+    parser.add_argument("--flow", help="flow identifier; with --flow-alias, ask the flow instead of the agent")
+    parser.add_argument("--flow-alias", help="flow alias identifier")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=5.0, help="calls per second per agent or flow")
+    parser.add_argument("--region", default="us-east-1")
+    run(parser.parse_args())
@@ -0,0 +1,111 @@
+# Load test for call_control against a stub Bedrock that throttles above a fixed capacity.
+#
+# Many worker threads (standing in for Streamlit sessions) call the stub at once. Without the
+# controller every call over capacity reaches the user as a ThrottlingException; with it the
+# calls are paced, retried and capped, so they succeed at the cost of some waiting. A second
+# scenario makes the stub fail outright to show the circuit breaker rejecting calls early.
+#
+# Run: python bench_call_control.py [--sessions 20] [--calls 5] [--capacity 10]
+import argparse
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+from call_control import CallController, CircuitOpenError
+
+
+def client_error(code):
+    return ClientError({"Error": {"Code": code, "Message": code}}, "InvokeAgent")
+
+
+class ThrottlingStub:
+    # Admits `capacity` calls per second (server-side token bucket) and throttles the rest
+    def __init__(self, capacity, latency_s=0.02, fail=False):
+        self.capacity = capacity
+        self.latency_s = latency_s
+        self.fail = fail
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.calls = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def invoke_agent(self, **kwargs):
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity)
+            self.updated = now
+            admitted = self.tokens >= 1
+            if admitted:
+                self.tokens -= 1
+            else:
+                self.throttled += 1
+        if not admitted:
+            raise client_error("ThrottlingException")
+        time.sleep(self.latency_s)
+        if self.fail:
+            raise client_error("ServiceUnavailableException")
+        return {"completion": iter([{"chunk": {"bytes": b"ok"}}])}
+
+
+def run_load(stub, controller, sessions, calls):
+    outcomes = {"ok": 0, "error": 0, "rejected": 0}
+    lock = threading.Lock()
+
+    def session():
+        for _ in range(calls):
+            try:
+                if controller is None:
+                    response = stub.invoke_agent(agentId="a")
+                else:
+                    response = controller.call("agent:a", stub.invoke_agent, stream_field="completion", agentId="a")
+                for _ in response["completion"]:
+                    pass
+                outcome = "ok"
+            except CircuitOpenError:
+                outcome = "rejected"
+            except ClientError:
+                outcome = "error"
+            with lock:
+                outcomes[outcome] += 1
+
+    threads = [threading.Thread(target=session) for _ in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes, time.perf_counter() - start
+
+
+def report(name, stub, outcomes, elapsed):
+    print(f"{name:>12} ok={outcomes['ok']:>4} errors={outcomes['error']:>4} rejected={outcomes['rejected']:>4} "
+          f"stub_calls={stub.calls:>4} throttled={stub.throttled:>4} wall={elapsed:6.2f}s")
+
+
+def run(sessions, calls, capacity):
+    print(f"{sessions} sessions x {calls} calls against capacity {capacity}/s")
+    stub = ThrottlingStub(capacity)
+    report("direct", stub, *run_load(stub, None, sessions, calls))
+
+    stub = ThrottlingStub(capacity)
+    controller = CallController(rate=capacity * 2, burst=capacity, max_concurrency=8, max_retries=8)
+    report("controlled", stub, *run_load(stub, controller, sessions, calls))
+    print(f"{'':>12} controller stats {controller.stats}")
+
+    stub = ThrottlingStub(capacity * 100, fail=True)
+    controller = CallController(rate=capacity * 100, burst=capacity * 100, max_retries=1,
+                                breaker_threshold=5, breaker_cooldown=30)
+    report("degraded", stub, *run_load(stub, controller, sessions, calls))
+    print(f"{'':>12} controller stats {controller.stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the Bedrock call controller")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--calls", type=int, default=5)
+    parser.add_argument("--capacity", type=float, default=10.0, help="calls per second the stub admits")
+    args = parser.parse_args()
+    run(args.sessions, args.calls, args.capacity)
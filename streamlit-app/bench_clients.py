@@ -0,0 +1,82 @@
+# Micro-benchmark: per-request overhead of building a boto3 client per call vs the pooled registry.
+#
+# Each "request" is a HEAD against a local keep-alive HTTP server posing as S3, so the numbers show
+# client construction cost plus connection setup without touching AWS.
+#
+# Run: python bench_clients.py [--requests 200]
+import argparse
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import boto3
+
+import aws_clients
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        with _lock:
+            _Handler.connections += 1
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+_lock = threading.Lock()
+
+
+def per_call_client(endpoint):
+    # What the pages did before: a brand-new client for every request
+    client = boto3.client("s3", region_name="us-east-1", endpoint_url=endpoint)
+    client.head_bucket(Bucket="bench")
+
+
+def pooled_client(endpoint):
+    client = aws_clients.get_client("s3", region_name="us-east-1")
+    client.head_bucket(Bucket="bench")
+
+
+def measure(fn, endpoint, requests):
+    _Handler.connections = 0
+    start = time.perf_counter()
+    for _ in range(requests):
+        fn(endpoint)
+    elapsed = time.perf_counter() - start
+    return elapsed / requests * 1000, _Handler.connections
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark pooled vs per-call boto3 clients")
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    # Dummy credentials; nothing leaves the machine
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    endpoint = f"http://127.0.0.1:{server.server_port}"
+    os.environ["AWS_ENDPOINT_URL_S3"] = endpoint
+
+    # Warm-up so module imports and loader caches don't skew the first mode
+    per_call_client(endpoint)
+    pooled_client(endpoint)
+
+    print(f"{'mode':>10} {'ms/request':>11} {'connections':>12}")
+    for name, fn in (("per-call", per_call_client), ("pooled", pooled_client)):
+        per_request_ms, connections = measure(fn, endpoint, args.requests)
+        print(f"{name:>10} {per_request_ms:>11.3f} {connections:>12}")
+
+    server.shutdown()
@@ -0,0 +1,73 @@
+# Benchmark for AgentFanout against asking the agents one after another.
+#
+# Each agent is a stubbed invoke_agent stream with a per-chunk delay, so the numbers reflect
+# network-bound waiting rather than parsing. Reports wall clock for the sequential loop the page
+# would otherwise need and for the concurrent fan-out, plus the fan-out's time to first chunk.
+#
+# Run: python bench_fanout.py [--agents 3] [--kb 16] [--latency-ms 20]
+import argparse
+import os
+import time
+
+# Measure the stream itself, not call_control pacing the repeated stub calls
+os.environ.setdefault("BEDROCK_RATE_PER_SECOND", "1000")
+os.environ.setdefault("BEDROCK_BURST", "1000")
+
+from bench_streaming import StubRuntimeClient
+from fanout import AgentFanout, AgentTarget
+from invoke_agent import BedrockAgentClient
+
+
+def stub_agent_client(total_bytes, chunk_size, latency_s):
+    client = BedrockAgentClient.__new__(BedrockAgentClient)
+    client.runtime_client = StubRuntimeClient(total_bytes, chunk_size, latency_s)
+    client.response_cache = None
+    client.enable_trace = False
+    return client
+
+
+def sequential(client, targets, prompt):
+    start = time.perf_counter()
+    first = None
+    for target in targets:
+        for _ in client.stream_chat_with_agent(target.agent_id, target.agent_alias_id, prompt, session_id="s"):
+            if first is None:
+                first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def fanned_out(client, targets, prompt):
+    start = time.perf_counter()
+    first = None
+    done = 0
+    for event in AgentFanout(client).stream(targets, prompt):
+        if event.kind == "chunk" and first is None:
+            first = time.perf_counter() - start
+        elif event.kind == "done":
+            done += 1
+    assert done == len(targets), f"only {done} of {len(targets)} agents finished"
+    return first, time.perf_counter() - start
+
+
+def run(agent_count, total_bytes, chunk_size, latency_s, repeat):
+    client = stub_agent_client(total_bytes, chunk_size, latency_s)
+    targets = [AgentTarget(f"agent-{i}", f"id-{i}", f"alias-{i}", session_id="s") for i in range(agent_count)]
+    print(f"{agent_count} agents, {total_bytes // 1024} KB each, {latency_s * 1000:.0f} ms per {chunk_size} B chunk")
+    print(f"{'mode':>10} {'ttfc_ms':>9} {'wall_ms':>9}")
+    results = {}
+    for name, fn in (("sequential", sequential), ("fanout", fanned_out)):
+        best = min((fn(client, targets, "q") for _ in range(repeat)), key=lambda sample: sample[1])
+        results[name] = best
+        print(f"{name:>10} {best[0] * 1000:>9.1f} {best[1] * 1000:>9.1f}")
+    print(f"speedup: {results['sequential'][1] / results['fanout'][1]:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark concurrent agent fan-out")
+    parser.add_argument("--agents", type=int, default=3)
+    parser.add_argument("--kb", type=int, default=16, help="answer size per agent")
+    parser.add_argument("--chunk-size", type=int, default=1024)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="delay before each chunk")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.agents, args.kb * 1024, args.chunk_size, args.latency_ms / 1000, args.repeat)
@@ -0,0 +1,82 @@
+# Benchmark for BedrockAgentClient streaming against a stubbed invoke_agent event stream.
+#
+# Compares the old buffered path (string concatenation + JSON body that the page json.loads again)
+# with AgentStream: time to first chunk and total parse throughput for large completions.
+#
+# Run: python bench_streaming.py [--chunk-size 256] [--latency-ms 0]
+import argparse
+import os
+import json
+import time
+
+# Measure the stream itself, not call_control pacing the repeated stub calls
+os.environ.setdefault("BEDROCK_RATE_PER_SECOND", "1000")
+os.environ.setdefault("BEDROCK_BURST", "1000")
+
+from invoke_agent import AgentStream
+
+
+class StubRuntimeClient:
+    # Emulates bedrock-agent-runtime invoke_agent with a fixed-size chunk stream
+    def __init__(self, total_bytes, chunk_size, latency_s=0.0):
+        self.total_bytes = total_bytes
+        self.chunk_size = chunk_size
+        self.latency_s = latency_s
+
+    def _events(self):
+        payload = b"x" * self.chunk_size
+        sent = 0
+        while sent < self.total_bytes:
+            if self.latency_s:
+                time.sleep(self.latency_s)
+            sent += self.chunk_size
+            yield {"chunk": {"bytes": payload}}
+
+    def invoke_agent(self, **kwargs):
+        return {"completion": self._events(), "sessionId": kwargs["sessionId"]}
+
+
+def buffered_baseline(client):
+    # The previous chat_with_agent behaviour, minus the early return bug
+    response = client.invoke_agent(agentId="a", agentAliasId="b", sessionId="s", inputText="q")
+    completion = ""
+    start = time.perf_counter()
+    for event in response["completion"]:
+        if "chunk" in event:
+            completion += event["chunk"]["bytes"].decode("utf-8")
+    body = json.dumps({"trace_data": "", "response": completion})
+    # The answer only reaches the page after the round trip through JSON
+    first = time.perf_counter() - start
+    answer = json.loads(body)["response"]
+    return first, time.perf_counter() - start, len(answer)
+
+
+def streamed(client):
+    stream = AgentStream(client, "a", "b", "q", session_id="s")
+    for _ in stream:
+        pass
+    result = stream.result
+    return result.time_to_first_chunk, result.elapsed, len(result.response)
+
+
+def run(sizes, chunk_size, latency_s, repeat):
+    print(f"{'size':>10} {'mode':>9} {'ttfc_ms':>9} {'total_ms':>9} {'MB/s':>8}")
+    for size in sizes:
+        for name, fn in (("buffered", buffered_baseline), ("streamed", streamed)):
+            best = None
+            for _ in range(repeat):
+                sample = fn(StubRuntimeClient(size, chunk_size, latency_s))
+                if best is None or sample[1] < best[1]:
+                    best = sample
+            first, total, length = best
+            throughput = length / total / 1e6 if total else float("inf")
+            print(f"{size:>10} {name:>9} {first * 1000:>9.3f} {total * 1000:>9.3f} {throughput:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark AgentStream against the buffered path")
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay before each chunk")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run([16 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024], args.chunk_size, args.latency_ms / 1000, args.repeat)
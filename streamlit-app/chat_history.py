@@ -0,0 +1,167 @@
+import html
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from collections import deque
+
+import streamlit as st
+
+# Chat history for long sessions.
+# Each turn is escaped and formatted into its HTML fragment once, when it is added. Only the newest
+# turns stay in memory (a bounded ring buffer); older ones are spilled to a per-session JSONL file
+# and read back only when the user pages to them. Rendering joins the visible window only.
+# The spill file is private to the server user and is deleted with its history, when the session
+# ends or expires; files left by a crashed or restarted server are swept once they are old.
+
+MAX_IN_MEMORY = 50
+MAX_HISTORY_WINDOW = 6
+SPILL_DIR = os.getenv("CHAT_HISTORY_SPILL_DIR", os.path.join(tempfile.gettempdir(), "migrationpro-history"))
+# Spill files untouched for this long are from sessions that are gone
+SPILL_MAX_AGE = float(os.getenv("CHAT_HISTORY_SPILL_MAX_AGE_SECONDS", str(24 * 3600)))
+
+# Spill directories already swept by this process
+_swept = set()
+_sweep_lock = threading.Lock()
+
+HISTORY_BOX_STYLE = """
+        background-color: #f8f9fa;
+        padding: 10px;
+        border-radius: 10px;
+        height: 300px;
+        overflow-y: auto;
+        border: 1px solid #ccc;
+        color: black;
+        font-family: Arial, sans-serif;
+"""
+
+
+def render_fragment(question, answer, agent):
+    question = html.escape(str(question).strip()).replace("\n", "<br>")
+    answer = html.escape(str(answer).strip()).replace("\n", "<br>")
+    agent = html.escape(str(agent).strip())
+    return f"<b>You:</b>&nbsp;{question}<br><b>{agent}:</b>&nbsp;{answer}"
+
+
+def _remove_spill(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Could not remove chat history spill file {path}: {e}")
+
+
+def sweep_spill_dir(spill_dir=SPILL_DIR, max_age=SPILL_MAX_AGE):
+    # Removes spill files older than max_age, left behind by sessions of an earlier server run
+    cutoff = time.time() - max_age
+    try:
+        entries = list(os.scandir(spill_dir))
+    except FileNotFoundError:
+        return 0
+    removed = 0
+    for entry in entries:
+        if not entry.name.endswith(".jsonl"):
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except OSError:
+            # Removed by another process meanwhile, or not ours to remove
+            continue
+    return removed
+
+
+class ChatHistory:
+    def __init__(self, max_in_memory=MAX_IN_MEMORY, spill_dir=SPILL_DIR):
+        self._recent = deque(maxlen=max_in_memory)
+        self.spill_path = os.path.join(spill_dir, f"{uuid.uuid4().hex}.jsonl")
+        self.spilled = 0
+        with _sweep_lock:
+            sweep = spill_dir not in _swept
+            _swept.add(spill_dir)
+        if sweep:
+            sweep_spill_dir(spill_dir)
+        # Deletes the spill file once the session's history is dropped, or at interpreter exit
+        self._finalizer = weakref.finalize(self, _remove_spill, self.spill_path)
+
+    def __len__(self):
+        return self.spilled + len(self._recent)
+
+    def append(self, question, answer, agent):
+        if len(self._recent) == self._recent.maxlen:
+            self._spill(self._recent[0])
+        self._recent.append({
+            "question": question,
+            "answer": answer,
+            "agent": agent,
+            "html": render_fragment(question, answer, agent),
+        })
+
+    def _spill(self, entry):
+        os.makedirs(os.path.dirname(self.spill_path), mode=0o700, exist_ok=True)
+        # Transcripts are readable by the server user only
+        fd = os.open(self.spill_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        with open(fd, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        self.spilled += 1
+
+    def fragments(self, start, stop):
+        # HTML fragments for turns [start, stop), oldest first; spilled turns are read from disk
+        start = max(0, start)
+        stop = min(len(self), stop)
+        result = []
+        if start < self.spilled:
+            try:
+                with open(self.spill_path, encoding="utf-8") as f:
+                    for index, line in enumerate(f):
+                        if index >= min(stop, self.spilled):
+                            break
+                        if index >= start:
+                            result.append(json.loads(line)["html"])
+            except FileNotFoundError:
+                # Swept after the session sat idle past SPILL_MAX_AGE; only the newest turns remain
+                pass
+        first_recent = max(start, self.spilled) - self.spilled
+        last_recent = stop - self.spilled
+        for index in range(first_recent, last_recent):
+            result.append(self._recent[index]["html"])
+        return result
+
+    def clear(self):
+        self._recent.clear()
+        self.spilled = 0
+        _remove_spill(self.spill_path)
+
+
+def get_history(key="history"):
+    if not isinstance(st.session_state.get(key), ChatHistory):
+        st.session_state[key] = ChatHistory()
+    return st.session_state[key]
+
+
+def render_history(history, window=MAX_HISTORY_WINDOW, key="history"):
+    # Newest `window` turns, plus however many older pages the user has asked for
+    pages_key = f"{key}_pages"
+    pages = st.session_state.get(pages_key, 1)
+    total = len(history)
+    start = max(0, total - window * pages)
+
+    if start > 0 and st.button(f"Load older messages ({start} more)", key=f"{key}_load_older"):
+        pages += 1
+        st.session_state[pages_key] = pages
+        start = max(0, total - window * pages)
+
+    history_text = "<br><br>".join(history.fragments(start, total))
+    st.markdown(
+        f"""
+    <div style='{HISTORY_BOX_STYLE}'>
+        {history_text}
+    </div>
+    """,
+        unsafe_allow_html=True
+    )
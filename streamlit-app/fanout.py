@@ -0,0 +1,137 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+# Concurrent fan-out of one prompt to several Bedrock agents.
+# Every target streams on its own worker thread through BedrockAgentClient; their chunks are
+# merged into one event iterator in arrival order. Each target has its own deadline, and the
+# whole fan-out can be cancelled; a target that misses its deadline is reported, its response
+# stream is closed so a worker blocked on a stalled stream is freed, and its late chunks are dropped.
+
+MAX_WORKERS = 8
+DEFAULT_TIMEOUT = 120.0
+
+# Shared by every AgentFanout so per-rerun instances don't each start their own threads
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="agent-fanout")
+
+
+@dataclass
+class AgentTarget:
+    name: str
+    agent_id: str
+    agent_alias_id: str
+    session_id: str = None
+
+
+@dataclass
+class FanoutEvent:
+    # kind is "chunk", "done", "error", "timeout" or "cancelled"
+    target: str
+    kind: str
+    text: str = ""
+    result: object = None
+
+
+class AgentFanout:
+    def __init__(self, agent_client, executor=None):
+        self.agent_client = agent_client
+        self._executor = executor or _executor
+
+    def _worker(self, target, prompt, events, stop, streams):
+        stream = self.agent_client.stream_chat_with_agent(
+            target.agent_id, target.agent_alias_id, prompt, session_id=target.session_id
+        )
+        streams[target.name] = stream
+        if stop.is_set():
+            # Timed out or cancelled before the stream was registered, so nobody else closes it
+            self._close(stream)
+            return
+        chunks = iter(stream)
+        try:
+            for chunk in chunks:
+                if stop.is_set():
+                    break
+                events.put(FanoutEvent(target.name, "chunk", chunk))
+        finally:
+            # Closing the generator releases the response stream when we stop early
+            chunks.close()
+        if stop.is_set():
+            return
+        result = stream.result
+        if result is not None and result.ok:
+            events.put(FanoutEvent(target.name, "done", result=result))
+        else:
+            events.put(FanoutEvent(target.name, "error", result.error if result else "no result", result=result))
+
+    def stream(self, targets, prompt, timeout=DEFAULT_TIMEOUT, cancel_event=None):
+        # Yields FanoutEvents from all targets as they arrive; ends when every target has finished,
+        # failed, timed out or been cancelled
+        events = queue.Queue()
+        cancel_event = cancel_event or threading.Event()
+        stops = {target.name: threading.Event() for target in targets}
+        deadlines = {target.name: time.monotonic() + timeout for target in targets}
+        pending = set(stops)
+        streams = {}
+
+        for target in targets:
+            self._executor.submit(self._worker, target, prompt, events, stops[target.name], streams)
+
+        try:
+            while pending:
+                now = time.monotonic()
+                if cancel_event.is_set():
+                    for name in sorted(pending):
+                        stops[name].set()
+                        self._close(streams.get(name))
+                        yield FanoutEvent(name, "cancelled")
+                    pending.clear()
+                    break
+
+                for name in [n for n in pending if deadlines[n] <= now]:
+                    stops[name].set()
+                    self._close(streams.get(name))
+                    pending.discard(name)
+                    yield FanoutEvent(name, "timeout", f"no complete answer within {timeout:.0f}s")
+                if not pending:
+                    break
+
+                wait = min(deadlines[n] for n in pending) - now
+                try:
+                    event = events.get(timeout=max(0.01, min(wait, 0.25)))
+                except queue.Empty:
+                    continue
+                if event.target not in pending:
+                    continue
+                if event.kind != "chunk":
+                    pending.discard(event.target)
+                yield event
+        finally:
+            # Consumer stopped early or cancelled: tell the remaining workers to stop reading
+            for stop in stops.values():
+                stop.set()
+            for name in pending:
+                self._close(streams.get(name))
+
+    @staticmethod
+    def _close(stream):
+        if stream is None:
+            return
+        try:
+            stream.close()
+        except Exception as e:
+            print(f"Could not close agent stream: {e}")
+
+    def collect(self, targets, prompt, timeout=DEFAULT_TIMEOUT):
+        # {target name: final FanoutEvent}, with "text" holding the whole answer for done targets
+        texts = {target.name: [] for target in targets}
+        finals = {}
+        for event in self.stream(targets, prompt, timeout):
+            if event.kind == "chunk":
+                texts[event.target].append(event.text)
+            else:
+                if event.kind == "done":
+                    event.text = "".join(texts[event.target])
+                finals[event.target] = event
+        return finals
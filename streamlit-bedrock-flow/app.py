@@ -1,9 +1,14 @@
 import streamlit as st
 import json
 import pandas as pd
-import boto3
 from PIL import Image, ImageOps, ImageDraw
 import os
+from aws_clients import get_client
+from call_control import call_controller
+from metrics import render_metrics_panel
+from chat_history import get_history, render_history
+from flow_consumer import FlowStreamConsumer
+from response_cache import get_response_cache
 
 # Streamlit page configuration
 st.set_page_config(page_title="AWS MigrationPro", page_icon=":robot_face:", layout="wide")
@@ -24,12 +29,35 @@ st.title("AWS MigrationPro")
 prompt = st.text_input("Please enter your question about migration?", max_chars=2000)
 prompt = prompt.strip()
 
-session = boto3.Session()
-bedrock_agent_client = session.client(service_name='bedrock-agent-runtime')
+# Shared client from the process-wide pool, reused across reruns and sessions
+bedrock_agent_client = get_client('bedrock-agent-runtime')
 
 # Define the flow identifier and alias identifier
-flow_identifier = 'arn:aws:bedrock:us-east-1:774305585272:flow/PUXQWUEVJ3'
-alias_identifier = 'arn:aws:bedrock:us-east-1:774305585272:flow/PUXQWUEVJ3/alias/AM5DB8AZDA'
+flow_identifier = os.getenv("FLOW_IDENTIFIER", 'arn:aws:bedrock:us-east-1:774305585272:flow/PUXQWUEVJ3')
+alias_identifier = os.getenv("FLOW_ALIAS_IDENTIFIER", 'arn:aws:bedrock:us-east-1:774305585272:flow/PUXQWUEVJ3/alias/AM5DB8AZDA')
+
+# Opt-in answer cache (RESPONSE_CACHE_ENABLED=true); None when disabled
+response_cache = get_response_cache()
+flow_cache_target = f"flow:{alias_identifier}"
+
+def flow_response_events(input_objects, cached=None):
+    # The flow's response stream, or a cached answer replayed as the same events
+    if cached is not None:
+        return [
+            {"flowOutputEvent": {"nodeName": "FlowOutputNode", "content": {"document": cached}}},
+            {"flowCompletionEvent": {"completionReason": "SUCCESS"}},
+        ]
+
+    response = call_controller.call(
+                f"flow:{alias_identifier}",
+                bedrock_agent_client.invoke_flow,
+                stream_field='responseStream',
+                flowIdentifier=flow_identifier,
+                flowAliasIdentifier=alias_identifier,
+                inputs=input_objects
+            )
+    # Returned as is so the consumer can close it if the flow stalls past its deadline
+    return response['responseStream']
 
 
 # Display a primary button for submission
@@ -39,8 +67,7 @@ submit_button = st.button("Submit", type="primary")
 end_session_button = st.button("End Session")
 
 # Session State Management
-if 'history' not in st.session_state:
-    st.session_state['history'] = []
+history = get_history()
 
 # Function to parse and format response
 def format_response(response_body):
@@ -56,6 +83,13 @@ def format_response(response_body):
         # If response is not JSON, return as is
         return response_body
 
+def render_node_output(placeholder, text):
+    formatted = format_response(text)
+    if isinstance(formatted, pd.DataFrame):
+        placeholder.dataframe(formatted)
+    else:
+        placeholder.markdown(formatted)
+
 # Handling user input and responses
 if submit_button and prompt:
 # Define the input objects for the flow
@@ -68,71 +102,49 @@ if submit_button and prompt:
             }
         }
     ]
-    response = bedrock_agent_client.invoke_flow(
-                flowIdentifier=flow_identifier,
-                flowAliasIdentifier=alias_identifier,
-                inputs=input_objects
-            )
-    # Get the FlowResponseStream
-    response_stream = response['responseStream']
-
-    for event in response_stream:
-        if 'flowOutputEvent' in event:
-    
-            try:
-                # Parse the JSON string
-                response_data= event['flowOutputEvent']['content']['document']
-                print("TRACE & RESPONSE DATA ->  ", response_data)
-
-            except json.JSONDecodeError as e:
-                print("JSON decoding error:", e)
-                response_data = None 
-    
+    # Read the FlowResponseStream (or its cached replay), rendering each output node as it arrives
+    cached = response_cache.get(prompt, flow_cache_target) if response_cache else None
+    consumer = FlowStreamConsumer(lambda: flow_response_events(input_objects, cached), target=flow_cache_target)
+    placeholders = {}
+    with st.spinner("Waiting for the flow..."):
+        for node_name, document in consumer:
+            print("TRACE & RESPONSE DATA ->  ", node_name, document)
+            if node_name not in placeholders:
+                st.caption(node_name)
+                placeholders[node_name] = st.empty()
+            render_node_output(placeholders[node_name], consumer.run.outputs[node_name].text)
+
+    run = consumer.run
+    for node_name, (first, last) in run.latencies().items():
+        print(f"{node_name}: first output {first:.2f}s, last output {last:.2f}s")
+    if run.error:
+        st.error(f"Flow failed: {run.error}")
+    elif run.timed_out:
+        st.warning(f"The flow did not finish within {consumer.deadline:g}s; showing what arrived.")
+    elif not run.outputs:
+        st.warning("The flow returned no output.")
+
+    response_data = run.response if run.outputs else (f"Error: {run.error}" if run.error else "No response from the flow.")
+    if response_cache is not None and cached is None and run.completed and not run.error and run.outputs:
+        response_cache.put(prompt, flow_cache_target, run.response, run.elapsed)
 
     # Use trace_data and formatted_response as needed
     # st.sidebar.text_area("", value=all_data, height=300)
-    st.session_state['history'].append({"question": prompt, "answer": response_data})
+    history.append(prompt, response_data, "MigrationPro")
     # st.session_state['trace_data'] = the_response
     st.session_state['prompt'] = "" # clear out input box
   
 
 if end_session_button:
-    st.session_state['history'].append({"question": "Session Ended", "answer": "Thank you for using AnyCompany Support Agent!", "agent": selected_agent})
-    event = {
-        "sessionId": "MYSESSION",
-        "question": "placeholder to end session",
-        "endSession": True
-    }
-    agenthelper.lambda_handler(event, None)
-    st.session_state['history'].clear()
-
-MAX_HISTORY_WINDOW = 6
-
-# Display recent messages in a structured layout
-displayed_history = st.session_state['history'][-MAX_HISTORY_WINDOW:]
-
-# Create a scrollable text area with the entire chat history
-full_history_text = "<br><br>".join(
-    [
-        f"<b>You:</b>&nbsp;{chat['question'].strip()}<br><b>{chat['agent'].strip()}:</b>&nbsp;{chat['answer'].strip()}"
-        for chat in st.session_state['history']
-    ]
-)
-
-st.markdown(
-    f"""
-    <div style='
-        background-color: #f8f9fa; 
-        padding: 10px; 
-        border-radius: 10px; 
-        height: 300px; 
-        overflow-y: auto; 
-        border: 1px solid #ccc;
-        color: black;
-        font-family: Arial, sans-serif;
-    '>
-        {full_history_text}
-    </div>
-    """,
-    unsafe_allow_html=True
-)
+    history.append("Session Ended", "Thank you for using AnyCompany Support Agent!", "MigrationPro")
+    # Flows keep no server-side session, so ending one only clears the local history
+    history.clear()
+
+if response_cache is not None:
+    st.sidebar.caption(f"Response cache: {response_cache.hit_rate:.0%} hit rate, {response_cache.stats['latency_saved']:.1f}s saved")
+
+with st.sidebar:
+    render_metrics_panel()
+
+# Only the newest turns are rendered; older ones load on demand
+render_history(history)
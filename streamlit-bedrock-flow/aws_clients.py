@@ -0,0 +1,89 @@
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+# Process-wide registry of boto3 clients.
+# Streamlit re-executes the page script on every rerun and runs each browser session on its own
+# thread, but imported modules live for the whole process, so clients created here are shared by
+# every rerun and every session. boto3 clients are thread-safe; sessions are not, so client
+# construction is serialised behind a lock.
+
+MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "50"))
+CONNECT_TIMEOUT = float(os.getenv("AWS_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("AWS_READ_TIMEOUT", "120"))
+
+# Calls to these go through call_control, which retries throttles itself and has to see each
+# one to slow down; botocore's own retries would hide them and multiply the attempts
+SERVICE_CONFIG = {
+    "bedrock-runtime": {"retries": {"mode": "standard", "max_attempts": 1}},
+    "bedrock-agent-runtime": {"retries": {"mode": "standard", "max_attempts": 1}},
+}
+
+_lock = threading.Lock()
+_sessions = {}
+_clients = {}
+# service name -> client used instead of a real one in every region (local fakes for load tests)
+_overrides = {}
+
+
+def client_config(**overrides):
+    # Larger connection pool than the default of 10 so concurrent sessions don't queue for a
+    # socket, and TCP keep-alive so idle pooled connections survive between user turns
+    options = dict(
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        tcp_keepalive=True,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+    )
+    options.update(overrides)
+    return Config(**options)
+
+
+def get_session(profile_name=None):
+    with _lock:
+        return _get_session_locked(profile_name)
+
+
+def _get_session_locked(profile_name):
+    session = _sessions.get(profile_name)
+    if session is None:
+        session = boto3.Session(profile_name=profile_name)
+        _sessions[profile_name] = session
+    return session
+
+
+def get_client(service_name, region_name=None, profile_name=None):
+    if service_name in _overrides:
+        return _overrides[service_name]
+
+    key = (service_name, region_name, profile_name)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _lock:
+        # Another thread may have built it while we waited for the lock
+        client = _clients.get(key)
+        if client is None:
+            session = _get_session_locked(profile_name)
+            client = session.client(service_name, region_name=region_name, config=client_config(**SERVICE_CONFIG.get(service_name, {})))
+            _clients[key] = client
+    return client
+
+
+def override_client(service_name, client):
+    # Every get_client(service_name, ...) returns `client` from now on; None restores the real one
+    with _lock:
+        if client is None:
+            _overrides.pop(service_name, None)
+        else:
+            _overrides[service_name] = client
+
+
+def clear_clients():
+    # Drop every cached client and session, e.g. after rotating credentials
+    with _lock:
+        _clients.clear()
+        _sessions.clear()
@@ -0,0 +1,114 @@
+import html
+import json
+import os
+import tempfile
+import uuid
+from collections import deque
+
+import streamlit as st
+
+# Chat history for long sessions.
+# Each turn is escaped and formatted into its HTML fragment once, when it is added. Only the newest
+# turns stay in memory (a bounded ring buffer); older ones are spilled to a per-session JSONL file
+# and read back only when the user pages to them. Rendering joins the visible window only.
+
+MAX_IN_MEMORY = 50
+MAX_HISTORY_WINDOW = 6
+SPILL_DIR = os.getenv("CHAT_HISTORY_SPILL_DIR", os.path.join(tempfile.gettempdir(), "migrationpro-history"))
+
+HISTORY_BOX_STYLE = """
+        background-color: #f8f9fa;
+        padding: 10px;
+        border-radius: 10px;
+        height: 300px;
+        overflow-y: auto;
+        border: 1px solid #ccc;
+        color: black;
+        font-family: Arial, sans-serif;
+"""
+
+
+def render_fragment(question, answer, agent):
+    question = html.escape(str(question).strip()).replace("\n", "<br>")
+    answer = html.escape(str(answer).strip()).replace("\n", "<br>")
+    agent = html.escape(str(agent).strip())
+    return f"<b>You:</b>&nbsp;{question}<br><b>{agent}:</b>&nbsp;{answer}"
+
+
+class ChatHistory:
+    def __init__(self, max_in_memory=MAX_IN_MEMORY, spill_dir=SPILL_DIR):
+        self._recent = deque(maxlen=max_in_memory)
+        self.spill_path = os.path.join(spill_dir, f"{uuid.uuid4().hex}.jsonl")
+        self.spilled = 0
+
+    def __len__(self):
+        return self.spilled + len(self._recent)
+
+    def append(self, question, answer, agent):
+        if len(self._recent) == self._recent.maxlen:
+            self._spill(self._recent[0])
+        self._recent.append({
+            "question": question,
+            "answer": answer,
+            "agent": agent,
+            "html": render_fragment(question, answer, agent),
+        })
+
+    def _spill(self, entry):
+        os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        self.spilled += 1
+
+    def fragments(self, start, stop):
+        # HTML fragments for turns [start, stop), oldest first; spilled turns are read from disk
+        start = max(0, start)
+        stop = min(len(self), stop)
+        result = []
+        if start < self.spilled:
+            with open(self.spill_path, encoding="utf-8") as f:
+                for index, line in enumerate(f):
+                    if index >= min(stop, self.spilled):
+                        break
+                    if index >= start:
+                        result.append(json.loads(line)["html"])
+        first_recent = max(start, self.spilled) - self.spilled
+        last_recent = stop - self.spilled
+        for index in range(first_recent, last_recent):
+            result.append(self._recent[index]["html"])
+        return result
+
+    def clear(self):
+        self._recent.clear()
+        self.spilled = 0
+        if os.path.exists(self.spill_path):
+            os.remove(self.spill_path)
+
+
+def get_history(key="history"):
+    if not isinstance(st.session_state.get(key), ChatHistory):
+        st.session_state[key] = ChatHistory()
+    return st.session_state[key]
+
+
+def render_history(history, window=MAX_HISTORY_WINDOW, key="history"):
+    # Newest `window` turns, plus however many older pages the user has asked for
+    pages_key = f"{key}_pages"
+    pages = st.session_state.get(pages_key, 1)
+    total = len(history)
+    start = max(0, total - window * pages)
+
+    if start > 0 and st.button(f"Load older messages ({start} more)", key=f"{key}_load_older"):
+        pages += 1
+        st.session_state[pages_key] = pages
+        start = max(0, total - window * pages)
+
+    history_text = "<br><br>".join(history.fragments(start, total))
+    st.markdown(
+        f"""
+    <div style='{HISTORY_BOX_STYLE}'>
+        {history_text}
+    </div>
+    """,
+        unsafe_allow_html=True
+    )
@@ -0,0 +1,165 @@
+import json
+import os
+import queue
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from metrics import metrics
+
+# Incremental consumption of a flow's response stream.
+# The stream is read on a worker thread and each flowOutputEvent document is handed to the page as
+# soon as it arrives, per output node, so the answer renders while the flow is still running.
+# Reading stops at the flowCompletionEvent, and an overall deadline bounds the whole call: if the
+# flow hasn't completed in time the page keeps what it has and closes the stream. Each output node's
+# time to first and last document is recorded on the run and in the metrics histograms.
+
+FLOW_DEADLINE = float(os.getenv("FLOW_DEADLINE_SECONDS", "120"))
+MAX_WORKERS = 8
+
+# Shared across reruns so each run doesn't start its own threads
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="flow-reader")
+
+
+@dataclass
+class NodeOutput:
+    node_name: str
+    documents: list = field(default_factory=list)
+    # Seconds since the request was sent
+    first_output: float = None
+    last_output: float = None
+
+    @property
+    def text(self):
+        return "".join(d if isinstance(d, str) else json.dumps(d) for d in self.documents)
+
+
+@dataclass
+class FlowRun:
+    # Output nodes in the order they first produced a document
+    outputs: dict = field(default_factory=dict)
+    completion_reason: str = None
+    timed_out: bool = False
+    error: str = None
+    elapsed: float = 0.0
+
+    @property
+    def completed(self):
+        return self.completion_reason is not None
+
+    @property
+    def response(self):
+        return "\n\n".join(output.text for output in self.outputs.values())
+
+    def latencies(self):
+        # {node: (first output, last output)} in seconds
+        return {name: (output.first_output, output.last_output) for name, output in self.outputs.items()}
+
+
+class FlowStreamConsumer:
+    # Iterate for (node name, document) pairs as they arrive; the outcome is on .run afterwards
+    def __init__(self, make_events, deadline=FLOW_DEADLINE, target="", executor=None):
+        # make_events() invokes the flow and returns its events; it runs on the reader thread so
+        # the deadline covers the call itself as well as the stream. If what it returns has a
+        # close() (the call_control-wrapped EventStream), that is used to cut a stalled stream off.
+        self.make_events = make_events
+        self.deadline = deadline
+        self.target = target
+        self.executor = executor or _executor
+        self.run = FlowRun()
+
+    def _read(self, events, stop):
+        self._started_at = time.perf_counter()
+        self._started.set()
+        iterator = None
+        try:
+            source = self.make_events()
+            with self._lock:
+                self._source = source
+            if stop.is_set():
+                return
+            iterator = iter(source)
+            for event in iterator:
+                if stop.is_set():
+                    return
+                events.put((event, None))
+                if 'flowCompletionEvent' in event:
+                    # Nothing the page needs follows the completion event
+                    return
+        except Exception as e:
+            events.put((None, e))
+        finally:
+            # Ends the response stream early and hands its concurrency slot back
+            for closable in (iterator, self._source):
+                close = getattr(closable, "close", None)
+                if close is not None:
+                    try:
+                        close()
+                    except Exception as e:
+                        print(f"Could not close flow {self.target} stream: {e}")
+            events.put((None, None))
+
+    def _abandon(self, stop):
+        # Past the deadline: close the response stream from this thread, so a reader blocked on
+        # a stalled stream returns now and frees its worker and call_control slot
+        with self._lock:
+            stop.set()
+            source = self._source
+        close = getattr(source, "close", None)
+        # A generator can't be closed while the reader is inside it; it ends at its next event
+        if close is not None and not isinstance(source, types.GeneratorType):
+            try:
+                close()
+            except Exception as e:
+                print(f"Could not close flow {self.target} stream: {e}")
+
+    def __iter__(self):
+        run = self.run
+        events = queue.Queue()
+        stop = threading.Event()
+        self._started = threading.Event()
+        self._lock = threading.Lock()
+        self._source = None
+        self.executor.submit(self._read, events, stop)
+        # The deadline starts once a reader picks the flow up, not while it waits for a worker
+        self._started.wait()
+        start = self._started_at
+        try:
+            while True:
+                remaining = self.deadline - (time.perf_counter() - start)
+                try:
+                    event, error = events.get(timeout=max(remaining, 0))
+                except queue.Empty:
+                    run.timed_out = True
+                    print(f"Flow {self.target} passed its {self.deadline:g}s deadline")
+                    self._abandon(stop)
+                    return
+                if error is not None:
+                    run.error = str(error)
+                    return
+                if event is None:
+                    return
+                if 'flowOutputEvent' in event:
+                    output_event = event['flowOutputEvent']
+                    name = output_event.get('nodeName', 'FlowOutputNode')
+                    document = output_event['content']['document']
+                    now = time.perf_counter() - start
+                    output = run.outputs.get(name)
+                    if output is None:
+                        output = run.outputs[name] = NodeOutput(name, first_output=now)
+                    output.documents.append(document)
+                    output.last_output = now
+                    yield name, document
+                elif 'flowCompletionEvent' in event:
+                    run.completion_reason = event['flowCompletionEvent'].get('completionReason', 'SUCCESS')
+                    return
+        finally:
+            stop.set()
+            run.elapsed = time.perf_counter() - start
+            if metrics.enabled:
+                for name, output in run.outputs.items():
+                    labels = (("target", self.target), ("node", name))
+                    metrics.observe("flow_node_first_output_seconds", labels, output.first_output)
+                    metrics.observe("flow_node_last_output_seconds", labels, output.last_output)
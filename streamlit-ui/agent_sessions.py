@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+
+import streamlit as st
+
+from call_control import call_controller
+
+# Stable Bedrock agent sessions per Streamlit user session.
+# Each (user session, agent, alias) maps to one Bedrock sessionId that is reused across reruns so
+# the agent keeps its conversation memory. A session idle for longer than the agent's idle TTL is
+# replaced with a fresh one, since Bedrock will have dropped it anyway.
+
+# Should match the agent's idleSessionTTLInSeconds (Bedrock default is 600)
+IDLE_TIMEOUT = float(os.getenv("AGENT_SESSION_IDLE_SECONDS", "600"))
+
+
+@dataclass
+class AgentSession:
+    user_key: str
+    agent_id: str
+    agent_alias_id: str
+    session_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    created_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.time)
+    turns: int = 0
+
+    def expired(self, now, idle_timeout):
+        return now - self.last_used > idle_timeout
+
+
+class AgentSessionManager:
+    def __init__(self, idle_timeout=IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    def get_session(self, user_key, agent_id, agent_alias_id):
+        key = (user_key, agent_id, agent_alias_id)
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None or session.expired(now, self.idle_timeout):
+                # Good moment to forget sessions from tabs that were closed or left idle
+                for stale in [k for k, s in self._sessions.items() if s.expired(now, self.idle_timeout)]:
+                    del self._sessions[stale]
+                session = AgentSession(user_key, agent_id, agent_alias_id)
+                self._sessions[key] = session
+            return session
+
+    def record_turn(self, session):
+        with self._lock:
+            session.turns += 1
+            session.last_used = time.time()
+
+    def sessions(self, user_key):
+        with self._lock:
+            return [s for (key, _, _), s in self._sessions.items() if key == user_key]
+
+    def end_sessions(self, runtime_client, user_key, agent_id=None):
+        # Tells Bedrock to drop the agent's memory for this user's sessions (all agents by default)
+        with self._lock:
+            ending = [
+                key for key in self._sessions
+                if key[0] == user_key and (agent_id is None or key[1] == agent_id)
+            ]
+            sessions = [self._sessions.pop(key) for key in ending]
+
+        for session in sessions:
+            try:
+                response = call_controller.call(
+                    f"agent:{session.agent_id}",
+                    runtime_client.invoke_agent,
+                    stream_field='completion',
+                    agentId=session.agent_id,
+                    agentAliasId=session.agent_alias_id,
+                    sessionId=session.session_id,
+                    inputText="End session",
+                    endSession=True
+                )
+                # The session only closes once the response stream has been read
+                for _ in response['completion']:
+                    pass
+            except Exception as e:
+                print(f"Could not end agent session {session.session_id}: {e}")
+        return sessions
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            for key in [k for k, s in self._sessions.items() if s.expired(now, self.idle_timeout)]:
+                del self._sessions[key]
+
+
+# Process-wide manager; entries are keyed per browser session so users never share a sessionId
+agent_session_manager = AgentSessionManager()
+
+
+def user_session_key():
+    # Identifies this browser session; survives reruns, new for each new tab
+    if "agent_user_key" not in st.session_state:
+        st.session_state["agent_user_key"] = uuid.uuid4().hex
+    return st.session_state["agent_user_key"]
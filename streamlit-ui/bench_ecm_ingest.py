@@ -0,0 +1,94 @@
+# Benchmark for ecm_ingest on synthetic ECM server inventories of increasing size.
+#
+# Compares plain pandas readers with the chunked/streaming readers in ecm_ingest: wall time and
+# peak traced memory for CSV, single-sheet xlsx and multi-sheet xlsx (sequential vs process pool).
+#
+# Run: python bench_ecm_ingest.py [--rows 10000 50000 200000] [--xlsx-rows 5000 20000]
+import argparse
+import io
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import ecm_ingest
+
+OPERATING_SYSTEMS = ["Windows Server 2016", "Windows Server 2019", "RHEL 7", "RHEL 8", "Ubuntu 20.04", "SLES 12"]
+ENVIRONMENTS = ["Production", "Staging", "Development", "Test", "DR"]
+HYPERVISORS = ["VMware", "Hyper-V", "Physical", "KVM"]
+
+
+def synthetic_inventory(rows, seed=0):
+    # One row per server, shaped like a raw ECM inventory export
+    rng = np.random.default_rng(seed)
+    cores = rng.choice([2, 4, 8, 16, 32, 64], size=rows)
+    memory = cores * rng.choice([2, 4, 8], size=rows)
+    return pd.DataFrame({
+        "Server Name": [f"srv-{i:07d}" for i in range(rows)],
+        "Operating System": rng.choice(OPERATING_SYSTEMS, size=rows),
+        "Environment": rng.choice(ENVIRONMENTS, size=rows),
+        "Hypervisor": rng.choice(HYPERVISORS, size=rows),
+        "CPU Cores": cores,
+        "CPU Utilization Peak (%)": rng.uniform(1, 100, size=rows).round(1),
+        "Memory (GB)": memory,
+        "Memory Utilization Peak (%)": rng.uniform(5, 100, size=rows).round(1),
+        "Storage (GB)": rng.integers(50, 8000, size=rows),
+        "Storage Utilization (%)": rng.uniform(1, 100, size=rows).round(1),
+    })
+
+
+def measure(fn):
+    # Timed run first: tracemalloc slows openpyxl's per-cell allocations several-fold
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def report(label, rows, elapsed, peak, df):
+    size = df.memory_usage(deep=True).sum() if isinstance(df, pd.DataFrame) else sum(
+        frame.memory_usage(deep=True).sum() for frame in df.values())
+    print(f"{label:>28} {rows:>8} {elapsed:>9.3f} {peak / 2**20:>10.1f} {size / 2**20:>10.1f}")
+
+
+def bench_csv(rows):
+    data = synthetic_inventory(rows).to_csv(index=False).encode("utf-8")
+    report("csv pandas.read_csv", rows, *measure(lambda: pd.read_csv(io.BytesIO(data))))
+    report("csv ecm_ingest chunked", rows, *measure(lambda: ecm_ingest.read_csv_chunked(io.BytesIO(data))))
+
+
+def bench_xlsx(rows, sheets=3):
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        for i in range(sheets):
+            synthetic_inventory(rows, seed=i).to_excel(writer, sheet_name=f"Inventory{i}", index=False)
+    data = buffer.getvalue()
+
+    report("xlsx pandas.read_excel", rows, *measure(
+        lambda: pd.read_excel(io.BytesIO(data), engine="openpyxl", sheet_name="Inventory0")))
+    report("xlsx ecm_ingest streaming", rows, *measure(
+        lambda: ecm_ingest.read_xlsx_sheet(io.BytesIO(data), "Inventory0")))
+    report(f"xlsx {sheets} sheets sequential", rows, *measure(
+        lambda: ecm_ingest.read_xlsx(io.BytesIO(data), max_workers=1)))
+    # Force the pool regardless of file size; memory here is the parent process only
+    ecm_ingest.PARALLEL_MIN_BYTES = 0
+    report(f"xlsx {sheets} sheets pool", rows, *measure(
+        lambda: ecm_ingest.read_xlsx(io.BytesIO(data))))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ECM ingestion")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 50_000, 200_000])
+    parser.add_argument("--xlsx-rows", type=int, nargs="+", default=[5_000, 20_000])
+    args = parser.parse_args()
+
+    print(f"{'reader':>28} {'rows':>8} {'seconds':>9} {'peak MiB':>10} {'frame MiB':>10}")
+    for rows in args.rows:
+        bench_csv(rows)
+    for rows in args.xlsx_rows:
+        bench_xlsx(rows)
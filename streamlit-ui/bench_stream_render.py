@@ -0,0 +1,96 @@
+# Benchmark for stream_render: UI updates per streamed answer, per chunk vs coalesced frames.
+#
+# Replays a paced chunk stream on a simulated clock through the same loop render_turn runs,
+# against a placeholder that counts its updates. Each update is sized as the Markdown delta
+# Streamlit would send. It reports deltas and bytes per answer, plus how long a chunk waits
+# before it is on screen.
+#
+# Run: python bench_stream_render.py [--answer-kb 2 8 32] [--chunk-bytes 40] [--chunk-ms 15] [--interval-ms 50]
+import argparse
+import random
+
+from streamlit.proto.Markdown_pb2 import Markdown
+
+from stream_render import StreamRenderer
+
+
+class CountingPlaceholder:
+    def __init__(self, clock):
+        self.clock = clock
+        self.deltas = 0
+        self.bytes = 0
+        # Length of the text on screen after each update, with the time it was drawn
+        self.frames = []
+
+    def markdown(self, text):
+        self.deltas += 1
+        self.bytes += len(Markdown(body=text).SerializeToString())
+        self.frames.append((self.clock(), len(text)))
+
+
+def paced_chunks(answer_bytes, chunk_bytes, chunk_ms, seed=0):
+    # (arrival time, chunk) with jittered gaps, like tokens coming off an agent stream
+    rng = random.Random(seed)
+    now = 0.2
+    sent = 0
+    while sent < answer_bytes:
+        size = min(chunk_bytes, answer_bytes - sent)
+        yield now, "x" * size
+        sent += size
+        now += rng.expovariate(1000.0 / chunk_ms)
+
+
+def display_lag(arrivals, frames):
+    # Worst wait between a chunk arriving and the first frame that shows it
+    worst = 0.0
+    frame = 0
+    for arrived, end in arrivals:
+        while frames[frame][1] < end:
+            frame += 1
+        worst = max(worst, frames[frame][0] - arrived)
+    return worst
+
+
+def run(answer_bytes, args, coalesce):
+    now = [0.0]
+    clock = lambda: now[0]
+    placeholder = CountingPlaceholder(clock)
+    arrivals = []
+    received = 0
+    if coalesce:
+        renderer = StreamRenderer(placeholder, interval=args.interval_ms / 1000, frame_bytes=args.frame_bytes, clock=clock)
+    text = ""
+    for arrived, chunk in paced_chunks(answer_bytes, args.chunk_bytes, args.chunk_ms):
+        received += len(chunk)
+        arrivals.append((arrived, received))
+        if coalesce:
+            # render_turn wakes for held text when its frame is due, even with no new chunk
+            due = renderer.time_to_next_frame()
+            if due is not None and now[0] + due <= arrived:
+                now[0] += due
+                renderer.flush()
+            now[0] = arrived
+            renderer.add(chunk)
+        else:
+            now[0] = arrived
+            text += chunk
+            placeholder.markdown(text)
+    if coalesce:
+        renderer.finish()
+    return placeholder.deltas, placeholder.bytes, display_lag(arrivals, placeholder.frames), len(arrivals)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark coalesced streaming UI updates")
+    parser.add_argument("--answer-kb", type=int, nargs="+", default=[2, 8, 32])
+    parser.add_argument("--chunk-bytes", type=int, default=40, help="size of each streamed chunk")
+    parser.add_argument("--chunk-ms", type=float, default=15.0, help="mean gap between chunks")
+    parser.add_argument("--interval-ms", type=float, default=50.0, help="frame interval")
+    parser.add_argument("--frame-bytes", type=int, default=4096, help="held text that forces a frame")
+    args = parser.parse_args()
+
+    print(f"{'renderer':>10} {'answer KB':>9} {'chunks':>7} {'deltas':>7} {'KB sent':>9} {'max lag ms':>10}")
+    for kb in args.answer_kb:
+        for name, coalesce in (("per-chunk", False), ("coalesced", True)):
+            deltas, sent, lag, chunks = run(kb * 1024, args, coalesce)
+            print(f"{name:>10} {kb:>9} {chunks:>7} {deltas:>7} {sent / 1024:>9.1f} {lag * 1000:>10.1f}")
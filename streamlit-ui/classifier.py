@@ -0,0 +1,178 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+from aws_clients import get_client
+from call_control import call_controller
+
+# Completion-signal classification for the agent handoff.
+# A cheap local rule pass settles most agent turns; only ambiguous text escalates to a
+# Claude 3 Haiku `converse` call, and those verdicts are memoised in a bounded LRU keyed by a
+# hash of the normalised text.
+
+CLASSIFIER_MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0"
+CLASSIFIER_REGION = "us-east-1"
+CACHE_SIZE = 512
+
+YES = "Yes"
+NO = "No"
+
+
+class CompletionSignal:
+    def __init__(self, name, system, question, keywords, positive, negative):
+        self.name = name
+        self.system = system
+        self.question = question
+        # Text mentioning none of the keywords cannot be signalling completion
+        self.keywords = re.compile(keywords, re.IGNORECASE)
+        self.positive = [re.compile(p, re.IGNORECASE) for p in positive]
+        self.negative = [re.compile(p, re.IGNORECASE) for p in negative]
+
+    def rule_verdict(self, content):
+        # Returns Yes/No when the rules are confident, None when the text needs the model
+        if not self.keywords.search(content):
+            return NO
+        positive = any(p.search(content) for p in self.positive)
+        negative = any(p.search(content) for p in self.negative)
+        if positive and not negative:
+            return YES
+        if negative and not positive:
+            return NO
+        return None
+
+
+FILE_UPLOAD_SIGNAL = CompletionSignal(
+    name="file_upload",
+    system="You are a classifier that determines whether a message confirms that file upload is complete. Respond only with 'Yes' or 'No'. Do not explain.",
+    question="Does this message mean the files were uploaded?",
+    keywords=r"upload",
+    positive=[
+        r"\b(files?|configs?|documents?)\b[^.?!]{0,40}\b(have|has|were|was|are|is)\s+(now\s+|been\s+|successfully\s+)*uploaded",
+        r"\bupload(s|ing)?\s+(is|are|has been|have been)\s+(now\s+|successfully\s+)*complete",
+        r"\bsuccessfully uploaded\b",
+    ],
+    negative=[
+        r"\bplease\s+(upload|provide)",
+        r"\b(not|n't)\s+(yet\s+)?(been\s+)?uploaded",
+        r"\b(once|after|when)\s+you\s+(have\s+)?upload",
+        r"\bwaiting for\b[^.?!]{0,40}\bupload",
+        r"\b(need|needs|required)\s+to\s+(be\s+)?upload",
+    ],
+)
+
+CONFIG_COMPLETE_SIGNAL = CompletionSignal(
+    name="config_complete",
+    system=(
+        "You are a classifier that determines whether a message confirms that the config file review is complete. "
+        "Reply ONLY with 'Yes' or 'No'. Do not explain."
+    ),
+    question="Does this message confirm the config file is complete?",
+    keywords=r"config|review|complete|missing",
+    positive=[
+        r"\b(config(uration)?\s+)?(file\s+)?review\s+(is|has been)\s+(now\s+)?complete",
+        r"\bconfig(uration)?\s+(files?\s+)?(is|are)\s+(now\s+)?complete",
+        r"\bno\s+(missing|required)\s+(information|fields|values|details)\b",
+        r"\ball\s+required\s+(information|fields|values|details)\s+(is|are)\s+(present|provided)",
+    ],
+    negative=[
+        r"(?<!no )\bmissing\s+(information|fields?|values?|details)\b",
+        r"\b(is|are)\s+(still\s+)?missing\b",
+        r"\b(is|are)\s+(still\s+)?(incomplete|not complete)\b",
+        r"\bplease\s+(provide|confirm|update|fill)",
+    ],
+)
+
+
+def converse_yes_no(signal, content):
+    bedrock_runtime = get_client("bedrock-runtime", region_name=CLASSIFIER_REGION)
+
+    system = [{"text": signal.system}]
+
+    messages = [{
+        "role": "user",
+        "content": [{
+            "text": f'{signal.question}\n\n""" {content} """'
+        }]
+    }]
+
+    inf_params = {
+        "maxTokens": 10,
+        "temperature": 0.0,
+        "topP": 0.1
+    }
+
+    response = call_controller.call(
+        f"model:{CLASSIFIER_MODEL_ID}",
+        bedrock_runtime.converse,
+        modelId=CLASSIFIER_MODEL_ID,
+        messages=messages,
+        system=system,
+        inferenceConfig=inf_params
+    )
+
+    reply = response["output"]["message"]["content"][0]["text"].strip().lower()
+    return YES if reply.startswith("yes") else NO
+
+
+class CompletionClassifier:
+    def __init__(self, signal, remote=converse_yes_no, cache_size=CACHE_SIZE):
+        self.signal = signal
+        self.remote = remote
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "rule_verdicts": 0, "cache_hits": 0, "remote_calls": 0}
+
+    def _key(self, content):
+        normalised = " ".join(content.lower().split())
+        return hashlib.sha256(f"{self.signal.name}\0{normalised}".encode("utf-8")).hexdigest()
+
+    def classify(self, content):
+        with self._lock:
+            self.stats["calls"] += 1
+
+        if not content or not content.strip():
+            with self._lock:
+                self.stats["rule_verdicts"] += 1
+            return NO
+
+        verdict = self.signal.rule_verdict(content)
+        if verdict is not None:
+            with self._lock:
+                self.stats["rule_verdicts"] += 1
+            return verdict
+
+        key = self._key(content)
+        with self._lock:
+            verdict = self._cache.get(key)
+            if verdict is not None:
+                self._cache.move_to_end(key)
+                self.stats["cache_hits"] += 1
+                return verdict
+            self.stats["remote_calls"] += 1
+
+        verdict = self.remote(self.signal, content)
+
+        with self._lock:
+            self._cache[key] = verdict
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return verdict
+
+    @property
+    def remote_calls_avoided(self):
+        return self.stats["calls"] - self.stats["remote_calls"]
+
+
+# Process-wide classifiers, shared by every session so the LRU is shared too
+file_upload_classifier = CompletionClassifier(FILE_UPLOAD_SIGNAL)
+config_complete_classifier = CompletionClassifier(CONFIG_COMPLETE_SIGNAL)
+
+
+def classifier_stats():
+    return {
+        c.signal.name: dict(c.stats, remote_calls_avoided=c.remote_calls_avoided)
+        for c in (file_upload_classifier, config_complete_classifier)
+    }
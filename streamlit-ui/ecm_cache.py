@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import pandas as pd
+from botocore.exceptions import ClientError
+
+from metrics import metrics
+
+# Local cache for parsed ECM sheets.
+# Each (bucket, key, sheet) is stored as a Parquet file next to a small JSON sidecar holding the
+# S3 ETag it was parsed from. Lookups send that ETag as If-None-Match, so an unchanged workbook
+# costs one 304 round trip and a columnar read instead of a download plus an openpyxl parse.
+# Least recently used entries are evicted once the directory exceeds its size or entry budget.
+
+CACHE_DIR = os.getenv("ECM_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ecm_cache"))
+CACHE_MAX_BYTES = int(os.getenv("ECM_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+CACHE_MAX_ENTRIES = int(os.getenv("ECM_CACHE_MAX_ENTRIES", "64"))
+
+# Downloads larger than this spill from memory to a temporary file while being parsed
+SPOOL_MAX_BYTES = 32 * 1024 * 1024
+
+
+class ECMCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, max_entries=CACHE_MAX_ENTRIES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0}
+
+    def _paths(self, bucket, key, sheet_name):
+        digest = hashlib.sha256(f"{bucket}\0{key}\0{sheet_name}".encode("utf-8")).hexdigest()
+        base = os.path.join(self.directory, digest)
+        return base + ".parquet", base + ".json"
+
+    def etag(self, bucket, key, sheet_name):
+        data_path, meta_path = self._paths(bucket, key, sheet_name)
+        try:
+            with open(meta_path) as f:
+                etag = json.load(f)["etag"]
+        except (OSError, ValueError, KeyError):
+            return None
+        return etag if os.path.exists(data_path) else None
+
+    def load(self, bucket, key, sheet_name):
+        # None when the entry is gone: another session's store() may evict it at any point
+        data_path, _ = self._paths(bucket, key, sheet_name)
+        try:
+            df = pd.read_parquet(data_path)
+            # Touch the file so eviction sees it as recently used
+            os.utime(data_path)
+        except OSError:
+            return None
+        return df
+
+    def store(self, bucket, key, sheet_name, etag, df):
+        data_path, meta_path = self._paths(bucket, key, sheet_name)
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            try:
+                df.to_parquet(data_path + ".tmp", index=False)
+            except Exception as e:
+                # Mixed-type or non-string headers can't always be written as Parquet; skip caching
+                print(f"Not caching {bucket}/{key}: {e}")
+                if os.path.exists(data_path + ".tmp"):
+                    os.remove(data_path + ".tmp")
+                return
+            os.replace(data_path + ".tmp", data_path)
+            with open(meta_path, "w") as f:
+                json.dump({"bucket": bucket, "key": key, "sheet": sheet_name, "etag": etag}, f)
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".parquet"):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    # Evicted by another process sharing the directory
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        while entries and (total > self.max_bytes or len(entries) > self.max_entries):
+            _, size, path = entries.pop(0)
+            total -= size
+            for stale in (path, path[:-len(".parquet")] + ".json"):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+
+    @staticmethod
+    def _get_object(s3, bucket, key, etag):
+        # (span, response); response is None when S3 answers 304 to If-None-Match
+        request = {"Bucket": bucket, "Key": key}
+        if etag:
+            request["IfNoneMatch"] = etag
+        span = metrics.span("get_object", f"s3:{bucket}")
+        try:
+            return span, s3.get_object(**request)
+        except ClientError as e:
+            status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+            code = e.response.get("Error", {}).get("Code")
+            if etag and (status == 304 or code in ("304", "NotModified")):
+                span.finish()
+                return span, None
+            span.fail(e)
+            span.finish()
+            raise
+
+    def get_sheet(self, s3, bucket, key, sheet_name, parse):
+        # parse(fileobj) -> DataFrame is only called on a cache miss
+        cached_etag = self.etag(bucket, key, sheet_name)
+        span, response = self._get_object(s3, bucket, key, cached_etag)
+        if response is None:
+            df = self.load(bucket, key, sheet_name)
+            if df is not None:
+                self.stats["not_modified"] += 1
+                self.stats["hits"] += 1
+                return df
+            # Evicted between the ETag check and the 304; fetch the whole object instead
+            span, response = self._get_object(s3, bucket, key, None)
+
+        self.stats["misses"] += 1
+        # Stream the body into a spooled file instead of holding bytes plus a BytesIO copy
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as spool:
+            with span:
+                for chunk in response["Body"].iter_chunks(1024 * 1024):
+                    span.add(len(chunk))
+                    spool.write(chunk)
+            spool.seek(0)
+            df = parse(spool)
+
+        self.store(bucket, key, sheet_name, response["ETag"], df)
+        return df
+
+
+# Process-wide cache shared by every session
+ecm_cache = ECMCache()
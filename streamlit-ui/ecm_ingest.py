@@ -0,0 +1,203 @@
+import io
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from openpyxl import load_workbook
+from pandas.api.types import union_categoricals
+
+# ECM export ingestion for CSV and multi-sheet xlsx files.
+# CSVs are read in chunks and xlsx sheets are streamed row by row with openpyxl in read-only mode,
+# so only one chunk of raw cells is alive at a time. CSV columns the ECM export is known to have
+# are read with fixed dtypes instead of being inferred per chunk. Each chunk is compacted (numeric
+# downcast, repeated strings as categoricals) before the chunks are combined. Multiple sheets of a
+# large workbook are parsed in a process pool.
+
+CHUNK_ROWS = 50_000
+# String columns with fewer distinct values than this fraction of rows become categoricals
+CATEGORY_RATIO = 0.5
+# Workbooks smaller than this are not worth the cost of starting worker processes
+PARALLEL_MIN_BYTES = 4 * 1024 * 1024
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+XLSX_MAGIC = b"PK\x03\x04"
+
+# Lower-cased ECM column name pattern -> dtype, first match wins; other columns are inferred
+ECM_COLUMN_DTYPES = (
+    (re.compile(r"(util|usage|%)"), "float64"),
+    (re.compile(r"cpu|core|vcpu|mem|ram|storage|disk"), "float64"),
+    (re.compile(r"operating system|^os\b|environment|^env\b|hypervisor"), "category"),
+)
+# Size columns that get summed into totals; they stay float64, where float32 would lose precision
+SUMMED_COLUMNS = re.compile(r"(cpu|core|vcpu|mem|ram|storage|disk)(?!.*(util|usage|%))")
+# read_csv_chunked default: look the dtypes up from the header
+ECM_DTYPES = "ecm"
+
+
+def detect_format(fileobj, file_name=None):
+    # Sniff the zip header rather than trusting the extension; falls back to the extension
+    position = fileobj.tell()
+    head = fileobj.read(4)
+    fileobj.seek(position)
+    if head == XLSX_MAGIC:
+        return "xlsx"
+    if file_name and file_name.lower().endswith((".xlsx", ".xlsm")):
+        return "xlsx"
+    return "csv"
+
+
+def is_text(series):
+    # object columns from openpyxl, or pandas' dedicated string dtype from read_csv
+    return series.dtype == object or pd.api.types.is_string_dtype(series)
+
+
+def ecm_dtypes(columns):
+    dtypes = {}
+    for column in columns:
+        name = str(column).strip().lower()
+        for pattern, dtype in ECM_COLUMN_DTYPES:
+            if pattern.search(name):
+                dtypes[column] = dtype
+                break
+    return dtypes
+
+
+def compact_frame(df):
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_integer_dtype(series):
+            df[column] = pd.to_numeric(series, downcast="integer")
+        elif pd.api.types.is_float_dtype(series) and not SUMMED_COLUMNS.search(str(column).strip().lower()):
+            df[column] = pd.to_numeric(series, downcast="float")
+        elif is_text(series) and len(series) and series.nunique(dropna=True) < len(series) * CATEGORY_RATIO:
+            df[column] = series.astype("category")
+    return df
+
+
+def concat_chunks(chunks):
+    if not chunks:
+        return pd.DataFrame()
+    if len(chunks) == 1:
+        return chunks[0]
+    # Categoricals from different chunks have different categories; union them so the combined
+    # column stays categorical instead of falling back to object
+    for column in chunks[0].columns:
+        if all(isinstance(chunk[column].dtype, pd.CategoricalDtype) for chunk in chunks):
+            categories = union_categoricals([chunk[column] for chunk in chunks]).categories
+            for chunk in chunks:
+                chunk[column] = chunk[column].cat.set_categories(categories)
+        elif any(isinstance(chunk[column].dtype, pd.CategoricalDtype) for chunk in chunks):
+            for chunk in chunks:
+                chunk[column] = chunk[column].astype(object)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def read_csv_chunked(fileobj, chunk_rows=CHUNK_ROWS, dtype=ECM_DTYPES):
+    # dtype=None infers every column
+    position = fileobj.tell()
+    if dtype is ECM_DTYPES:
+        dtype = ecm_dtypes(pd.read_csv(fileobj, nrows=0).columns)
+        fileobj.seek(position)
+    try:
+        chunks = [compact_frame(chunk)
+                  for chunk in pd.read_csv(fileobj, chunksize=chunk_rows, dtype=dtype, low_memory=True)]
+    except ValueError as e:
+        if not dtype:
+            raise
+        # A known column holds something that isn't a number (e.g. "N/A"); infer it instead
+        print(f"ECM CSV does not match the expected column types ({e}); inferring them")
+        fileobj.seek(position)
+        return read_csv_chunked(fileobj, chunk_rows, dtype=None)
+    return concat_chunks(chunks)
+
+
+def read_xlsx_sheet(source, sheet_name, chunk_rows=CHUNK_ROWS):
+    # source is a path or a seekable file object; the first row is the header
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame()
+        columns = [str(name) if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)]
+
+        chunks = []
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk_rows:
+                chunks.append(compact_frame(pd.DataFrame.from_records(batch, columns=columns)))
+                batch = []
+        if batch or not chunks:
+            chunks.append(compact_frame(pd.DataFrame.from_records(batch, columns=columns)))
+        return concat_chunks(chunks)
+    finally:
+        workbook.close()
+
+
+def list_sheets(source):
+    workbook = load_workbook(source, read_only=True)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+
+def _read_sheet_from_path(path, sheet_name, chunk_rows):
+    return sheet_name, read_xlsx_sheet(path, sheet_name, chunk_rows)
+
+
+def read_xlsx(fileobj, sheet_names=None, chunk_rows=CHUNK_ROWS, max_workers=MAX_WORKERS):
+    # Returns {sheet name: DataFrame}; large multi-sheet workbooks are parsed one sheet per process
+    available = list_sheets(fileobj)
+    fileobj.seek(0)
+    if sheet_names is None:
+        sheet_names = available
+    missing = [name for name in sheet_names if name not in available]
+    if missing:
+        raise ValueError(f"Worksheet(s) {', '.join(missing)} not found")
+
+    fileobj.seek(0, io.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(0)
+
+    if len(sheet_names) < 2 or max_workers < 2 or size < PARALLEL_MIN_BYTES:
+        frames = {}
+        for name in sheet_names:
+            frames[name] = read_xlsx_sheet(fileobj, name, chunk_rows)
+            fileobj.seek(0)
+        return frames
+
+    # Workers open the workbook from a temporary file instead of each receiving a pickled copy.
+    # spawn, not fork: the Streamlit server is multi-threaded and forking it is unsafe.
+    with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as tmp:
+        shutil.copyfileobj(fileobj, tmp)
+        path = tmp.name
+    try:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(sheet_names)), mp_context=context) as pool:
+            results = pool.map(_read_sheet_from_path, [path] * len(sheet_names), sheet_names,
+                               [chunk_rows] * len(sheet_names))
+            frames = dict(results)
+        return {name: frames[name] for name in sheet_names}
+    finally:
+        os.remove(path)
+
+
+def load_ecm(fileobj, file_name=None, sheet_names=None, chunk_rows=CHUNK_ROWS):
+    # {sheet name: DataFrame}; a CSV is returned as a single sheet named after the file
+    if detect_format(fileobj, file_name) == "xlsx":
+        return read_xlsx(fileobj, sheet_names, chunk_rows)
+    name = os.path.splitext(os.path.basename(file_name))[0] if file_name else "csv"
+    return {name: read_csv_chunked(fileobj, chunk_rows)}
+
+
+def load_ecm_sheet(fileobj, file_name=None, sheet_name="Summary", chunk_rows=CHUNK_ROWS):
+    # One sheet of an xlsx export, or the whole table of a CSV export
+    if detect_format(fileobj, file_name) == "xlsx":
+        return read_xlsx_sheet(fileobj, sheet_name, chunk_rows)
+    return read_csv_chunked(fileobj, chunk_rows)
@@ -0,0 +1,149 @@
+import hashlib
+import io
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from ecm_ingest import concat_chunks, detect_format, list_sheets, load_ecm, read_xlsx_sheet
+
+# Summary metrics computed locally from a raw ECM per-server inventory.
+# Everything is column-wise pandas/NumPy (quantile, groupby, value_counts); there are no Python
+# loops over rows. Results are memoised per file content hash so reruns reuse them.
+
+PERCENTILES = (0.5, 0.95)
+MEMO_SIZE = 16
+
+# Canonical metric -> pattern matched against lower-cased column names, first match wins
+COLUMN_PATTERNS = {
+    "cpu_utilization": r"cpu.*(util|usage|%)",
+    "memory_utilization": r"(mem|ram).*(util|usage|%)",
+    "storage_utilization": r"(storage|disk).*(util|usage|%)",
+    "cpu_cores": r"(cpu|core|vcpu)(?!.*(util|usage|%))",
+    "memory_gb": r"(mem|ram)(?!.*(util|usage|%))",
+    "storage_gb": r"(storage|disk)(?!.*(util|usage|%))",
+    "operating_system": r"operating system|^os\b|\bos (name|version)",
+    "environment": r"environment|^env\b",
+}
+
+UTILIZATION_LABELS = {
+    "cpu_utilization": "CPU",
+    "memory_utilization": "Memory",
+    "storage_utilization": "Storage",
+}
+
+
+@dataclass
+class ECMSummary:
+    # radar: first column holds categories, the rest are series, as create_radar_chart expects
+    radar: pd.DataFrame
+    precomputed: bool = False
+    totals: dict = field(default_factory=dict)
+    os_breakdown: pd.DataFrame = None
+    environment_breakdown: pd.DataFrame = None
+
+
+def detect_columns(df):
+    found = {}
+    used = set()
+    names = {column: str(column).strip().lower() for column in df.columns}
+    for metric, pattern in COLUMN_PATTERNS.items():
+        regex = re.compile(pattern)
+        for column, name in names.items():
+            if column not in used and regex.search(name):
+                found[metric] = column
+                used.add(column)
+                break
+    return found
+
+
+def _numeric(df, column):
+    return pd.to_numeric(df[column], errors="coerce")
+
+
+def summarize_inventory(df):
+    columns = detect_columns(df)
+    utilization = {metric: columns[metric] for metric in UTILIZATION_LABELS if metric in columns}
+    if not utilization:
+        raise ValueError("No CPU, memory or storage utilisation columns found in the inventory")
+
+    util = pd.DataFrame({metric: _numeric(df, column) for metric, column in utilization.items()})
+
+    # Radar categories are e.g. "CPU p50", "CPU p95"; series are all servers plus each environment
+    categories = [f"{UTILIZATION_LABELS[metric]} p{int(q * 100)}" for metric in util.columns for q in PERCENTILES]
+    series = {"All servers": util.quantile(list(PERCENTILES)).T.to_numpy().ravel()}
+    environment = columns.get("environment")
+    if environment is not None:
+        grouped = util.groupby(df[environment].astype("category"), observed=True).quantile(list(PERCENTILES))
+        # index is (environment, percentile); unstack to one row per environment, columns in
+        # the same metric-major order as the categories
+        per_env = grouped.unstack(level=-1).reindex(
+            columns=pd.MultiIndex.from_product([util.columns, PERCENTILES]))
+        for name, row in per_env.iterrows():
+            series[str(name)] = row.to_numpy()
+    radar = pd.DataFrame({"Metric": categories, **series})
+
+    totals = {"servers": int(len(df))}
+    for metric in ("cpu_cores", "memory_gb", "storage_gb"):
+        if metric in columns:
+            totals[metric] = float(_numeric(df, columns[metric]).sum())
+
+    os_breakdown = None
+    if "operating_system" in columns:
+        os_breakdown = df[columns["operating_system"]].value_counts().rename_axis("Operating System").reset_index(name="Servers")
+
+    environment_breakdown = None
+    if environment is not None:
+        sized = pd.DataFrame({"servers": 1}, index=df.index)
+        for metric in ("cpu_cores", "memory_gb", "storage_gb"):
+            if metric in columns:
+                sized[metric] = _numeric(df, columns[metric])
+        environment_breakdown = sized.groupby(df[environment].astype("category"), observed=True).sum().reset_index(names="Environment")
+
+    return ECMSummary(radar=radar, totals=totals, os_breakdown=os_breakdown, environment_breakdown=environment_breakdown)
+
+
+def _summarize_table(df):
+    # A table without recognisable inventory columns is taken to be a precomputed summary
+    try:
+        return summarize_inventory(df)
+    except ValueError:
+        return ECMSummary(radar=df, precomputed=True)
+
+
+def _load_summary(file_content, file_name):
+    fileobj = io.BytesIO(file_content)
+    if detect_format(fileobj, file_name) == "xlsx":
+        sheets = list_sheets(fileobj)
+        fileobj.seek(0)
+        if "Summary" in sheets:
+            return ECMSummary(radar=read_xlsx_sheet(fileobj, "Summary"), precomputed=True)
+    # A raw inventory may be split over several sheets with the same columns; large workbooks
+    # have their sheets parsed one per process
+    frames = list(load_ecm(fileobj, file_name).values())
+    inventory = [frame for frame in frames if list(frame.columns) == list(frames[0].columns)]
+    return _summarize_table(concat_chunks(inventory))
+
+
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def summary_for_file(file_content, file_name=None):
+    # Memoised on the file's content hash, so the same export uploaded again is not re-parsed
+    key = hashlib.sha256(file_content).hexdigest()
+    with _memo_lock:
+        summary = _memo.get(key)
+        if summary is not None:
+            _memo.move_to_end(key)
+            return summary
+
+    summary = _load_summary(file_content, file_name)
+
+    with _memo_lock:
+        _memo[key] = summary
+        while len(_memo) > MEMO_SIZE:
+            _memo.popitem(last=False)
+    return summary
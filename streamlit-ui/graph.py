@@ -1,58 +1,133 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.graph_objects as go
-import boto3
+import hashlib
 import io
+import os
+import threading
+from collections import OrderedDict
+
+from aws_clients import get_client
+from ecm_cache import ecm_cache
+from ecm_ingest import load_ecm_sheet
+from ecm_summary import summary_for_file
 
 # AWS S3 configuration
-S3_BUCKET_NAME = 'migration.test.excel'
+S3_BUCKET_NAME = os.getenv("ECM_BUCKET", 'migration.test.excel')
 
 
-# Initialize S3 client
-s3 = boto3.client('s3')
+# Shared S3 client from the process-wide pool
+s3 = get_client('s3')
 
 
-def get_excel_data(file_name):
+def read_summary_sheet(fileobj, file_name=None):
+    # Summary sheet of an xlsx export, or the whole table of a CSV export
+    return load_ecm_sheet(fileobj, file_name, sheet_name='Summary')
+
+
+def parse_excel_bytes(file_content, file_name=None):
+    # Parse a workbook already held in memory (e.g. a fresh upload) without going through S3.
+    # Uses the workbook's Summary sheet when there is one, otherwise computes it from the raw inventory.
     try:
-        # Download the file from S3
-        response = s3.get_object(Bucket=S3_BUCKET_NAME, Key=file_name)
-        file_content = response['Body'].read()
+        return summary_for_file(file_content, file_name)
+    except Exception as e:
+        st.sidebar.error(f"Error reading Excel file: {str(e)}")
+        return None
 
-        # Read the Excel file
-        df = pd.read_excel(io.BytesIO(file_content), engine='openpyxl', sheet_name='Summary')
+
+def get_excel_data(file_name):
+    try:
+        # Served from the local ETag-keyed cache; openpyxl only runs when the workbook changed
+        df = ecm_cache.get_sheet(
+            s3, S3_BUCKET_NAME, file_name, 'Summary',
+            lambda fileobj: read_summary_sheet(fileobj, file_name)
+        )
         return df
 
     except Exception as e:
         st.sidebar.error(f"Error reading Excel file from S3: {str(e)}")
         return None
 
-def create_radar_chart(df):
-    # Assuming the first column contains categories and subsequent columns are data series
-    categories = df.iloc[:, 0].tolist()
-    
-    fig = go.Figure()
-
-    for column in df.columns[1:]:
-        values = df[column].tolist()
-        # Add the first value again to close the polygon
-        values.append(values[0])
-        
-        fig.add_trace(go.Scatterpolar(
-            r=values,
-            theta=categories + [categories[0]],  # Repeat the first category to close the polygon
-            mode='lines',  # Use lines mode
-            name=column
-        ))
+# Radar chart limits: beyond these, the smallest series/categories are folded into "Other"
+MAX_SERIES = 12
+MAX_CATEGORIES = 36
+FIGURE_CACHE_SIZE = 32
+
+_figure_cache = OrderedDict()
+_figure_cache_lock = threading.Lock()
+
 
+def _fold_other(values, labels, limit, axis):
+    # Keep the `limit - 1` largest rows/columns by total and average the rest into one "Other"
+    count = values.shape[axis]
+    if count <= limit:
+        return values, labels
+    totals = np.nansum(values, axis=1 - axis)
+    order = np.argsort(-totals, kind="stable")
+    keep = np.sort(order[:limit - 1])
+    rest = order[limit - 1:]
+    other = np.nanmean(np.take(values, rest, axis=axis), axis=axis, keepdims=True)
+    values = np.concatenate([np.take(values, keep, axis=axis), other], axis=axis)
+    labels = [labels[i] for i in keep] + [f"Other ({len(rest)})"]
+    return values, labels
+
+
+def _figure_key(df, max_series, max_categories, webgl):
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    digest.update(repr((list(map(str, df.columns)), max_series, max_categories, webgl)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def create_radar_chart(df, max_series=MAX_SERIES, max_categories=MAX_CATEGORIES, webgl=False):
+    # Assuming the first column contains categories and subsequent columns are data series.
+    # Figures are cached per data hash and shared; callers must not mutate the returned figure.
+    # The caps keep a chart to a few hundred points, so SVG traces are the default; pass
+    # webgl=True with much higher caps.
+    key = _figure_key(df, max_series, max_categories, webgl)
+    with _figure_cache_lock:
+        fig = _figure_cache.get(key)
+        if fig is not None:
+            _figure_cache.move_to_end(key)
+            return fig
+
+    categories = df.iloc[:, 0].astype(str).tolist()
+    names = [str(column) for column in df.columns[1:]]
+    # rows are categories, columns are series
+    values = df.iloc[:, 1:].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+
+    values, names = _fold_other(values, names, max_series, axis=1)
+    values, categories = _fold_other(values, categories, max_categories, axis=0)
+
+    # Repeat the first category to close the polygon
+    closed = np.vstack([values, values[:1]])
+    theta = categories + categories[:1]
+
+    trace_type = go.Scatterpolargl if webgl else go.Scatterpolar
+
+    traces = [
+        trace_type(r=closed[:, i], theta=theta, mode='lines', name=name)
+        for i, name in enumerate(names)
+    ]
+    finite = values[np.isfinite(values)]
+    r_max = finite.max() if finite.size else 1.0
+
+    fig = go.Figure(data=traces)
     fig.update_layout(
         polar=dict(
             radialaxis=dict(
                 visible=True,
-                range=[0, max(df.iloc[:, 1:].max())]  # Set range from 0 to max value
+                range=[0, float(r_max)]  # Set range from 0 to max value
             )),
         showlegend=True,
         title='Radar Chart from Excel'
     )
+
+    with _figure_cache_lock:
+        _figure_cache[key] = fig
+        while len(_figure_cache) > FIGURE_CACHE_SIZE:
+            _figure_cache.popitem(last=False)
     return fig
 
 # Streamlit app
@@ -0,0 +1,268 @@
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from botocore.exceptions import ClientError
+
+from aws_clients import get_client
+from call_control import call_controller
+from metrics import metrics
+
+# Background scheduler for Bedrock knowledge-base ingestion jobs.
+# Jobs are started and polled on a worker pool so the Streamlit script thread never blocks;
+# the page reads IngestionJob snapshots to render progress.
+# Before starting a job the data source's S3 objects are fingerprinted (key, ETag, size) and
+# compared with the manifest from the last successful sync; unchanged sources are skipped.
+
+MAX_WORKERS = 4
+INITIAL_POLL_DELAY = 2.0
+MAX_POLL_DELAY = 30.0
+JOB_TIMEOUT = 30 * 60
+MANIFEST_PATH = os.getenv("KB_MANIFEST_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".kb_manifest.json"))
+
+RUNNING_STATUSES = ("STARTING", "IN_PROGRESS")
+TERMINAL_STATUSES = ("COMPLETE", "UNCHANGED", "FAILED", "STOPPED", "ERROR", "TIMED_OUT")
+
+
+@dataclass
+class IngestionJob:
+    knowledge_base_id: str
+    data_source_id: str
+    status: str = "SUBMITTED"
+    ingestion_job_id: str = None
+    error: str = None
+    polls: int = 0
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: float = None
+    done_event: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def key(self):
+        return (self.knowledge_base_id, self.data_source_id)
+
+    @property
+    def done(self):
+        return self.done_event.is_set()
+
+    @property
+    def succeeded(self):
+        return self.status in ("COMPLETE", "UNCHANGED")
+
+    @property
+    def elapsed(self):
+        return (self.finished_at or time.time()) - self.submitted_at
+
+    def wait(self, timeout=None):
+        return self.done_event.wait(timeout)
+
+
+def backoff_delay(attempt, initial=INITIAL_POLL_DELAY, maximum=MAX_POLL_DELAY):
+    # Exponential backoff with jitter: somewhere between half and all of the capped delay,
+    # so concurrent pollers spread out instead of hitting the API in lockstep
+    delay = min(maximum, initial * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class SourceManifest:
+    # Fingerprints of each data source's S3 objects as of its last successful ingestion,
+    # persisted as JSON so skips survive app restarts
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = None
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self.path) as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    @staticmethod
+    def _key(knowledge_base_id, data_source_id):
+        return f"{knowledge_base_id}/{data_source_id}"
+
+    def get(self, knowledge_base_id, data_source_id):
+        with self._lock:
+            return self._load().get(self._key(knowledge_base_id, data_source_id))
+
+    def put(self, knowledge_base_id, data_source_id, fingerprint):
+        with self._lock:
+            entries = self._load()
+            entries[self._key(knowledge_base_id, data_source_id)] = fingerprint
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(entries, f, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+
+def s3_locations(data_source):
+    # (bucket, prefix) pairs covered by an S3 data source, from a get_data_source response
+    s3_config = data_source["dataSourceConfiguration"].get("s3Configuration")
+    if not s3_config:
+        return None
+    bucket = s3_config["bucketArn"].split(":::", 1)[-1]
+    prefixes = s3_config.get("inclusionPrefixes") or [""]
+    return [(bucket, prefix) for prefix in prefixes]
+
+
+def fingerprint_objects(s3, locations):
+    # {"bucket/key": [etag, size]} for every object under the given locations
+    fingerprint = {}
+    paginator = s3.get_paginator("list_objects_v2")
+    for bucket, prefix in locations:
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                fingerprint[f"{bucket}/{obj['Key']}"] = [obj["ETag"], obj["Size"]]
+    return fingerprint
+
+
+class IngestionJobManager:
+    def __init__(self, client_factory=None, max_workers=MAX_WORKERS, initial_delay=INITIAL_POLL_DELAY,
+                 max_delay=MAX_POLL_DELAY, timeout=JOB_TIMEOUT, s3_client_factory=None, manifest=None):
+        self.client_factory = client_factory or (lambda: get_client("bedrock-agent"))
+        self.s3_client_factory = s3_client_factory or (lambda: get_client("s3"))
+        self.manifest = manifest if manifest is not None else SourceManifest()
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="kb-ingestion")
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def submit(self, knowledge_base_id, data_source_id):
+        # Returns immediately; a sync already running for the same KB/data source is reused
+        key = (knowledge_base_id, data_source_id)
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and not job.done:
+                return job
+            job = IngestionJob(knowledge_base_id, data_source_id)
+            self._jobs[key] = job
+        self._executor.submit(self._run, job)
+        return job
+
+    def submit_many(self, sources):
+        # Start several syncs at once, e.g. master-config and customer-config together
+        return [self.submit(knowledge_base_id, data_source_id) for knowledge_base_id, data_source_id in sources]
+
+    def get(self, knowledge_base_id, data_source_id):
+        with self._lock:
+            return self._jobs.get((knowledge_base_id, data_source_id))
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def wait_all(self, jobs, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for job in jobs:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not job.wait(remaining):
+                return False
+        return True
+
+    def _finish(self, job, status, error=None):
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        job.done_event.set()
+        if status == "UNCHANGED":
+            print(f"Data sync skipped for {job.knowledge_base_id}/{job.data_source_id}: source objects unchanged")
+        elif status == "COMPLETE":
+            print(f"Data sync completed successfully for {job.knowledge_base_id}/{job.data_source_id}")
+        else:
+            print(f"Data sync for {job.knowledge_base_id}/{job.data_source_id} ended with status: {status} {error or ''}")
+
+    def _fingerprint(self, bedrock_agent, job):
+        # None when the source can't be fingerprinted; the job then always ingests
+        try:
+            data_source = bedrock_agent.get_data_source(
+                knowledgeBaseId=job.knowledge_base_id,
+                dataSourceId=job.data_source_id
+            )['dataSource']
+            locations = s3_locations(data_source)
+            if not locations:
+                return None
+            return fingerprint_objects(self.s3_client_factory(), locations)
+        except Exception as e:
+            print(f"Could not fingerprint {job.knowledge_base_id}/{job.data_source_id}, syncing anyway: {e}")
+            return None
+
+    def _start(self, bedrock_agent, job):
+        try:
+            response = call_controller.call(
+                f"kb:{job.knowledge_base_id}",
+                bedrock_agent.start_ingestion_job,
+                knowledgeBaseId=job.knowledge_base_id,
+                dataSourceId=job.data_source_id
+            )
+            return response['ingestionJob']
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "ConflictException":
+                raise
+            # A sync started elsewhere (another process or the console) is still running: follow it
+            running = bedrock_agent.list_ingestion_jobs(
+                knowledgeBaseId=job.knowledge_base_id,
+                dataSourceId=job.data_source_id,
+                filters=[{"attribute": "STATUS", "operator": "EQ", "values": list(RUNNING_STATUSES)}],
+                sortBy={"attribute": "STARTED_AT", "order": "DESCENDING"},
+                maxResults=1
+            ).get("ingestionJobSummaries", [])
+            if not running:
+                raise
+            return running[0]
+
+    def _run(self, job):
+        try:
+            bedrock_agent = self.client_factory()
+
+            fingerprint = self._fingerprint(bedrock_agent, job)
+            if fingerprint is not None and fingerprint == self.manifest.get(job.knowledge_base_id, job.data_source_id):
+                self._finish(job, "UNCHANGED")
+                return
+
+            started = self._start(bedrock_agent, job)
+            job.ingestion_job_id = started['ingestionJobId']
+            job.status = started.get('status', "STARTING")
+
+            deadline = time.monotonic() + self.timeout
+            attempt = 0
+            while job.status not in TERMINAL_STATUSES:
+                if time.monotonic() >= deadline:
+                    self._finish(job, "TIMED_OUT", f"still {job.status} after {self.timeout}s")
+                    return
+                time.sleep(backoff_delay(attempt, self.initial_delay, self.max_delay))
+                attempt += 1
+
+                with metrics.span("get_ingestion_job", f"kb:{job.knowledge_base_id}"):
+                    status_response = bedrock_agent.get_ingestion_job(
+                        knowledgeBaseId=job.knowledge_base_id,
+                        dataSourceId=job.data_source_id,
+                        ingestionJobId=job.ingestion_job_id
+                    )
+                job.polls += 1
+                job.status = status_response['ingestionJob']['status']
+                if job.status in ("FAILED", "STOPPED"):
+                    reasons = status_response['ingestionJob'].get('failureReasons') or []
+                    self._finish(job, job.status, "; ".join(reasons) or None)
+                    return
+
+            if job.status == "COMPLETE" and fingerprint is not None:
+                # Fingerprint taken before the job started, so edits made during ingestion still
+                # count as changes next time
+                self.manifest.put(job.knowledge_base_id, job.data_source_id, fingerprint)
+            self._finish(job, job.status)
+
+        except Exception as e:
+            self._finish(job, "ERROR", str(e))
+
+
+# Process-wide manager so a sync started by one session is visible to (and deduplicated for) all
+ingestion_manager = IngestionJobManager()
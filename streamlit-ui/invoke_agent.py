@@ -3,54 +3,163 @@ from botocore.auth import SigV4Auth
 from botocore.awsrequest import AWSRequest
 from botocore.credentials import Credentials
 import boto3
+import codecs
 import json
 import os
 from requests import request
 import base64
 import io
 import sys
+import time
+from dataclasses import dataclass, field
 
 import uuid
 
-class BedrockAgentClient:
-    def __init__(self, region_name="us-east-1"):
-        # Initialize the Bedrock Agent Runtime client
-        self.runtime_client = boto3.client(
-            service_name="bedrock-agent-runtime",
-            region_name=region_name
-        )
+from agent_trace import TRACE_ENABLED, TraceCollector, trace_recorder
+from aws_clients import get_client
+from call_control import call_controller
+from response_cache import get_response_cache, replay_chunks
 
-    def chat_with_agent(self, agent_id, agent_alias_id, prompt):
+
+@dataclass
+class AgentResponse:
+    # Final result of one agent turn, available once the stream is exhausted
+    session_id: str
+    response: str = ""
+    trace_data: list = field(default_factory=list)
+    status_code: int = 200
+    error: str = None
+    chunk_count: int = 0
+    time_to_first_chunk: float = None
+    elapsed: float = 0.0
+    cached: bool = False
+
+    @property
+    def ok(self):
+        return self.status_code == 200
+
+
+class AgentStream:
+    # Iterating yields decoded completion chunks as they arrive from Bedrock.
+    # Once iteration stops (exhausted, failed or abandoned) `result` holds the AgentResponse.
+    def __init__(self, runtime_client, agent_id, agent_alias_id, prompt, session_id=None, response_cache=None,
+                 enable_trace=TRACE_ENABLED):
+        self.runtime_client = runtime_client
+        self.agent_id = agent_id
+        self.agent_alias_id = agent_alias_id
+        self.prompt = prompt
+        self.session_id = session_id or uuid.uuid4().hex
+        self.response_cache = response_cache
+        # Ask Bedrock for trace events and keep compact records of them (see agent_trace)
+        self.enable_trace = enable_trace
+        self.result = None
+        self._completion = None
+
+    @property
+    def cache_target(self):
+        return f"agent:{self.agent_id}/{self.agent_alias_id}"
+
+    def __iter__(self):
+        result = AgentResponse(session_id=self.session_id)
+        chunks = []
+        # Incremental decoder so a multi-byte character split across chunks is not mangled
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        start = time.perf_counter()
+        traces = TraceCollector(self.session_id, self.agent_id) if self.enable_trace else None
         try:
-            # Create a unique session ID for the conversation
-            session_id = uuid.uuid4().hex
-            
-            # Invoke the agent
-            response = self.runtime_client.invoke_agent(
-                agentId=agent_id,
-                agentAliasId=agent_alias_id,
-                sessionId=session_id,
-                inputText=prompt
+            cached = self.response_cache.get(self.prompt, self.cache_target) if self.response_cache else None
+            if cached is not None:
+                # Replay through the same chunked path a live answer takes
+                result.cached = True
+                for chunk in replay_chunks(cached):
+                    if result.time_to_first_chunk is None:
+                        result.time_to_first_chunk = time.perf_counter() - start
+                    chunks.append(chunk)
+                    result.chunk_count += 1
+                    yield chunk
+                return
+
+            # Rate limited, retried on throttling and held to the process-wide concurrency cap
+            response = call_controller.call(
+                f"agent:{self.agent_id}",
+                self.runtime_client.invoke_agent,
+                stream_field='completion',
+                agentId=self.agent_id,
+                agentAliasId=self.agent_alias_id,
+                sessionId=self.session_id,
+                inputText=self.prompt,
+                enableTrace=self.enable_trace
             )
 
-            # Process the streaming response
-            completion = ""
-            trace_data='' 
-            
-            for event in response['completion']:
+            self._completion = response['completion']
+            for event in self._completion:
                 if 'chunk' in event:
-                    # Get the response chunk
-                    chunk = event['chunk']['bytes'].decode('utf-8')
-                    completion+= chunk
-                    
-               
-                return {
-            "status_code": 200,
-            "body": json.dumps({"trace_data": trace_data,"response": completion})
-                     } 
+                    chunk = decoder.decode(event['chunk']['bytes'])
+                    if not chunk:
+                        continue
+                    if result.time_to_first_chunk is None:
+                        result.time_to_first_chunk = time.perf_counter() - start
+                    chunks.append(chunk)
+                    result.chunk_count += 1
+                    yield chunk
+                elif 'trace' in event and traces is not None:
+                    traces.add(event['trace'])
+
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                chunks.append(tail)
+                yield tail
+
+            if self.response_cache is not None:
+                self.response_cache.put(self.prompt, self.cache_target, "".join(chunks), time.perf_counter() - start)
 
         except Exception as e:
-                return {
-            "status_code": 500,
-            "body": json.dumps({"error": str(e)})
-                    }
\ No newline at end of file
+            result.status_code = 500
+            result.error = str(e)
+        finally:
+            if traces is not None:
+                result.trace_data = traces.records
+                trace_recorder.record(self.session_id, traces.records)
+            result.response = "".join(chunks)
+            result.elapsed = time.perf_counter() - start
+            self.result = result
+
+    def close(self):
+        # Safe from another thread: cuts off a response stream that is blocked waiting for Bedrock,
+        # so the reading thread fails fast instead of holding its worker until the read timeout
+        close = getattr(self._completion, "close", None)
+        if close is not None:
+            close()
+
+    def collect(self):
+        # Drain the stream and return the final result
+        for _ in self:
+            pass
+        return self.result
+
+
+class BedrockAgentClient:
+    def __init__(self, region_name="us-east-1", response_cache=None, enable_trace=TRACE_ENABLED):
+        # Shared Bedrock Agent Runtime client from the process-wide pool
+        self.runtime_client = get_client("bedrock-agent-runtime", region_name=region_name)
+        # Opt-in answer cache; None unless RESPONSE_CACHE_ENABLED is set or one is passed in
+        self.response_cache = response_cache if response_cache is not None else get_response_cache()
+        self.enable_trace = enable_trace
+
+    def stream_chat_with_agent(self, agent_id, agent_alias_id, prompt, session_id=None):
+        # Incremental mode: iterate the returned stream for chunks, then read stream.result
+        return AgentStream(self.runtime_client, agent_id, agent_alias_id, prompt, session_id=session_id,
+                           response_cache=self.response_cache, enable_trace=self.enable_trace)
+
+    def chat_with_agent(self, agent_id, agent_alias_id, prompt):
+        # Blocking mode kept for existing callers; same response shape as before
+        result = self.stream_chat_with_agent(agent_id, agent_alias_id, prompt).collect()
+        if not result.ok:
+            return {
+                "status_code": result.status_code,
+                "body": json.dumps({"error": result.error})
+            }
+        return {
+            "status_code": 200,
+            "body": json.dumps({"trace_data": result.trace_data, "response": result.response})
+        }
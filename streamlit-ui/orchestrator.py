@@ -0,0 +1,200 @@
+import codecs
+import threading
+import time
+from dataclasses import dataclass, field
+
+from call_control import call_controller
+
+# Event-driven Discovery -> InfoValidation -> Analysis orchestration.
+# The orchestrator lives in st.session_state and each rerun advances it by at most one step:
+# start a turn for the user's prompt, render a turn that is streaming, or move to the next stage.
+# Agent turns run on worker threads. As soon as a finished turn carries the handoff signal, the
+# worker starts the handoff work (KB syncs, then the next agent's opening prompt) in the
+# background, so the next agent is usually already answering when the page moves to it.
+
+# How long a handoff turn waits for its knowledge-base syncs before asking the agent anyway
+SYNC_WAIT_TIMEOUT = 15 * 60
+# How often the page refreshes a streaming answer
+RENDER_INTERVAL = 0.1
+
+
+@dataclass
+class Stage:
+    name: str
+    agent_id: str
+    alias_id: str
+    # content -> "Yes"/"No"; None for the last stage
+    handoff_classifier: object = None
+    next_stage: str = None
+    handoff_message: str = None
+    # Syncs that must finish before this stage's agent gets its opening prompt
+    syncs: list = field(default_factory=list)
+    opening_prompt: str = None
+
+
+class AgentTurn:
+    # One agent response running on its own thread; the page reads snapshots while it streams
+    def __init__(self, runtime_client, stage, session, prompt, wait_for=(), on_complete=None):
+        self.runtime_client = runtime_client
+        self.stage = stage
+        self.session = session
+        self.prompt = prompt
+        self.wait_for = list(wait_for)
+        self.on_complete = on_complete
+        self.status = "PENDING"
+        self.error = None
+        self.handoff = False
+        self.rendered = False
+        self.started_at = time.time()
+        self.first_chunk_at = None
+        self._chunks = []
+        self._cond = threading.Condition()
+        self._done = False
+        self._thread = threading.Thread(target=self._run, name=f"agent-turn-{stage.name}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    @property
+    def done(self):
+        return self._done
+
+    def snapshot(self):
+        with self._cond:
+            return "".join(self._chunks), self._done
+
+    def chunks_since(self, seen_chunks):
+        # Only the chunks a reader hasn't had yet, so redraws don't rejoin the whole answer
+        with self._cond:
+            return self._chunks[seen_chunks:], self._done
+
+    def wait_for_update(self, seen_chunks, timeout):
+        with self._cond:
+            if not self._done and len(self._chunks) == seen_chunks:
+                self._cond.wait(timeout)
+            return len(self._chunks)
+
+    def _set_status(self, status):
+        with self._cond:
+            self.status = status
+            self._cond.notify_all()
+
+    def _run(self):
+        try:
+            if self.wait_for:
+                self._set_status("SYNCING")
+                deadline = time.monotonic() + SYNC_WAIT_TIMEOUT
+                for job in self.wait_for:
+                    job.wait(max(0.0, deadline - time.monotonic()))
+
+            self._set_status("STREAMING")
+            response = call_controller.call(
+                f"agent:{self.stage.agent_id}",
+                self.runtime_client.invoke_agent,
+                stream_field='completion',
+                agentId=self.stage.agent_id,
+                agentAliasId=self.stage.alias_id,
+                sessionId=self.session.session_id,
+                inputText=self.prompt
+            )
+            decoder = codecs.getincrementaldecoder("utf-8")()
+            for event in response.get('completion', []):
+                if isinstance(event, dict) and 'chunk' in event:
+                    content = decoder.decode(event['chunk'].get('bytes', b''))
+                    if content:
+                        with self._cond:
+                            if self.first_chunk_at is None:
+                                self.first_chunk_at = time.time()
+                            self._chunks.append(content)
+                            self._cond.notify_all()
+
+            text = "".join(self._chunks)
+            if self.stage.handoff_classifier is not None and self.stage.handoff_classifier(text) == "Yes":
+                self.handoff = True
+            self.status = "COMPLETE"
+        except Exception as e:
+            self.status = "FAILED"
+            self.error = e
+        finally:
+            # The completion handler queues the handoff turn; it runs before the turn reads as done
+            # so the page can't advance() first and start that turn without its syncs
+            try:
+                if self.on_complete is not None:
+                    self.on_complete(self)
+            except Exception as e:
+                print(f"Turn completion handler for {self.stage.name} failed: {e}")
+            finally:
+                with self._cond:
+                    self._done = True
+                    self._cond.notify_all()
+
+
+class MigrationOrchestrator:
+    def __init__(self, stages, first_stage, runtime_client, session_manager, user_key, ingestion_manager):
+        self.stages = {stage.name: stage for stage in stages}
+        self.stage_name = first_stage
+        self.runtime_client = runtime_client
+        self.session_manager = session_manager
+        self.user_key = user_key
+        self.ingestion_manager = ingestion_manager
+        self.turn = None
+        # Speculative first turn of the next stage, started by the worker that saw the handoff
+        self.next_turn = None
+        self._lock = threading.Lock()
+
+    @property
+    def stage(self):
+        return self.stages.get(self.stage_name)
+
+    @property
+    def ended(self):
+        return self.stage_name == "ended"
+
+    @property
+    def busy(self):
+        return self.turn is not None and not self.turn.rendered
+
+    def _start_turn(self, stage, prompt, wait_for=()):
+        session = self.session_manager.get_session(self.user_key, stage.agent_id, stage.alias_id)
+        self.session_manager.record_turn(session)
+        return AgentTurn(self.runtime_client, stage, session, prompt, wait_for=wait_for,
+                         on_complete=self._on_turn_complete).start()
+
+    def _on_turn_complete(self, turn):
+        # Worker thread: kick off the handoff without waiting for the page to catch up
+        if not turn.handoff or turn.stage.next_stage is None:
+            return
+        next_stage = self.stages[turn.stage.next_stage]
+        with self._lock:
+            if self.next_turn is not None:
+                return
+            jobs = self.ingestion_manager.submit_many(next_stage.syncs) if next_stage.syncs else []
+            if next_stage.opening_prompt:
+                self.next_turn = self._start_turn(next_stage, next_stage.opening_prompt, wait_for=jobs)
+
+    def submit(self, prompt):
+        # One user prompt -> one turn on the current stage's agent
+        if self.ended or self.busy:
+            return None
+        self.turn = self._start_turn(self.stage, prompt)
+        return self.turn
+
+    def end(self):
+        self.session_manager.end_sessions(self.runtime_client, self.user_key)
+        self.stage_name = "ended"
+        self.turn = None
+        self.next_turn = None
+
+    def advance(self):
+        # Called after the current turn has been rendered; True when the stage changed
+        turn = self.turn
+        if turn is None or not turn.rendered or not turn.handoff:
+            return False
+        with self._lock:
+            self.stage_name = turn.stage.next_stage
+            self.turn = self.next_turn
+            self.next_turn = None
+        if self.turn is None and self.stage.opening_prompt:
+            self.turn = self._start_turn(self.stage, self.stage.opening_prompt)
+        return True
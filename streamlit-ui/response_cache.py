@@ -0,0 +1,111 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# Opt-in disk-backed cache of agent and flow answers.
+# Entries are keyed on the normalised prompt plus the agent/flow alias that answered it, expire
+# after a TTL and are evicted least-recently-used beyond a size limit. Cached answers are replayed
+# in chunks so callers consume them through the same streaming path as a live response.
+#
+# Enable with RESPONSE_CACHE_ENABLED=true. Agent answers can depend on session memory, so only
+# enable it where the same question is expected to get the same answer.
+
+CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".response_cache.sqlite3"))
+CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", str(24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+REPLAY_CHUNK_SIZE = 256
+
+
+def normalize_prompt(prompt):
+    # Case, whitespace and trailing punctuation don't change the question
+    return re.sub(r"\s+", " ", prompt).strip().rstrip("?.!").strip().lower()
+
+
+def replay_chunks(text, chunk_size=REPLAY_CHUNK_SIZE):
+    for start in range(0, len(text), chunk_size):
+        yield text[start:start + chunk_size]
+
+
+class ResponseCache:
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, target TEXT, prompt TEXT, response TEXT,"
+            " created REAL, last_access REAL, latency REAL, hits INTEGER DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "latency_saved": 0.0}
+
+    @staticmethod
+    def key(prompt, target):
+        return hashlib.sha256(f"{target}\0{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+    def get(self, prompt, target):
+        key = self.key(prompt, target)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created, latency FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.stats["misses"] += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_access = ?, hits = hits + 1 WHERE key = ?", (now, key)
+            )
+            self.stats["hits"] += 1
+            self.stats["latency_saved"] += row[2] or 0.0
+            return row[0]
+
+    def put(self, prompt, target, response, latency=None):
+        if not response:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, target, prompt, response, created, last_access, latency, hits)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                (self.key(prompt, target), target, prompt, response, now, now, latency)
+            )
+            self.stats["stores"] += 1
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def purge_expired(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+
+    @property
+    def hit_rate(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    # Process-wide cache, or None when caching is not enabled
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
@@ -1,31 +1,43 @@
 import streamlit as st
 import json
+import os
 import pandas as pd
 
 
 # Streamlit page configuration
 st.set_page_config(page_title="AWS MigrationPro", page_icon=":rocket:", layout="wide")
 
-import boto3
-import uuid
 from botocore.exceptions import NoCredentialsError
-from graph import get_excel_data, create_radar_chart
+from graph import parse_excel_bytes, create_radar_chart
 from invoke_agent import BedrockAgentClient
+from aws_clients import get_client
+from classifier import file_upload_classifier, config_complete_classifier, classifier_stats
+from ingestion import ingestion_manager
+from uploads import uploader
+from agent_sessions import agent_session_manager, user_session_key
+from orchestrator import MigrationOrchestrator, Stage, RENDER_INTERVAL
+from metrics import metrics, render_metrics_panel
+from stream_render import StreamRenderer
 
 
 
-# Initialize S3 client
-s3 = boto3.client('s3', region_name="us-east-1")
+# Shared S3 client from the process-wide pool
+s3 = get_client('s3', region_name="us-east-1")
 
 
 # Agent IDs
 
-DISCOVERY_AGENT_ID = "3SZXST6KPE"
-DISCOVERY_AGENT_ALIAS_ID = "WGFQSGAZLG"
-INFO_VALIDATION_AGENT_ID = "ATTGGAKZKM"
-INFO_VALIDATION_AGENT_ALIAS = "LLHGNO10AV"
-ANALYSIS_AGENT_ID = "LHSGIRXMNB"
-ANALYSIS_AGENT_ALIAS = "JLQHOLUDY5"
+DISCOVERY_AGENT_ID = os.getenv("DISCOVERY_AGENT_ID", "3SZXST6KPE")
+DISCOVERY_AGENT_ALIAS_ID = os.getenv("DISCOVERY_AGENT_ALIAS_ID", "WGFQSGAZLG")
+INFO_VALIDATION_AGENT_ID = os.getenv("INFO_VALIDATION_AGENT_ID", "ATTGGAKZKM")
+INFO_VALIDATION_AGENT_ALIAS = os.getenv("INFO_VALIDATION_AGENT_ALIAS_ID", "LLHGNO10AV")
+ANALYSIS_AGENT_ID = os.getenv("ANALYSIS_AGENT_ID", "LHSGIRXMNB")
+ANALYSIS_AGENT_ALIAS = os.getenv("ANALYSIS_AGENT_ALIAS_ID", "JLQHOLUDY5")
+
+# Upload buckets
+ISV_CONFIG_BUCKET = os.getenv("ISV_CONFIG_BUCKET", "migration.test19")
+CUSTOMER_CONFIG_BUCKET = os.getenv("CUSTOMER_CONFIG_BUCKET", "customer-config-file-v1")
+ECM_BUCKET = os.getenv("ECM_BUCKET", "migration.test.excel")
 
 def format_response(response_body):
     try:
@@ -37,20 +49,31 @@ def format_response(response_body):
     except json.JSONDecodeError:
         return response_body
 
-def display_graph(file):
-    df = get_excel_data(file)
-    if df is not None:
+def display_graph(summary):
+    if summary is not None:
+        df = summary.radar
+        if not summary.precomputed:
+            st.write(f"Summary computed from {summary.totals['servers']} servers:")
+            st.write(summary.totals)
         st.write("Data from Excel:")
         st.write(df)
         
         fig = create_radar_chart(df)
         st.plotly_chart(fig)
+
+        if summary.os_breakdown is not None:
+            st.write("Servers by operating system:")
+            st.write(summary.os_breakdown)
+        if summary.environment_breakdown is not None:
+            st.write("Servers by environment:")
+            st.write(summary.environment_breakdown)
     else:
         st.warning("Could not read data from the Excel file.")
 
 def upload_to_s3(file, bucket_name, object_name):
     try:
-        s3.upload_fileobj(file, bucket_name, object_name)
+        with metrics.span("upload_fileobj", f"s3:{bucket_name}"):
+            s3.upload_fileobj(file, bucket_name, object_name)
         return True
     except NoCredentialsError:
         st.error("Credentials not available")
@@ -61,112 +84,105 @@ def upload_to_s3(file, bucket_name, object_name):
 
 # check if file upload is completed or not. 
 def is_file_upload_complete(content: str) -> str:
-    bedrock_runtime = boto3.client("bedrock-runtime", region_name="us-east-1")
-
-    system = [{
-        "text": "You are a classifier that determines whether a message confirms that file upload is complete. Respond only with 'Yes' or 'No'. Do not explain."
-    }]
-
-    messages = [{
-        "role": "user",
-        "content": [{
-            "text": f'Does this message mean the files were uploaded?\n\n""" {content} """'
-        }]
-    }]
-
-    inf_params = {
-        "maxTokens": 10,
-        "temperature": 0.0,
-        "topP": 0.1
-    }
-
-    response = bedrock_runtime.converse(
-        modelId="anthropic.claude-3-haiku-20240307-v1:0",
-        messages=messages,
-        system=system,
-        inferenceConfig=inf_params
-    )
-
-    reply = response["output"]["message"]["content"][0]["text"].strip().lower()
-    return "Yes" if reply.startswith("yes") else "No"
+    return file_upload_classifier.classify(content)
 
 # check if config files have missing info
 def is_config_complete(content: str) -> str:
-    bedrock_runtime = boto3.client("bedrock-runtime", region_name="us-east-1")
+    return config_complete_classifier.classify(content)
 
-    system = [{
-        "text": (
-            "You are a classifier that determines whether a message confirms that the config file review is complete. "
-            "Reply ONLY with 'Yes' or 'No'. Do not explain."
-        )
-    }]
-
-    messages = [{
-        "role": "user",
-        "content": [{
-            "text": f'Does this message confirm the config file is complete?\n\n""" {content} """'
-        }]
-    }]
-
-    inf_params = {
-        "maxTokens": 10,
-        "temperature": 0.0,
-        "topP": 0.1
-    }
-
-    response = bedrock_runtime.converse(
-        modelId="anthropic.claude-3-haiku-20240307-v1:0",
-        messages=messages,
-        system=system,
-        inferenceConfig=inf_params
-    )
-
-    reply = response["output"]["message"]["content"][0]["text"].strip().lower()
-    return "Yes" if reply.startswith("yes") else "No"
-
-# sync knolwedge base
+# sync knolwedge base in the background; returns the IngestionJob without waiting for it
 def sync_knowledge_base(knowledge_base_id, data_source_id):
-    # Create Bedrock Agent client
-    bedrock_agent = boto3.client('bedrock-agent')
-    
-    try:
-        # Start the ingestion job
-        response = bedrock_agent.start_ingestion_job(
-            knowledgeBaseId=knowledge_base_id,
-            dataSourceId=data_source_id
+    return ingestion_manager.submit(knowledge_base_id, data_source_id)
+
+# Knowledge bases synced at the agent handoffs
+MASTER_CONFIG_KB = (os.getenv("MASTER_CONFIG_KB_ID", "SOUOF3OQUP"), os.getenv("MASTER_CONFIG_DATA_SOURCE_ID", "GWBIH3DD0R"))
+CUSTOMER_CONFIG_KB = (os.getenv("CUSTOMER_CONFIG_KB_ID", "QZHNS8O1VZ"), os.getenv("CUSTOMER_CONFIG_DATA_SOURCE_ID", "H2URI0CHKM"))
+
+@st.fragment(run_every=3)
+def render_ingestion_status():
+    # Re-runs on its own timer so job progress shows up without blocking or rerunning the page
+    jobs = ingestion_manager.jobs()
+    if not jobs:
+        return
+    st.subheader("Knowledge base sync")
+    for job in jobs:
+        label = f"{job.knowledge_base_id}: {job.status} ({job.elapsed:.0f}s)"
+        if job.succeeded:
+            st.success(label)
+        elif job.done:
+            st.error(f"{label} {job.error or ''}")
+        else:
+            st.info(label)
+
+# Discovery -> InfoValidation -> Analysis, driven one step per rerun by MigrationOrchestrator
+MIGRATION_STAGES = [
+    Stage(
+        "discovery", DISCOVERY_AGENT_ID, DISCOVERY_AGENT_ALIAS_ID,
+        handoff_classifier=is_file_upload_complete,
+        next_stage="info_validation",
+        handoff_message="Detected file upload is complete. I will move on to config file validation.",
+    ),
+    Stage(
+        "info_validation", INFO_VALIDATION_AGENT_ID, INFO_VALIDATION_AGENT_ALIAS,
+        handoff_classifier=is_config_complete,
+        next_stage="analysis",
+        handoff_message="Detected config file review is complete. I will move on to analysis the content for making a migration plan.",
+        # master config is needed now; customer config starts alongside so it is warm for analysis
+        syncs=[MASTER_CONFIG_KB, CUSTOMER_CONFIG_KB],
+        opening_prompt="I have uploaded the files.",
+    ),
+    Stage(
+        "analysis", ANALYSIS_AGENT_ID, ANALYSIS_AGENT_ALIAS,
+        syncs=[CUSTOMER_CONFIG_KB],
+        opening_prompt="Help me make a migration plan",
+    ),
+]
+
+def get_orchestrator():
+    if "orchestrator" not in st.session_state:
+        st.session_state.orchestrator = MigrationOrchestrator(
+            MIGRATION_STAGES, "discovery",
+            runtime_client=get_client("bedrock-agent-runtime", region_name="us-east-1"),
+            session_manager=agent_session_manager,
+            user_key=user_session_key(),
+            ingestion_manager=ingestion_manager,
         )
-        
-        ingestion_job_id = response['ingestionJob']['ingestionJobId']
-        
-        # Poll for job completion
+    return st.session_state.orchestrator
+
+def render_turn(turn):
+    # Stream a background turn into a single chat bubble, coalesced into frames, then record it
+    # in the history once
+    with st.chat_message("assistant"):
+        placeholder = st.empty()
+        renderer = StreamRenderer(placeholder)
+        syncing_shown = False
+        seen = 0
         while True:
-            status_response = bedrock_agent.get_ingestion_job(
-                knowledgeBaseId=knowledge_base_id,
-                dataSourceId=data_source_id,
-                ingestionJobId=ingestion_job_id
-            )
-            
-            status = status_response['ingestionJob']['status']
-            
-            if status == 'COMPLETE':
-                print("Data sync completed successfully")
+            chunks, done = turn.chunks_since(seen)
+            seen += len(chunks)
+            for chunk in chunks:
+                renderer.add(chunk)
+            if not seen and not syncing_shown and turn.status == "SYNCING":
+                placeholder.markdown("🔄 Syncing config files with the knowledge base before handing over...")
+                syncing_shown = True
+            if done:
                 break
-            elif status in ['FAILED', 'STOPPED']:
-                print(f"Data sync failed with status: {status}")
-                if 'errorMessage' in status_response['ingestionJob']:
-                    print(f"Error: {status_response['ingestionJob']['errorMessage']}")
-                break
-                
-            print(f"Sync info between agents in progress... Current status: {status}")
-            time.sleep(5)  # Wait for 30 seconds before checking again
-            
-    except Exception as e:
-        print(f"Error during sync: {str(e)}")
-
-def chat_with_agent(agent_id, alias_id, region='us-east-1', prompt_override = None):
-    client = boto3.client("bedrock-agent-runtime", region_name=region)
-    session_id = str(uuid.uuid4())
-
+            if renderer.time_to_next_frame() == 0:
+                renderer.flush()
+            turn.wait_for_update(seen, renderer.time_to_next_frame() or RENDER_INTERVAL)
+        text = renderer.finish()
+    turn.rendered = True
+
+    if turn.error is not None:
+        # Kept in the history so it's still shown after the rerun that re-enables the input
+        st.session_state.chat_history.append(
+            {"role": "assistant", "content": f"❌ Error: {turn.error}\n\n❌ Error Type: {type(turn.error)}"})
+        return
+    st.session_state.chat_history.append({"role": "assistant", "content": text})
+    if turn.handoff:
+        st.session_state.chat_history.append({"role": "✅LOG", "content": turn.stage.handoff_message})
+
+def chat_with_agent(orchestrator):
     if 'chat_history' not in st.session_state:
         st.session_state.chat_history = []
 
@@ -178,50 +194,28 @@ def chat_with_agent(agent_id, alias_id, region='us-east-1', prompt_override = No
     if not st.session_state.chat_history:
         st.chat_message("assistant").markdown("💬 Hi, I am MigrationPro Agent and I can help you build a migration plan based on your config files. Type [ I need help with migration ] to begin:")
 
-    while True: 
-        if prompt := st.chat_input("You:"):
+    # The agent takes one prompt at a time, so the input is off while a turn is on screen
+    if prompt := st.chat_input("You:", disabled=orchestrator.ended or orchestrator.busy):
+        if prompt.lower() in ["exit", "quit"]:
             st.session_state.chat_history.append({"role": "user", "content": prompt})
             st.chat_message("user").markdown(prompt)
+            orchestrator.end()
+            st.chat_message("assistant").markdown("👋 Ending session.")
+            return
 
-            if prompt.lower() in ["exit", "quit"]:
-                st.chat_message("assistant").markdown("👋 Ending session.")
-                break
-
-            try:
-                response = client.invoke_agent(
-                    agentId=agent_id,
-                    agentAliasId=alias_id,
-                    sessionId=session_id,
-                    inputText=prompt
-                )
-
-                agent_response = ""
-                for chunk in response.get('completion', []):             
-                    if isinstance(chunk, dict):
-                        if 'chunk' in chunk:
-                            content = chunk['chunk'].get('bytes', '').decode("utf-8")
-                            agent_response += content
-
-                            st.session_state.chat_history.append({"role": "assistant", "content": agent_response})
-                            st.chat_message("assistant").markdown(agent_response)
-
-                            # determine signal to switch agent
-                            if agent_id == "3SZXST6KPE" and is_file_upload_complete(content) == "Yes":
-                                st.session_state.chat_history.append({"role": "✅LOG", "content": "Detected file upload is complete. I will move on to config file validation."})
-                                return "to_info_validation"
-                            if agent_id == "ATTGGAKZKM" and is_config_complete(content) == "Yes":
-                                st.session_state.chat_history.append({"role": "✅LOG", "content": "Detected config file review is complete. I will move on to analysis the content for making a migration plan."})
-                                return "to_analysis"
-                # Only override the first message
-                if prompt_override:
-                    prompt_override = None
-
-            except Exception as e:
-                st.error(f"❌ Error: {e}")
-                st.error(f"❌ Error Type: {type(e)}")
-                break
+        # Only prompts an agent has actually taken go into the history
+        if orchestrator.submit(prompt) is None:
+            st.warning("⏳ The agent is still answering. Send your message again once it has finished.")
+        else:
+            st.session_state.chat_history.append({"role": "user", "content": prompt})
+            st.chat_message("user").markdown(prompt)
 
-    return "end"
+    if orchestrator.busy:
+        render_turn(orchestrator.turn)
+        # Rerun to re-enable the input; after a handoff the next agent's first answer is
+        # usually already streaming
+        orchestrator.advance()
+        st.rerun()
 
 def migration_pro_page():
     st.title("MigrationPro")
@@ -231,7 +225,7 @@ def migration_pro_page():
     
     with isv_col:
         st.subheader("Upload ISV Files")
-        s3_bucket_name_isv = 'migration.test19'
+        s3_bucket_name_isv = ISV_CONFIG_BUCKET
         uploaded_file_isv = st.file_uploader("Choose ISV Config file", type=["json"], key="isv_config_uploader")
         if uploaded_file_isv is not None:
             if st.button('Upload ISV Config'):
@@ -246,7 +240,7 @@ def migration_pro_page():
         
     with customer_col:
         st.subheader("Upload Customer Files")
-        s3_bucket_name_customer = 'customer-config-file-v1'
+        s3_bucket_name_customer = CUSTOMER_CONFIG_BUCKET
         uploaded_file_customer = st.file_uploader("Choose Customer Config file", type=["json"], key="customer_config_uploader")
         if uploaded_file_customer is not None:
             if st.button('Upload Customer Config'):
@@ -262,39 +256,50 @@ def migration_pro_page():
     # Chat interface
     st.header("Chat with MigrationPro Agent")
     
-    if 'current_agent' not in st.session_state:
-        st.session_state.current_agent = "discovery"
-
-    if st.session_state.current_agent == "discovery":
-        next_step = chat_with_agent(DISCOVERY_AGENT_ID, DISCOVERY_AGENT_ALIAS_ID)
-
-        if next_step == "to_info_validation":
-            st.session_state.current_agent = "info_validation"
-            sync_knowledge_base('SOUOF3OQUP', 'GWBIH3DD0R') # master config
-            next_step = chat_with_agent(INFO_VALIDATION_AGENT_ID, INFO_VALIDATION_AGENT_ALIAS, 'us-east-1', prompt_override="I have uploaded the files.")
-
-        if next_step == "to_analysis":
-            st.session_state.current_agent = "analysis"
-            # sync config files with knowledge base
-            sync_knowledge_base('QZHNS8O1VZ', 'H2URI0CHKM') # customer config kb
-            next_step = chat_with_agent(ANALYSIS_AGENT_ID, ANALYSIS_AGENT_ALIAS, 'us-east-1', prompt_override="Help me make a migration plan")
+    orchestrator = get_orchestrator()
+    st.caption(f"Current agent: {orchestrator.stage_name.replace('_', ' ')}")
+    chat_with_agent(orchestrator)
+
+@st.fragment(run_every=1)
+def poll_ecm_upload(task):
+    # Polls the write-behind upload so progress shows up while the chart is on screen
+    if task.done:
+        # One full rerun shows the outcome; the page then stops rendering this timed fragment
+        st.rerun()
+    st.progress(task.progress, text=f"Uploading {task.key} to S3... {task.bytes_sent}/{task.size} bytes")
+
+def render_ecm_upload_status():
+    task = st.session_state.get("ecm_upload")
+    if task is None:
+        return
+    if task.succeeded:
+        st.success(f"Excel file {task.key} uploaded successfully!")
+    elif task.done:
+        st.error(f"Failed to upload Excel file to S3: {task.error}")
+    else:
+        poll_ecm_upload(task)
 
 def ecm_analysis_page():
     st.title("ECM Analysis")
-    s3_bucket_name_excel = 'migration.test.excel'
+    s3_bucket_name_excel = ECM_BUCKET
     uploaded_file_excel = st.file_uploader("Choose a file", type=["csv","xlsx"], key="excel_uploader")
     
     if uploaded_file_excel is not None:
         if st.button('Upload Excel'):
             file_name = uploaded_file_excel.name
-            if upload_to_s3(uploaded_file_excel, s3_bucket_name_excel, file_name):
-                st.success(f"Excel file {file_name} uploaded successfully!")
-                display_graph(file_name)
-            else:
-                st.error("Failed to upload Excel file to S3.")
+            file_content = uploaded_file_excel.getvalue()
+            # Upload runs behind the page; the chart is built from the copy already in memory
+            st.session_state.ecm_upload = uploader.submit(file_content, s3_bucket_name_excel, file_name)
+            # Kept so the chart survives the rerun that reports the finished upload
+            st.session_state.ecm_summary = (file_name, parse_excel_bytes(file_content, file_name))
+        shown = st.session_state.get("ecm_summary")
+        if shown is not None and shown[0] == uploaded_file_excel.name:
+            display_graph(shown[1])
         else:
             st.info(f"Excel file {uploaded_file_excel.name} selected. Click to upload.")
 
+    render_ecm_upload_status()
+
 def main():
     # Sidebar navigation
     st.sidebar.title("Navigation")
@@ -305,9 +310,27 @@ def main():
     elif page == "ECM Analysis":
         ecm_analysis_page()
 
+    # fragments can't target st.sidebar themselves, so render inside it
+    with st.sidebar:
+        render_ingestion_status()
+
+    # Handoff classifier counters
+    with st.sidebar.expander("Handoff classifier"):
+        for name, stats in classifier_stats().items():
+            st.caption(f"{name}: {stats['remote_calls_avoided']} of {stats['calls']} remote calls avoided ({stats['cache_hits']} cache hits)")
+
+    with st.sidebar:
+        render_metrics_panel()
+
     # Add a button to clear chat history
+    for agent_session in agent_session_manager.sessions(user_session_key()):
+        st.sidebar.caption(f"Session with {agent_session.agent_id}: {agent_session.turns} turns")
+
     if st.sidebar.button("Clear Chat History"):
+        # Cleared history means a fresh conversation, so drop the agents' memory too
+        agent_session_manager.end_sessions(get_client("bedrock-agent-runtime", region_name="us-east-1"), user_session_key())
         st.session_state.chat_history = []
+        st.session_state.pop("orchestrator", None)
         st.rerun()
 
 if __name__ == "__main__":
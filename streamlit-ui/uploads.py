@@ -0,0 +1,78 @@
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from aws_clients import get_client
+from metrics import metrics
+
+# Write-behind S3 uploads.
+# The page hands over bytes it already holds in memory and carries on; the upload runs on a
+# worker thread and reports progress through the returned UploadTask.
+
+MAX_WORKERS = 4
+
+
+@dataclass
+class UploadTask:
+    bucket: str
+    key: str
+    size: int
+    status: str = "PENDING"
+    bytes_sent: int = 0
+    error: str = None
+    started_at: float = field(default_factory=time.time)
+    finished_at: float = None
+    done_event: threading.Event = field(default_factory=threading.Event, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def done(self):
+        return self.done_event.is_set()
+
+    @property
+    def succeeded(self):
+        return self.status == "DONE"
+
+    @property
+    def progress(self):
+        return min(1.0, self.bytes_sent / self.size) if self.size else 1.0
+
+    def wait(self, timeout=None):
+        return self.done_event.wait(timeout)
+
+    def _on_bytes(self, amount):
+        # boto3 transfer callback; may be called from several transfer threads
+        with self._lock:
+            self.bytes_sent += amount
+
+
+class BackgroundUploader:
+    def __init__(self, client_factory=None, max_workers=MAX_WORKERS):
+        self.client_factory = client_factory or (lambda: get_client("s3", region_name="us-east-1"))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="s3-upload")
+
+    def submit(self, data, bucket, key):
+        task = UploadTask(bucket, key, len(data))
+        self._executor.submit(self._run, task, data)
+        return task
+
+    def _run(self, task, data):
+        task.status = "UPLOADING"
+        try:
+            with metrics.span("upload_fileobj", f"s3:{task.bucket}") as span:
+                self.client_factory().upload_fileobj(io.BytesIO(data), task.bucket, task.key, Callback=task._on_bytes)
+                span.add(len(data))
+            task.status = "DONE"
+        except Exception as e:
+            task.status = "FAILED"
+            task.error = str(e)
+            print(f"Upload of {task.bucket}/{task.key} failed: {e}")
+        finally:
+            task.finished_at = time.time()
+            task.done_event.set()
+
+
+# Process-wide uploader shared by every session
+uploader = BackgroundUploader()
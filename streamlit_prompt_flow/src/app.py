@@ -1,19 +1,43 @@
 import asyncio
 import json
-import boto3
+import os
 import streamlit as st
 import streamlit.components.v1 as components
 from pathlib import Path
+from aws_clients import get_client
+from context_builder import ContextBuilder, converse_summarizer
+from response_cache import get_response_cache
+from flow_stream import load_flow_targets, stream_flow
+from metrics import render_metrics_panel
+from stream_render import StreamRenderer, render_async_stream
 
 FILE_ROOT = Path(__file__).parent
 
-session = boto3.Session()
-
-bedrock_agent_client = session.client(service_name='bedrock-agent-runtime')
+# Shared client from the process-wide pool, reused across reruns and sessions
+bedrock_agent_client = get_client('bedrock-agent-runtime')
 
 # Define the flow identifier and alias identifier
-flow_identifier = 'arn:aws:bedrock:us-east-1:774305585272:flow/PUXQWUEVJ3'
-alias_identifier = 'arn:aws:bedrock:us-east-1:774305585272:flow/PUXQWUEVJ3/alias/AM5DB8AZDA'
+flow_identifier = os.getenv("FLOW_IDENTIFIER", 'arn:aws:bedrock:us-east-1:774305585272:flow/PUXQWUEVJ3')
+alias_identifier = os.getenv("FLOW_ALIAS_IDENTIFIER", 'arn:aws:bedrock:us-east-1:774305585272:flow/PUXQWUEVJ3/alias/AM5DB8AZDA')
+
+# Flows shown side by side, one column each (set PROMPT_FLOWS to compare several)
+flow_targets = load_flow_targets(flow_identifier, alias_identifier)
+
+# Opt-in answer cache (RESPONSE_CACHE_ENABLED=true); None when disabled. Keyed on the whole
+# document sent to the flow, so only identical conversations hit.
+response_cache = get_response_cache()
+
+# Replace turns that no longer fit the context budget with a rolling summary (costs a model call
+# whenever more turns fall out of the window)
+SUMMARIZE_OLD_TURNS = os.getenv("FLOW_CONTEXT_SUMMARY", "false").lower() == "true"
+
+def get_context_builder(messages_key: str) -> ContextBuilder:
+    if "context_builders" not in st.session_state:
+        st.session_state.context_builders = {}
+    builders = st.session_state.context_builders
+    if messages_key not in builders:
+        builders[messages_key] = ContextBuilder(summarizer=converse_summarizer if SUMMARIZE_OLD_TURNS else None)
+    return builders[messages_key]
 
 def render_messages(messages: list, assistant_avatar: str | None = None):
     for message in messages:
@@ -29,10 +53,20 @@ def render_messages(messages: list, assistant_avatar: str | None = None):
                     with st.chat_message("assistant", avatar=assistant_avatar):
                         st.markdown(message["content"])
 
-def query_bedrock_prompt_flow(messages_key: str):
+def format_document(document) -> str:
+    return document if isinstance(document, str) else json.dumps(document)
+
+async def query_bedrock_prompt_flow(target):
+    messages_key = target.name
     messages=st.session_state.messages[messages_key]
-    #convert messages to a string
-    messages_string = json.dumps(messages)
+    #convert the most recent messages that fit the context budget to a string
+    builder = get_context_builder(messages_key)
+    if SUMMARIZE_OLD_TURNS:
+        # Summarizing makes a blocking model call; run it off the event loop so the other flows
+        # keep streaming meanwhile
+        messages_string = await asyncio.to_thread(builder.build, messages)
+    else:
+        messages_string = builder.build(messages)
     
     # Define the input objects for the flow
     input_objects = [
@@ -45,35 +79,17 @@ def query_bedrock_prompt_flow(messages_key: str):
         }
     ]
 
-    try:
-        # Invoke the flow
-        response = bedrock_agent_client.invoke_flow(
-            flowIdentifier=flow_identifier,
-            flowAliasIdentifier=alias_identifier,
-            inputs=input_objects
-        )
-        
-        # Get the FlowResponseStream
-        response_stream = response['responseStream']
-
-        for event in response_stream:
-            print("Event received:", event)
-            if 'flowOutputEvent' in event:
-                yield event['flowOutputEvent']['content']['document']
-
-    except Exception as e:
-        st.error(e)
-        print(e)
-        # Remove the previous human prompt from chat history
-        st.session_state.messages[messages_key].pop()
-        st.stop()
-    
+    # The flow runs on a worker thread, so other flows keep streaming while this one waits
+    async for document in stream_flow(bedrock_agent_client, target, input_objects, messages_string, response_cache):
+        yield document
+
 async def get_reply(
     container: st.container,
-    messages_key: str,
+    target,
     prompt: str,
     loading_fp: Path = FILE_ROOT / "loading.gif",
 ):
+    messages_key = target.name
     with container:
         # Render new human prompt
         with st.chat_message("user"):
@@ -82,26 +98,27 @@ async def get_reply(
         # Add prompt to chat history
         st.session_state.messages[messages_key].append({"role": "user", "content": prompt})
 
-        # Render new response
+        # Render new response, redrawn at most once per frame however fast documents arrive
         with st.chat_message("assistant"):
             message_placeholder = st.empty()
-            full_response = ""
+            renderer = StreamRenderer(message_placeholder)
+            documents = (format_document(document) async for document in query_bedrock_prompt_flow(target))
             try:
-                full_response = st.write_stream(query_bedrock_prompt_flow(messages_key))
+                full_response = await render_async_stream(renderer, documents)
             except Exception as e:
                 message_placeholder.empty()
                 st.error(e)
                 print(e)
-                # Remove the previous human prompt from chat history
+                # Remove the previous human prompt from chat history; the other flows carry on
                 st.session_state.messages[messages_key].pop()
-                st.stop()
+                return
 
         # Add response to chat history
         st.session_state.messages[messages_key].append({"role": "assistant", "content": full_response})
 
 async def main():
 
-    aws_account = session.client('sts').get_caller_identity().get('Account')  
+    aws_account = get_client('sts').get_caller_identity().get('Account')  
 
     st.set_page_config(
         page_title=f'DemoAI - Account({aws_account})',
@@ -119,12 +136,28 @@ async def main():
     st.markdown(title, unsafe_allow_html=True)
     with st.container():
         # Render model columns
-        columns = st.columns(1)
-        messages_key = "prompt_flow"
-        if messages_key not in st.session_state.messages:
-            st.session_state.messages[messages_key] = []
-        with columns[0]:
-            render_messages(st.session_state.messages[messages_key], None)
+        columns = st.columns(len(flow_targets))
+        for column, target in zip(columns, flow_targets):
+            if target.name not in st.session_state.messages:
+                st.session_state.messages[target.name] = []
+            with column:
+                if len(flow_targets) > 1:
+                    st.markdown(f"**{target.name}**")
+                render_messages(st.session_state.messages[target.name], None)
+
+    if response_cache is not None:
+        st.sidebar.caption(f"Response cache: {response_cache.hit_rate:.0%} hit rate, {response_cache.stats['latency_saved']:.1f}s saved")
+
+    for target in flow_targets:
+        metrics = get_context_builder(target.name).metrics
+        if metrics["turns"]:
+            st.sidebar.caption(
+                f"{target.name} context sent: {metrics['last_bytes']} bytes, {metrics['last_messages']} messages last turn; "
+                f"{metrics['total_bytes']} of {metrics['full_bytes']} bytes over {metrics['turns']} turns"
+            )
+
+    with st.sidebar:
+        render_metrics_panel()
         
     with st.container():
         placeholder_text = "Send a message to the model"
@@ -139,10 +172,11 @@ async def main():
             prompt_submitted = st.form_submit_button("Send", type="primary")
         if st.button("Clear all message histories"):
             st.session_state.messages = {}
+            st.session_state.context_builders = {}
             st.rerun()
     
         if prompt_submitted:
-            await asyncio.gather(get_reply(columns[0], messages_key, prompt))
+            await asyncio.gather(*[get_reply(column, target, prompt) for column, target in zip(columns, flow_targets)])
             st.rerun()
 
 if __name__ == "__main__":
@@ -0,0 +1,306 @@
+import os
+import random
+import threading
+import time
+
+from botocore.exceptions import ClientError, ConnectionError as BotocoreConnectionError, HTTPClientError
+
+from metrics import NOOP_SPAN, event_bytes, metrics
+
+# Process-wide control layer for Bedrock calls.
+# Every Streamlit session in the process goes through the same controller, which gives each
+# model/agent/flow its own token bucket (its rate halves on a throttle and creeps back up on
+# success), retries throttles and transient server errors with jittered exponential backoff, caps
+# how many calls are in flight at once, and trips a per-target circuit breaker after repeated
+# failures so callers fail fast while Bedrock is degraded instead of piling on.
+#
+# Usage: call_controller.call("agent:<id>", client.invoke_agent, agentId=..., ...). Pass
+# stream_field for streaming APIs so the concurrency slot is held until the stream is read.
+# Each call is also a metrics span, from the first attempt to the end of its response stream.
+
+RATE_PER_SECOND = float(os.getenv("BEDROCK_RATE_PER_SECOND", "5"))
+BURST = int(os.getenv("BEDROCK_BURST", "10"))
+MAX_CONCURRENCY = int(os.getenv("BEDROCK_MAX_CONCURRENCY", "16"))
+MAX_RETRIES = int(os.getenv("BEDROCK_MAX_RETRIES", "4"))
+INITIAL_RETRY_DELAY = 0.5
+MAX_RETRY_DELAY = 20.0
+BREAKER_THRESHOLD = int(os.getenv("BEDROCK_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.getenv("BEDROCK_BREAKER_COOLDOWN", "30"))
+# How long a call may wait for a token or a concurrency slot before giving up
+ACQUIRE_TIMEOUT = float(os.getenv("BEDROCK_ACQUIRE_TIMEOUT", "60"))
+# Adaptive rate: never below this share of the configured rate; each success wins back this share
+MIN_RATE_SHARE = 0.1
+RECOVERY_SHARE = 0.05
+
+THROTTLING_CODES = {"ThrottlingException", "TooManyRequestsException", "Throttling", "RequestLimitExceeded"}
+RETRYABLE_CODES = THROTTLING_CODES | {
+    "ServiceUnavailableException", "InternalServerException", "ModelNotReadyException",
+    "ModelTimeoutException", "ServiceUnavailable", "InternalFailure",
+}
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class RateLimitTimeout(Exception):
+    pass
+
+
+def error_code(error):
+    if not isinstance(error, ClientError):
+        return None
+    code = error.response.get("Error", {}).get("Code") or ""
+    # Event stream errors use lower camel case (throttlingException)
+    return code[:1].upper() + code[1:]
+
+
+def is_throttle(error):
+    return error_code(error) in THROTTLING_CODES
+
+
+def is_retryable(error):
+    return error_code(error) in RETRYABLE_CODES or isinstance(error, (BotocoreConnectionError, HTTPClientError))
+
+
+def backoff_delay(attempt, initial=INITIAL_RETRY_DELAY, maximum=MAX_RETRY_DELAY):
+    # Somewhere between half and all of the capped exponential delay, so sessions that were
+    # throttled together don't retry in lockstep
+    delay = min(maximum, initial * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class TokenBucket:
+    def __init__(self, rate=RATE_PER_SECOND, burst=BURST):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=ACQUIRE_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def refund(self):
+        # A token taken for a call that never went out
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + 1)
+
+    def throttled(self):
+        with self._lock:
+            self.rate = max(self.max_rate * MIN_RATE_SHARE, self.rate / 2)
+            # Spend the saved-up burst too, or the next calls would go straight back over the limit
+            self.tokens = min(self.tokens, 0.0)
+
+    def succeeded(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * RECOVERY_SHARE)
+
+
+class CircuitBreaker:
+    # Opens after `threshold` consecutive failures; after `cooldown` a single trial call is let
+    # through and its outcome closes the breaker or opens it again
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+                return True
+            return False
+
+    def abandon_trial(self):
+        # The trial call never ran (no capacity for it); open again and wait another cooldown
+        with self._lock:
+            if self.state == "half_open":
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self):
+        return self.state == "open"
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class _SlotStream:
+    # Holds a concurrency slot until the response stream is read to the end, closed or dropped
+    def __init__(self, stream, release, span=NOOP_SPAN):
+        self._stream = stream
+        self._release = release
+        self._span = span
+        self._released = False
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        try:
+            if self._span is NOOP_SPAN:
+                yield from self._stream
+            else:
+                for event in self._stream:
+                    self._span.add(event_bytes(event))
+                    yield event
+        except Exception as e:
+            self._span.fail(e)
+            raise
+        finally:
+            self.release()
+
+    def close(self):
+        # Safe from another thread: shutting the socket down (urllib3 2.3+) unblocks a read that is
+        # waiting on a stalled stream, which plain close() does not
+        raw = getattr(self._stream, "_raw_stream", None)
+        shutdown = getattr(raw, "shutdown", None)
+        if shutdown is not None:
+            shutdown()
+        close = getattr(self._stream, "close", None)
+        if close is not None:
+            close()
+        self.release()
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._span.finish()
+        self._release()
+
+    def __del__(self):
+        self.release()
+
+
+class CallController:
+    def __init__(self, rate=RATE_PER_SECOND, burst=BURST, max_concurrency=MAX_CONCURRENCY,
+                 max_retries=MAX_RETRIES, breaker_threshold=BREAKER_THRESHOLD,
+                 breaker_cooldown=BREAKER_COOLDOWN, acquire_timeout=ACQUIRE_TIMEOUT, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.acquire_timeout = acquire_timeout
+        self.sleep = sleep
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._buckets = {}
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "retries": 0, "throttles": 0, "failures": 0, "rejected": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def bucket(self, key):
+        with self._lock:
+            if key not in self._buckets:
+                self._buckets[key] = TokenBucket(self.rate, self.burst)
+            return self._buckets[key]
+
+    def breaker(self, key):
+        with self._lock:
+            if key not in self._breakers:
+                self._breakers[key] = CircuitBreaker(self.breaker_threshold, self.breaker_cooldown)
+            return self._breakers[key]
+
+    def call(self, key, fn, *args, stream_field=None, **kwargs):
+        span = metrics.span(getattr(fn, "__name__", "call"), key)
+        try:
+            response = self._call(key, fn, args, kwargs, stream_field, span)
+        except Exception as e:
+            span.fail(e)
+            span.finish()
+            raise
+        if stream_field is None or stream_field not in response:
+            span.finish()
+        return response
+
+    def _no_capacity(self, key, breaker):
+        # Nothing was sent, so there's no outcome for the breaker; a trial call it let through
+        # must not leave it half open
+        breaker.abandon_trial()
+        self._count("rejected")
+        raise RateLimitTimeout(f"{key}: no capacity within {self.acquire_timeout:.0f}s, try again shortly")
+
+    def _call(self, key, fn, args, kwargs, stream_field, span):
+        bucket = self.bucket(key)
+        breaker = self.breaker(key)
+        self._count("calls")
+        if not breaker.allow():
+            self._count("rejected")
+            raise CircuitOpenError(f"{key} is failing, not calling it again for up to {self.breaker_cooldown:.0f}s")
+
+        attempt = 0
+        while True:
+            if not bucket.acquire(self.acquire_timeout):
+                self._no_capacity(key, breaker)
+            if not self._slots.acquire(timeout=self.acquire_timeout):
+                bucket.refund()
+                self._no_capacity(key, breaker)
+            held = False
+            try:
+                response = fn(*args, **kwargs)
+                if stream_field is not None and stream_field in response:
+                    response[stream_field] = _SlotStream(response[stream_field], self._slots.release, span)
+                    held = True
+            except Exception as e:
+                if not is_retryable(e):
+                    # Bedrock answered, it just refused this request
+                    breaker.record_success()
+                    raise
+                if is_throttle(e):
+                    self._count("throttles")
+                    bucket.throttled()
+                else:
+                    breaker.record_failure()
+                if attempt >= self.max_retries or breaker.is_open:
+                    if is_throttle(e):
+                        breaker.record_failure()
+                    self._count("failures")
+                    raise
+                self._count("retries")
+                self.sleep(backoff_delay(attempt))
+                attempt += 1
+                continue
+            finally:
+                if not held:
+                    self._slots.release()
+
+            breaker.record_success()
+            bucket.succeeded()
+            return response
+
+
+# Shared by every session and thread in the process
+call_controller = CallController()
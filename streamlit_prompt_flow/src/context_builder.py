@@ -0,0 +1,117 @@
+import json
+import os
+
+from aws_clients import get_client
+from call_control import call_controller
+
+# Builds the `document` sent to the prompt flow from the conversation so far.
+# Each message is serialised once and kept as a running list of JSON fragments; a turn only
+# serialises the messages added since the previous one. The newest messages that fit the
+# byte/token budget are sent, and older ones are either dropped or replaced by a cached rolling
+# summary that is only extended when more turns fall out of the window.
+
+MAX_CONTEXT_BYTES = int(os.getenv("FLOW_CONTEXT_MAX_BYTES", "24000"))
+MAX_CONTEXT_TOKENS = int(os.getenv("FLOW_CONTEXT_MAX_TOKENS", "0")) or None
+# Rough bytes-per-token ratio for English text, used to turn a token budget into bytes
+BYTES_PER_TOKEN = 4
+SUMMARY_MODEL_ID = os.getenv("FLOW_CONTEXT_SUMMARY_MODEL_ID", "anthropic.claude-3-haiku-20240307-v1:0")
+# Share of the budget the rolling summary may take
+SUMMARY_SHARE = 0.25
+
+
+def converse_summarizer(previous_summary, messages):
+    # Folds newly dropped messages into the running summary with a small model
+    bedrock_runtime = get_client("bedrock-runtime")
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    prompt = (
+        f"Existing summary:\n{previous_summary or '(none)'}\n\n"
+        f"New conversation turns:\n{transcript}\n\n"
+        "Update the summary so it keeps every fact, decision and open question needed to continue the conversation. "
+        "Reply with the summary only."
+    )
+    response = call_controller.call(
+        f"model:{SUMMARY_MODEL_ID}",
+        bedrock_runtime.converse,
+        modelId=SUMMARY_MODEL_ID,
+        messages=[{"role": "user", "content": [{"text": prompt}]}],
+        inferenceConfig={"maxTokens": 512, "temperature": 0.0}
+    )
+    return response["output"]["message"]["content"][0]["text"].strip()
+
+
+class ContextBuilder:
+    def __init__(self, max_bytes=MAX_CONTEXT_BYTES, max_tokens=MAX_CONTEXT_TOKENS, summarizer=None):
+        if max_tokens:
+            max_bytes = min(max_bytes, max_tokens * BYTES_PER_TOKEN)
+        self.max_bytes = max_bytes
+        self.summarizer = summarizer
+        self._fragments = []
+        self._sizes = []
+        self._summary = None
+        self._summarized = 0
+        self.metrics = {"turns": 0, "last_bytes": 0, "total_bytes": 0, "full_bytes": 0, "last_messages": 0}
+
+    def _sync(self, messages):
+        # Serialise only what was appended since last time. Cached fragments past the end of the
+        # history, or whose message has since changed (a failed prompt popped and a new one
+        # appended), are dropped first; only the newest cached message needs checking each turn.
+        while self._fragments and (len(messages) < len(self._fragments)
+                                   or json.dumps(messages[len(self._fragments) - 1]) != self._fragments[-1]):
+            self._fragments.pop()
+            self._sizes.pop()
+        if self._summarized > len(self._fragments):
+            # The summary covers messages that are gone
+            self._summary = None
+            self._summarized = 0
+        for message in messages[len(self._fragments):]:
+            fragment = json.dumps(message)
+            self._fragments.append(fragment)
+            self._sizes.append(len(fragment.encode("utf-8")))
+
+    def _summary_fragment(self, messages, dropped):
+        if self.summarizer is None or dropped == 0:
+            return None
+        if dropped > self._summarized:
+            try:
+                self._summary = self.summarizer(self._summary, messages[self._summarized:dropped])
+                self._summarized = dropped
+            except Exception as e:
+                # Fall back to plain truncation; the existing summary (if any) is still valid
+                print(f"Context summary failed: {e}")
+        if not self._summary:
+            return None
+        limit = int(self.max_bytes * SUMMARY_SHARE)
+        summary = self._summary.encode("utf-8")[:limit].decode("utf-8", "ignore")
+        return json.dumps({"role": "system", "content": f"Summary of the earlier conversation: {summary}"})
+
+    def build(self, messages):
+        self._sync(messages)
+
+        # Walk back from the newest message until the budget is used; the newest always goes
+        budget = self.max_bytes
+        if self.summarizer is not None:
+            budget -= int(self.max_bytes * SUMMARY_SHARE)
+        separator = len(", ")
+        used = 2  # the enclosing brackets
+        first = len(self._fragments)
+        while first > 0:
+            size = self._sizes[first - 1] + (separator if first < len(self._fragments) else 0)
+            if used + size > budget and first < len(self._fragments):
+                break
+            used += size
+            first -= 1
+
+        parts = self._fragments[first:]
+        summary = self._summary_fragment(messages, first)
+        if summary is not None:
+            parts = [summary] + parts
+        # Same layout json.dumps(messages) would produce when nothing is dropped
+        document = "[" + ", ".join(parts) + "]"
+
+        sent = len(document.encode("utf-8"))
+        self.metrics["turns"] += 1
+        self.metrics["last_bytes"] = sent
+        self.metrics["total_bytes"] += sent
+        self.metrics["full_bytes"] += sum(self._sizes) + separator * max(0, len(self._sizes) - 1) + 2
+        self.metrics["last_messages"] = len(self._fragments) - first
+        return document
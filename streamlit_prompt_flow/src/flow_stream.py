@@ -0,0 +1,118 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from call_control import call_controller
+from response_cache import replay_chunks
+
+# Concurrent prompt flow streaming for the comparison page.
+# boto3 has no async client, so each invoke_flow call and its response stream run on a worker
+# thread and the documents are handed to the event loop through an asyncio.Queue. The page's
+# coroutines can then await several flows at once under asyncio.gather, and a comparison takes
+# as long as the slowest flow rather than the sum of all of them.
+
+MAX_WORKERS = 8
+
+# Shared across reruns so each run doesn't start its own threads
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="prompt-flow")
+
+
+@dataclass
+class FlowTarget:
+    name: str
+    flow_identifier: str
+    alias_identifier: str
+
+    @property
+    def cache_target(self):
+        return f"flow:{self.alias_identifier}"
+
+
+def load_flow_targets(default_flow_identifier, default_alias_identifier):
+    # PROMPT_FLOWS='[{"name": "v1", "flow": "<flow arn>", "alias": "<alias arn>"}, ...]' compares
+    # several flows or aliases side by side; without it only the default flow is shown
+    configured = os.getenv("PROMPT_FLOWS")
+    if not configured:
+        return [FlowTarget("prompt_flow", default_flow_identifier, default_alias_identifier)]
+    targets = []
+    for entry in json.loads(configured):
+        flow = entry.get("flow", default_flow_identifier)
+        alias = entry["alias"]
+        targets.append(FlowTarget(entry.get("name") or alias.rsplit("/", 1)[-1], flow, alias))
+    return targets
+
+
+def flow_documents(client, target, input_objects):
+    # Blocking: yields each flowOutputEvent document as the flow produces it
+    response = call_controller.call(
+        f"flow:{target.alias_identifier}",
+        client.invoke_flow,
+        stream_field='responseStream',
+        flowIdentifier=target.flow_identifier,
+        flowAliasIdentifier=target.alias_identifier,
+        inputs=input_objects
+    )
+    for event in response['responseStream']:
+        print("Event received:", event)
+        if 'flowOutputEvent' in event:
+            yield event['flowOutputEvent']['content']['document']
+
+
+async def iterate_in_executor(make_iterator, executor=None):
+    # Runs a blocking iterator on a worker thread and yields its items without blocking the loop
+    loop = asyncio.get_running_loop()
+    items = asyncio.Queue()
+    finished = object()
+    stop = threading.Event()
+
+    def put(item, error=None):
+        try:
+            loop.call_soon_threadsafe(items.put_nowait, (item, error))
+        except RuntimeError:
+            # The loop has already closed; nobody is waiting for the rest
+            stop.set()
+
+    def pump():
+        try:
+            for item in make_iterator():
+                if stop.is_set():
+                    return
+                put(item)
+        except Exception as e:
+            put(finished, e)
+            return
+        put(finished)
+
+    loop.run_in_executor(executor or _executor, pump)
+    try:
+        while True:
+            item, error = await items.get()
+            if item is finished:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+async def stream_flow(client, target, input_objects, cache_key, response_cache=None):
+    # Async stream of one flow's documents; a cached answer is replayed instead of invoking the flow
+    cached = response_cache.get(cache_key, target.cache_target) if response_cache else None
+    if cached is not None:
+        for chunk in replay_chunks(cached):
+            yield chunk
+        return
+
+    start = time.perf_counter()
+    documents = []
+    async for document in iterate_in_executor(lambda: flow_documents(client, target, input_objects)):
+        documents.append(document)
+        yield document
+
+    if response_cache is not None and documents and all(isinstance(d, str) for d in documents):
+        response_cache.put(cache_key, target.cache_target, "".join(documents), time.perf_counter() - start)
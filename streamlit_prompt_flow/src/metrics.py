@@ -0,0 +1,277 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency and throughput instrumentation for AWS calls.
+# A span covers one call from request to the last byte of its response: total latency, time to
+# first byte, payload bytes and streamed chunk count, aggregated per operation and target into
+# Prometheus-style histograms and counters. The aggregates are shown in a sidebar panel and, when
+# METRICS_PORT is set, served as Prometheus text on http://<host>:<port>/metrics.
+#
+# Off unless METRICS_ENABLED=true; disabled spans are a shared no-op object, so instrumented code
+# pays one attribute lookup and a method call per call site.
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # counts[i] holds observations <= buckets[i] (and above the previous bound); the last slot is +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        # Linear interpolation inside the bucket that holds the q-th observation, like histogram_quantile()
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+
+class _NoopSpan:
+    def first_byte(self):
+        pass
+
+    def add(self, nbytes=0, chunks=1):
+        pass
+
+    def fail(self, error):
+        pass
+
+    def finish(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    def __init__(self, metrics, operation, target):
+        self.metrics = metrics
+        self.operation = operation
+        self.target = target
+        self.start = time.perf_counter()
+        self.first = None
+        self.bytes = 0
+        self.chunks = 0
+        self.error = None
+        self._finished = False
+
+    def first_byte(self):
+        if self.first is None:
+            self.first = time.perf_counter()
+
+    def add(self, nbytes=0, chunks=1):
+        self.first_byte()
+        self.bytes += nbytes
+        self.chunks += chunks
+
+    def fail(self, error):
+        self.error = type(error).__name__
+
+    def finish(self):
+        if self._finished:
+            return
+        self._finished = True
+        self.metrics._record(self, time.perf_counter())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.fail(exc)
+        self.finish()
+        return False
+
+
+class Metrics:
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    def span(self, operation, target=""):
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, operation, target)
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                histogram = self._histograms[(name, labels)] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            self._counters[(name, labels)] = self._counters.get((name, labels), 0) + amount
+
+    def _record(self, span, end):
+        labels = (("operation", span.operation), ("target", span.target))
+        self.observe("aws_call_duration_seconds", labels, end - span.start)
+        if span.first is not None:
+            self.observe("aws_call_ttfb_seconds", labels, span.first - span.start)
+        if span.bytes:
+            self.observe("aws_call_response_bytes", labels, span.bytes, SIZE_BUCKETS)
+        if span.chunks:
+            self.inc("aws_call_chunks_total", labels, span.chunks)
+        self.inc("aws_calls_total", labels + (("outcome", span.error or "ok"),))
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render_prometheus(self):
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+        lines = []
+        typed = set()
+        for (name, labels), histogram in histograms:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        for (name, labels), value in counters:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        # One row per (operation, target) for the sidebar panel
+        with self._lock:
+            durations = {labels: h for (name, labels), h in self._histograms.items() if name == "aws_call_duration_seconds"}
+            ttfbs = {labels: h for (name, labels), h in self._histograms.items() if name == "aws_call_ttfb_seconds"}
+            sizes = {labels: h for (name, labels), h in self._histograms.items() if name == "aws_call_response_bytes"}
+            errors = {}
+            for (name, labels), value in self._counters.items():
+                if name == "aws_calls_total" and labels[-1][1] != "ok":
+                    errors[labels[:-1]] = errors.get(labels[:-1], 0) + value
+            rows = []
+            for labels, histogram in sorted(durations.items()):
+                ttfb = ttfbs.get(labels)
+                size = sizes.get(labels)
+                rows.append({
+                    "operation": labels[0][1],
+                    "target": labels[1][1],
+                    "calls": histogram.count,
+                    "errors": errors.get(labels, 0),
+                    "p50_ms": round(histogram.quantile(0.5) * 1000, 1),
+                    "p95_ms": round(histogram.quantile(0.95) * 1000, 1),
+                    "ttfb_p50_ms": round(ttfb.quantile(0.5) * 1000, 1) if ttfb else None,
+                    "MB": round(size.sum / 1e6, 3) if size else 0.0,
+                })
+        return rows
+
+
+def _labels(labels):
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def event_bytes(event):
+    # Payload size of one streamed event: agent chunks carry bytes, flow outputs carry a document
+    if not isinstance(event, dict):
+        return 0
+    if "chunk" in event:
+        return len(event["chunk"].get("bytes", b""))
+    if "flowOutputEvent" in event:
+        document = event["flowOutputEvent"].get("content", {}).get("document")
+        if isinstance(document, str):
+            return len(document.encode("utf-8"))
+        return len(json.dumps(document))
+    return 0
+
+
+# Process-wide registry shared by every session
+metrics = Metrics()
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_http_server(port=METRICS_PORT, host=METRICS_HOST):
+    # Serves /metrics in Prometheus text format; safe to call on every rerun, starts once per process
+    global _server
+    with _server_lock:
+        if _server is not None or not port or not metrics.enabled:
+            return _server
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            _server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError as e:
+            print(f"Metrics endpoint not started on {host}:{port}: {e}")
+            return None
+        threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        return _server
+
+
+def render_metrics_panel():
+    # Per-call latency table; call inside `with st.sidebar:`
+    if not metrics.enabled:
+        return
+    import streamlit as st
+
+    start_http_server()
+    with st.expander("AWS call metrics"):
+        rows = metrics.summary()
+        if rows:
+            st.dataframe(rows, hide_index=True)
+        else:
+            st.caption("No AWS calls yet")
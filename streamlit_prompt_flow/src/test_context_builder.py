@@ -0,0 +1,26 @@
+import json
+
+from context_builder import ContextBuilder
+
+
+def test_popped_prompt_is_replaced_by_the_next_one():
+    builder = ContextBuilder()
+    messages = [{"role": "user", "content": "first"}, {"role": "assistant", "content": "answer"}]
+    builder.build(messages)
+
+    # A failed flow: get_reply appends the prompt, then pops it again
+    messages.append({"role": "user", "content": "FAILED PROMPT"})
+    builder.build(messages)
+    messages.pop()
+    messages.append({"role": "user", "content": "new prompt"})
+
+    document = builder.build(messages)
+    assert "FAILED PROMPT" not in document
+    assert json.loads(document) == messages
+
+
+def test_shorter_history_starts_over():
+    builder = ContextBuilder()
+    builder.build([{"role": "user", "content": "a"}, {"role": "assistant", "content": "b"}])
+    messages = [{"role": "user", "content": "c"}]
+    assert json.loads(builder.build(messages)) == messages